@@ -0,0 +1,111 @@
+"""Measure authentication overhead of protected routes.
+
+Run from the backend directory:
+
+    python benchmarks/auth.py --users 1000 --blacklisted 10000
+
+A temporary users.db is created. The previous dependency (fresh
+sqlite3.connect per request, blacklist query, user query, never closed) is
+compared with get_current_user's cached path, first as the bare dependency
+call and then as authenticated requests/sec through a minimal FastAPI app.
+"""
+import sys
+import os
+import time
+import asyncio
+import sqlite3
+import argparse
+import tempfile
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "users.db")
+os.environ["DB_PATH"] = DB_FILE
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import jwt
+import httpx
+from datetime import timedelta
+from fastapi import Depends, FastAPI, HTTPException, Request
+from starlette.requests import Request as StarletteRequest
+from utils.auth import SECRET_KEY, ALGORITHM, add_token_to_blacklist, create_access_token, get_current_user, get_user
+from utils.db import db_pool
+
+def create_db(users: int, blacklisted: int):
+    db_pool.initialize()
+    revoked = [create_access_token({"sub": f"old{i}"}, timedelta(hours=1)) for i in range(blacklisted)]
+    with db_pool.connection() as conn:
+        conn.executemany("INSERT INTO users (username, email, full_name, disabled, hashed_password) VALUES (?, ?, ?, 0, ?)",
+                         [(f"user{i}", f"user{i}@example.com", f"User {i}", "x" * 60) for i in range(users)])
+        # The previous blacklist layout: full JWT strings
+        conn.execute("CREATE TABLE token_blacklist (id INTEGER PRIMARY KEY, token TEXT UNIQUE)")
+        conn.executemany("INSERT INTO token_blacklist (token) VALUES (?)", [(token,) for token in revoked])
+        conn.commit()
+        for token in revoked:
+            add_token_to_blacklist(conn, token)
+
+def legacy_get_current_user(request: Request):
+    db = sqlite3.connect(DB_FILE, timeout=10)
+    db.row_factory = sqlite3.Row
+    token = request.cookies.get("access_token")
+    if not token or db.execute("SELECT 1 FROM token_blacklist WHERE token = ? LIMIT 1", (token,)).fetchone():
+        raise HTTPException(status_code=401)
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    user = get_user(db, username=payload.get("sub"))
+    if user is None:
+        raise HTTPException(status_code=401)
+    return user
+
+def make_request(token: str) -> StarletteRequest:
+    return StarletteRequest({"type": "http", "headers": [(b"cookie", f"access_token={token}".encode())]})
+
+def time_per_call(func, repeat: int) -> float:
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+async def requests_per_second(app: FastAPI, path: str, tokens: list, count: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get(path, cookies={"access_token": tokens[0]})
+        start = time.perf_counter()
+        for i in range(count):
+            client.cookies.set("access_token", tokens[i % len(tokens)])
+            response = await client.get(path)
+            assert response.status_code == 200, response.text
+        return count / (time.perf_counter() - start)
+
+def main(args):
+    create_db(args.users, args.blacklisted)
+    tokens = [create_access_token({"sub": f"user{i}"}, timedelta(hours=1)) for i in range(min(args.users, args.sessions))]
+    request = make_request(tokens[0])
+
+    legacy = time_per_call(lambda: legacy_get_current_user(request), args.repeat)
+    cached = time_per_call(lambda: get_current_user(request), args.repeat * 10)
+    print(f"dependency call, {args.blacklisted} blacklisted tokens:")
+    print(f"{'legacy':>10}: {legacy * 1e6:8.1f} µs")
+    print(f"{'cache hit':>10}: {cached * 1e6:8.1f} µs  ({legacy / cached:.0f}x)")
+
+    app = FastAPI()
+
+    @app.get("/legacy")
+    def legacy_route(user=Depends(legacy_get_current_user)):
+        return {"username": user.username}
+
+    @app.get("/cached")
+    def cached_route(user=Depends(get_current_user)):
+        return {"username": user.username}
+
+    print(f"authenticated requests/sec over {len(tokens)} sessions (in-process ASGI):")
+    for path in ("/legacy", "/cached"):
+        rps = asyncio.run(requests_per_second(app, path, tokens, args.requests))
+        print(f"{path:>10}: {rps:8.0f} req/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--blacklisted", type=int, default=10000)
+    parser.add_argument("--sessions", type=int, default=50, help="Distinct tokens used by the request benchmark")
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=2000)
+    main(parser.parse_args())
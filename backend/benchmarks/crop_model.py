@@ -0,0 +1,72 @@
+"""Compare exported crop health models with the eager fp32 ResNet-50.
+
+Run from the backend directory after ml/src/utils/export_crop_model.py:
+
+    python benchmarks/crop_model.py --images path/to/crop/photos \\
+        --model torchscript:ml/models/crop_health_int8.pt --model onnx:ml/models/crop_health_int8.onnx
+
+Accuracy is measured as agreement with the fp32 reference on the given
+images (top-1 label, top-5 overlap and the largest change in any class
+probability); use images that were not part of the calibration set.
+Latency is the mean CPU time per image at batch size 1 and --batch.
+"""
+import sys
+import os
+import time
+import argparse
+import torch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.crop_model import build_resnet50, load_exported, predict_proba, image_batches, list_images
+
+def time_per_image(model, batch: torch.Tensor, repeat: int) -> float:
+    predict_proba(model, batch)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        predict_proba(model, batch)
+    return (time.perf_counter() - start) / repeat / len(batch)
+
+def main(args):
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    reference = build_resnet50(args.weights)
+    models = {"eager fp32": reference}
+    for spec in args.model:
+        runtime, path = spec.split(":", 1)
+        models[f"{runtime} {os.path.basename(path)}"] = load_exported(runtime, path)
+
+    images = list_images(args.images, args.limit)
+    if not images:
+        raise SystemExit(f"No images found in {args.images}")
+    inputs = torch.cat(list(image_batches(images, args.batch)))
+    expected = torch.cat([predict_proba(reference, batch) for batch in inputs.split(args.batch)])
+    expected_top5 = expected.topk(5, dim=1).indices
+
+    print(f"{len(images)} images, {torch.get_num_threads()} threads")
+    print(f"{'model':>30}  {'top-1':>6}  {'top-5':>6}  {'max |dp|':>8}  {'bs=1':>10}  {f'bs={args.batch}':>10}  speedup")
+    baseline = None
+    for name, model in models.items():
+        probabilities = torch.cat([predict_proba(model, batch) for batch in inputs.split(args.batch)])
+        top1 = (probabilities.argmax(dim=1) == expected.argmax(dim=1)).float().mean().item()
+        top5 = torch.tensor([
+            len(set(a.tolist()) & set(b.tolist())) / 5
+            for a, b in zip(probabilities.topk(5, dim=1).indices, expected_top5)
+        ]).mean().item()
+        max_delta = (probabilities - expected).abs().max().item()
+
+        single = time_per_image(model, inputs[:1], args.repeat)
+        batched = time_per_image(model, inputs[:args.batch], max(1, args.repeat // args.batch))
+        baseline = baseline or single
+        print(f"{name:>30}  {top1:6.3f}  {top5:6.3f}  {max_delta:8.4f}  {single * 1e3:7.1f} ms  "
+              f"{batched * 1e3:7.1f} ms  {baseline / single:5.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", required=True, help="Directory of held-out crop images")
+    parser.add_argument("--model", action="append", default=[], help="runtime:path of an export (repeatable)")
+    parser.add_argument("--weights", default="ml/models/resnet50_imagenet.pth")
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 keeps the default)")
+    main(parser.parse_args())
@@ -0,0 +1,90 @@
+"""Time crop-health image preprocessing per upload.
+
+Run from the backend directory (a synthetic 12 MP JPEG is used without --image):
+
+    python benchmarks/crop_preprocessing.py --image path/to/photo.jpg
+
+The previous path decoded at full resolution, ran the torchvision transform
+(including RandomHorizontalFlip/RandomRotation) and then converted the full
+image to NumPy, to HSV through PIL and back, with a separate grayscale mean.
+The new path decodes once at reduced scale and derives the tensor and all
+statistics from the same 256 px buffer. The statistics are also compared
+with PIL's HSV conversion on that buffer.
+"""
+import sys
+import os
+import io
+import time
+import argparse
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.crop_preprocessing import decode, preprocess, image_statistics
+
+def legacy_preprocess(image_data: bytes):
+    from torchvision import transforms
+    transform = transforms.Compose([
+        transforms.Resize(256),
+        transforms.CenterCrop(224),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+        transforms.RandomHorizontalFlip(p=0.3),
+        transforms.RandomRotation(degrees=15),
+    ])
+    image = Image.open(io.BytesIO(image_data)).convert('RGB')
+    tensor = transform(image)
+    img_array = np.array(image)
+    hsv_array = np.array(Image.fromarray(img_array).convert('HSV'))
+    gray_img = np.mean(img_array, axis=2)
+    stats = {
+        "mean_hue": float(np.mean(hsv_array[:, :, 0])),
+        "mean_saturation": float(np.mean(hsv_array[:, :, 1])),
+        "mean_green": float(np.mean(img_array[:, :, 1])),
+        "gray_std": float(np.std(gray_img)),
+        "row_profile_std": float(np.std(np.mean(gray_img, axis=1))),
+    }
+    return tensor, stats
+
+def synthetic_photo(width: int = 4032, height: int = 3024) -> bytes:
+    rng = np.random.default_rng(0)
+    small = (rng.random((height // 16, width // 16, 3)) * 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(small).resize((width, height), Image.BICUBIC).save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+def time_per_call(func, repeat: int) -> float:
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+def main(args):
+    if args.image:
+        with open(args.image, "rb") as f:
+            image_data = f.read()
+    else:
+        image_data = synthetic_photo()
+    print(f"image: {Image.open(io.BytesIO(image_data)).size}, {len(image_data) / 1e6:.1f} MB")
+
+    legacy = time_per_call(lambda: legacy_preprocess(image_data), args.repeat)
+    current = time_per_call(lambda: preprocess(image_data), args.repeat)
+    print(f"{'legacy':>8}: {legacy * 1e3:8.1f} ms/image")
+    print(f"{'current':>8}: {current * 1e3:8.1f} ms/image  ({legacy / current:.1f}x faster)")
+
+    # Same pixels through PIL's HSV conversion: statistics must agree
+    rgb = decode(image_data)
+    hsv = np.asarray(Image.fromarray(rgb).convert("HSV")).astype(np.float64)
+    stats = image_statistics(rgb)
+    print(f"hue/saturation vs PIL HSV: {stats['mean_hue'] - hsv[..., 0].mean():+.4f} / "
+          f"{stats['mean_saturation'] - hsv[..., 1].mean():+.4f}")
+    print("statistics (legacy full resolution -> current 256 px):")
+    for name, value in legacy_preprocess(image_data)[1].items():
+        print(f"  {name:>16}: {value:8.2f} -> {stats[name]:8.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", help="Photo to preprocess (defaults to a synthetic 12 MP JPEG)")
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,72 @@
+"""Measure latency of `/` while vegetation index analyses run concurrently.
+
+Start the API (`uvicorn main:app`) and run from the backend directory:
+
+    python benchmarks/event_loop_latency.py --image tile.png --username bench --password secret
+
+The root endpoint is probed sequentially, first on an idle server and then
+while --concurrency clients keep uploading the image to /analyze-multi/.
+If CPU-bound work stays off the event loop, p99 of `/` should barely move.
+"""
+import argparse
+import asyncio
+import time
+import httpx
+import numpy as np
+
+async def probe_root(client: httpx.AsyncClient, duration: float, interval: float) -> list:
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get("/")
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    return latencies
+
+async def run_analyses(client: httpx.AsyncClient, image: bytes, stop: asyncio.Event, counters: dict):
+    while not stop.is_set():
+        response = await client.post("/analyze-multi/", files={"file": ("tile.png", image, "image/png")})
+        counters[response.status_code] = counters.get(response.status_code, 0) + 1
+
+def summarize(label: str, latencies: list):
+    latencies_ms = np.array(latencies) * 1000
+    print(
+        f"{label:>10}: n={latencies_ms.size:5d}  "
+        f"p50={np.percentile(latencies_ms, 50):7.2f} ms  "
+        f"p99={np.percentile(latencies_ms, 99):7.2f} ms  "
+        f"max={latencies_ms.max():7.2f} ms"
+    )
+
+async def main(args):
+    with open(args.image, "rb") as f:
+        image = f.read()
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=httpx.Timeout(300.0)) as client:
+        response = await client.post("/login", data={"username": args.username, "password": args.password})
+        response.raise_for_status()
+
+        idle = await probe_root(client, args.duration, args.interval)
+
+        stop = asyncio.Event()
+        counters = {}
+        workers = [asyncio.create_task(run_analyses(client, image, stop, counters)) for _ in range(args.concurrency)]
+        loaded = await probe_root(client, args.duration, args.interval)
+        stop.set()
+        await asyncio.gather(*workers)
+
+    summarize("idle", idle)
+    summarize("loaded", loaded)
+    print(f"analysis responses by status: {counters}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--image", required=True, help="Multispectral image to upload")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent analysis clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per phase")
+    parser.add_argument("--interval", type=float, default=0.01, help="Pause between root probes")
+    asyncio.run(main(parser.parse_args()))
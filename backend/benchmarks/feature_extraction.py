@@ -0,0 +1,140 @@
+"""Time soil-classifier feature extraction per location.
+
+Run from the backend directory:
+
+    python benchmarks/feature_extraction.py --response ml/models/response.json
+
+Compares the previous per-request path (nested loops building a dict, then a
+one-row DataFrame in the scaler's column order) with the shared
+FeatureExtractor, and checks that both produce the same base features.
+Training records are checked against the previous training parser, which
+rounded with Python's round(); responses whose values sit on .xx5 ties
+are included, since np.round would disagree there. The extractor should
+stay under 100 µs per location.
+"""
+import sys
+import os
+import copy
+import json
+import time
+import random
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.soil_features import FEATURE_NAMES, PROPERTIES, BASE_FEATURES, get_feature_extractor
+
+def legacy_features(data: dict, feature_names: list) -> pd.DataFrame:
+    feature_values = {}
+    for layer in data.get("properties", {}).get("layers", []):
+        prop_name = layer.get("name")
+        if prop_name not in PROPERTIES:
+            continue
+        for depth in layer.get("depths", []):
+            depth_label = depth.get("label", "").replace("cm", "").replace("-", "_")
+            for value_type, value in depth.get("values", {}).items():
+                key = f"{prop_name}_{depth_label}_{value_type}"
+                feature_values[key] = float(value) if value else 0.0
+    ordered = [feature_values.get(feat, 0.0) for feat in feature_names]
+    return pd.DataFrame([ordered], columns=feature_names)
+
+def legacy_training_record(location_data: dict) -> dict:
+    """The training parser before FeatureExtractor (ml/src/utils/test.py)."""
+    features, prop_data = {}, {}
+    for layer in location_data['properties']['layers']:
+        prop_name = layer['name']
+        conversion = 10 ** (-layer['unit_measure']['d_factor'] / 10)
+        for depth in layer['depths']:
+            depth_label = depth['label'].replace('cm', '').replace('-', '_')
+            for value_type, value in depth['values'].items():
+                key = f"{prop_name}_{depth_label}_{value_type}"
+                prop_data[key] = round(float(value) * conversion if value else 0.0, 2)
+                features[key] = prop_data[key]
+
+    features['clay_gradient'] = prop_data.get('clay_30_60_mean', 0) - prop_data.get('clay_0_5_mean', 0)
+    features['ph_gradient'] = prop_data.get('phh2o_30_60_mean', 0) - prop_data.get('phh2o_0_5_mean', 0)
+    depth_weights = {'0_5': 0.3, '5_15': 0.25, '15_30': 0.2, '30_60': 0.15, '60_100': 0.1}
+    for prop in ['soc', 'cec', 'sand']:
+        features[f'{prop}_depth_weighted'] = round(sum(
+            prop_data.get(f"{prop}_{depth}_mean", 0) * weight for depth, weight in depth_weights.items()), 2)
+    features['sand_clay_ratio'] = round(prop_data.get('sand_0_5_mean', 0) / (prop_data.get('clay_0_5_mean', 0) + 1e-6), 2)
+    features['soc_cec_balance'] = round(prop_data.get('soc_0_5_mean', 0) * prop_data.get('cec_0_5_mean', 0), 2)
+    features['water_capacity'] = round(prop_data.get('wv0033_0_5_mean', 0) - prop_data.get('wv1500_0_5_mean', 0), 2)
+    cec_values = [prop_data.get(f'cec_{depth}_mean', 0) for depth in depth_weights]
+    features['cec_variability'] = round(np.std(cec_values) / (np.mean(cec_values) + 1e-6), 2)
+    return features
+
+def tie_responses(data: dict, count: int) -> list:
+    """Copies of a response with every value replaced so that it converts to (nearly) an .xx5 tie."""
+    rng = random.Random(0)
+    responses = []
+    for _ in range(count):
+        response = copy.deepcopy(data)
+        for layer in response["properties"]["layers"]:
+            conversion = 10 ** (-layer["unit_measure"]["d_factor"] / 10)
+            for depth in layer["depths"]:
+                for value_type in depth["values"]:
+                    depth["values"][value_type] = (rng.randrange(1, 100000) + 0.5) / 100 / conversion
+        responses.append(response)
+    return responses
+
+def records_match(extractor, responses: list) -> int:
+    mismatches = 0
+    for data in responses:
+        # The saved response carries quantiles the API never requests; only model features are compared
+        expected = {name: value for name, value in legacy_training_record(data).items() if name in FEATURE_NAMES}
+        actual = extractor.extract_dict(data)
+        mismatches += expected.keys() != actual.keys() or any(
+            expected[name] != actual[name] and not (np.isnan(expected[name]) and np.isnan(actual[name]))
+            for name in expected
+        )
+    return mismatches
+
+def time_per_call(func, repeat: int, rounds: int = 5) -> float:
+    """Best of several rounds, so that a noisy machine does not dominate the result."""
+    func()
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best
+
+def main(args):
+    with open(args.response) as f:
+        data = json.load(f)
+
+    extractor = get_feature_extractor(tuple(FEATURE_NAMES))
+    legacy = time_per_call(lambda: legacy_features(data, FEATURE_NAMES), args.repeat)
+    single = time_per_call(lambda: extractor.extract(data), args.repeat)
+    row = np.empty(extractor.n_features, dtype=np.float32)
+    preallocated = time_per_call(lambda: extractor.extract(data, out=row), args.repeat)
+    batch = time_per_call(lambda: extractor.extract_many([data] * args.batch), max(1, args.repeat // args.batch)) / args.batch
+
+    print(f"{'legacy dict + DataFrame':>26}: {legacy * 1e6:8.1f} µs/location")
+    print(f"{'extract()':>26}: {single * 1e6:8.1f} µs/location")
+    print(f"{'extract(out=row)':>26}: {preallocated * 1e6:8.1f} µs/location")
+    print(f"{f'extract_many({args.batch})':>26}: {batch * 1e6:8.1f} µs/location")
+
+    # Base features only differ by the unit conversion the legacy serving path skipped
+    conversions = {
+        layer["name"]: 10 ** (-layer["unit_measure"]["d_factor"] / 10) for layer in data["properties"]["layers"]
+    }
+    expected = legacy_features(data, BASE_FEATURES).to_numpy(dtype=np.float64, copy=True)[0]
+    expected *= [conversions.get(name.split("_")[0], 1.0) for name in BASE_FEATURES]
+    diff = np.abs(np.round(expected, 2) - extractor.extract(data)[:len(BASE_FEATURES)]).max()
+    print(f"max base-feature difference vs. legacy (after unit conversion): {diff:.4f}")
+
+    responses = [data] + tie_responses(data, args.tie_responses)
+    mismatches = records_match(extractor, responses)
+    print(f"training records differing from the legacy training parser: {mismatches}/{len(responses)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--response", default="ml/models/response.json", help="Saved SoilGrids response")
+    parser.add_argument("--repeat", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--tie-responses", type=int, default=200, help="Responses with .xx5 ties checked against the training parser")
+    main(parser.parse_args())
@@ -0,0 +1,81 @@
+"""Compare GPT-2 advisor runtimes on CPU: tokens/sec and resident memory.
+
+Run from the backend directory:
+
+    python benchmarks/llm_runtime.py --model gpt2 --threads 1,2,4
+
+Each runtime (fp32, int8) is measured in a fresh subprocess so RSS is not
+shared between them. Decoding is greedy with a fixed number of new tokens
+over the real /predict prompt, under torch.inference_mode. For int8 the
+export from ml/src/utils/quantize_gpt2.py is used when --quantized points
+at one, otherwise the model is quantized at load time.
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+def measure(args) -> dict:
+    import torch
+    from utils.soil_advisor import PROMPT_PREFIX, build_prompt_suffix, normalize_context, load_advisor_model
+
+    baseline = rss_mb()
+    start = time.perf_counter()
+    model, tokenizer = load_advisor_model(args.child, args.model, args.quantized)
+    load_seconds = time.perf_counter() - start
+    loaded = rss_mb()
+
+    context = normalize_context("Fertile", 0.87, "Suitable for most crops.", {})
+    input_ids = tokenizer(PROMPT_PREFIX + build_prompt_suffix(context), return_tensors="pt").input_ids
+    results = {"runtime": args.child, "load_s": load_seconds, "rss_mb": loaded, "model_rss_mb": loaded - baseline,
+               "prompt_tokens": input_ids.shape[1], "tokens_per_s": {}}
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        with torch.inference_mode():
+            generate = lambda: model.generate(
+                input_ids, attention_mask=torch.ones_like(input_ids), do_sample=False,
+                max_new_tokens=args.tokens, min_new_tokens=args.tokens, pad_token_id=tokenizer.eos_token_id,
+            )
+            generate()
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                generate()
+            elapsed = (time.perf_counter() - start) / args.repeat
+        results["tokens_per_s"][threads] = args.tokens / elapsed
+    results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+def main(args):
+    if args.child:
+        print(json.dumps(measure(args)))
+        return
+
+    threads = ",".join(map(str, args.threads))
+    print(f"{'runtime':>8}  {'load':>7}  {'RSS':>9}  {'model':>9}  {'peak':>9}  tokens/s by threads ({threads})")
+    for runtime in ("fp32", "int8"):
+        cmd = [sys.executable, __file__, "--child", runtime, "--model", args.model, "--quantized", args.quantized,
+               "--threads", threads, "--tokens", str(args.tokens), "--repeat", str(args.repeat)]
+        output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        speeds = "  ".join(f"{t}: {v:6.1f}" for t, v in r["tokens_per_s"].items())
+        print(f"{runtime:>8}  {r['load_s']:6.1f}s  {r['rss_mb']:6.0f} MB  {r['model_rss_mb']:6.0f} MB  "
+              f"{r['peak_rss_mb']:6.0f} MB  {speeds}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="gpt2", help="fp32 checkpoint (name or directory)")
+    parser.add_argument("--quantized", default="ml/models/gpt2-soil-advisor-int8", help="int8 export directory")
+    parser.add_argument("--threads", type=lambda s: [int(t) for t in s.split(",")], default=[1, 2, 4])
+    parser.add_argument("--tokens", type=int, default=64, help="New tokens per generation")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", choices=["fp32", "int8"], help=argparse.SUPPRESS)
+    main(parser.parse_args())
@@ -0,0 +1,119 @@
+"""Request throughput with the access-log middleware.
+
+Run from the backend directory:
+
+    python benchmarks/logging_middleware.py --requests 2000 --upload-mb 5
+
+Logs go to a temporary directory. A minimal FastAPI app is measured with
+no middleware, with the previous BaseHTTPMiddleware logger (body read,
+headers formatted, synchronous flush per request) and with the ASGI
+LoggerMiddleware at full and 10% sampling. GET /ping shows per-request
+overhead; POST /upload streams --upload-mb of data that the endpoint
+itself never reads, as with a rejected or size-checked upload.
+"""
+import sys
+import os
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+
+LOG_DIR = tempfile.mkdtemp()
+os.environ["LOG_DIR"] = LOG_DIR
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from utils.logger import LoggerMiddleware, shutdown_logging
+
+legacy_logger = logging.getLogger("legacy")
+legacy_logger.propagate = False
+legacy_handler = logging.FileHandler(os.path.join(LOG_DIR, "legacy.log"), encoding="utf-8")
+legacy_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+legacy_logger.addHandler(legacy_handler)
+
+class LegacyLoggerMiddleware(BaseHTTPMiddleware):
+    """The previous utils/logger.py middleware, writing to its own file."""
+
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        try:
+            request_body = await request.body()
+            body_str = request_body.decode(errors="replace") if request_body else ""
+            legacy_logger.info(
+                f"\nRequest Details:\n"
+                f"Time: {time.strftime('%Y-%m-%d %H:%M:%S')}\n"
+                f"Client IP: {request.client.host}\n"
+                f"Method: {request.method}\n"
+                f"Path: {request.url.path}\n"
+                f"Headers: {dict(request.headers)}\n"
+                f"Query Params: {dict(request.query_params)}\n"
+            )
+            response = await call_next(request)
+            legacy_logger.info(
+                f"\nResponse Details:\n"
+                f"Status: {response.status_code}\n"
+                f"Duration: {time.time() - start_time:.4f}s\n"
+                f"Headers: {dict(response.headers)}\n"
+            )
+        finally:
+            legacy_handler.flush()
+        return response
+
+def build_app(middleware=None, **options) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.post("/upload")
+    async def upload():
+        return {"ok": True}
+
+    if middleware is not None:
+        app.add_middleware(middleware, **options)
+    return app
+
+async def requests_per_second(app: FastAPI, method: str, path: str, count: int, concurrency: int, body: bytes) -> float:
+    transport = httpx.ASGITransport(app=app, client=("203.0.113.7", 50000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            response = await client.request(method, path, content=body or None)
+            assert response.status_code == 200, response.text
+
+        await one()
+        start = time.perf_counter()
+        for _ in range(count // concurrency):
+            await asyncio.gather(*(one() for _ in range(concurrency)))
+        return (count // concurrency) * concurrency / (time.perf_counter() - start)
+
+def main(args):
+    apps = {
+        "none": build_app(),
+        "legacy": build_app(LegacyLoggerMiddleware),
+        "asgi": build_app(LoggerMiddleware, sample_rate=1.0),
+        "asgi 10%": build_app(LoggerMiddleware, sample_rate=0.1),
+    }
+    upload = os.urandom(args.upload_mb * 1024 * 1024)
+    cases = (("GET", "/ping", args.requests, b""), ("POST", "/upload", args.uploads, upload))
+
+    print(f"requests/sec, concurrency {args.concurrency} (in-process ASGI):")
+    print(f"{'middleware':>10}  {'GET /ping':>10}  {f'POST {args.upload_mb}MB':>10}")
+    try:
+        for name, app in apps.items():
+            rates = [asyncio.run(requests_per_second(app, method, path, count, args.concurrency, body))
+                     for method, path, count, body in cases]
+            print(f"{name:>10}  " + "  ".join(f"{rate:10.0f}" for rate in rates))
+    finally:
+        shutdown_logging()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--uploads", type=int, default=100)
+    parser.add_argument("--upload-mb", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=10)
+    main(parser.parse_args())
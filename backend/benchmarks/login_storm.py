@@ -0,0 +1,107 @@
+"""Latency of a non-auth endpoint while a burst of logins is in flight.
+
+Run from the backend directory:
+
+    python benchmarks/login_storm.py --logins 100
+
+A temporary users.db with one bcrypt user is created. /ping (a plain sync
+route, like most of the API) is sampled while --logins concurrent logins
+hit either the previous sync login (bcrypt on the shared threadpool) or
+authenticate_user_async (bcrypt on auth_pool). The per-IP rate limiter is
+left out so that every login actually runs bcrypt.
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "users.db")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.security import OAuth2PasswordRequestForm
+from utils.auth import authenticate_user, authenticate_user_async, create_user, get_password_hash
+from utils.db import db_pool
+from utils.executor import auth_pool, shutdown_pools
+
+PASSWORD = "correct horse battery staple"
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    @app.post("/legacy-login")
+    def legacy_login(form_data: OAuth2PasswordRequestForm = Depends()):
+        if not authenticate_user(form_data.username, form_data.password):
+            raise HTTPException(status_code=400, detail="Invalid credentials")
+        return {"message": "Login successful"}
+
+    @app.post("/login")
+    async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+        if not await authenticate_user_async(form_data.username, form_data.password):
+            raise HTTPException(status_code=400, detail="Invalid credentials")
+        return {"message": "Login successful"}
+
+    return app
+
+async def sample_ping(client: httpx.AsyncClient, stop: asyncio.Event, interval: float) -> list:
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/ping")
+        assert response.status_code == 200
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    return latencies
+
+async def run(app: FastAPI, path: str, logins: int, duration: float, interval: float):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_ping(client, stop, interval))
+        start = time.perf_counter()
+        if path:
+            form = {"username": "farmer", "password": PASSWORD}
+            responses = await asyncio.gather(*(client.post(path, data=form) for _ in range(logins)))
+        else:
+            await asyncio.sleep(duration)
+            responses = []
+        elapsed = time.perf_counter() - start
+        stop.set()
+        latencies = await sampler
+    codes = [response.status_code for response in responses]
+    return latencies, elapsed, codes.count(200), codes.count(503)
+
+def report(name: str, latencies: list, elapsed: float, ok: int, busy: int):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    logins = f"{ok:4d} ok {busy:3d} 503 in {elapsed:5.2f}s" if ok or busy else ""
+    print(f"{name:>14}: {len(latencies):5d} pings  p50 {statistics.median(latencies) * 1e3:7.1f} ms  "
+          f"p99 {p99 * 1e3:7.1f} ms  max {latencies[-1] * 1e3:7.1f} ms  {logins}")
+
+def main(args):
+    db_pool.initialize()
+    with db_pool.connection() as db:
+        create_user(db, "farmer", "farmer@example.com", "Farmer", get_password_hash(PASSWORD))
+
+    app = build_app()
+    print(f"/ping latency, {args.logins} concurrent logins, {auth_pool.max_workers} auth workers:")
+    try:
+        for name, path in (("idle", None), ("legacy login", "/legacy-login"), ("auth_pool", "/login")):
+            report(name, *asyncio.run(run(app, path, args.logins, args.idle, args.interval)))
+    finally:
+        shutdown_pools()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--idle", type=float, default=2.0, help="Seconds of /ping sampling without logins")
+    parser.add_argument("--interval", type=float, default=0.01, help="Pause between /ping requests")
+    main(parser.parse_args())
@@ -0,0 +1,82 @@
+"""Time soil-condition inference: the previous /predict path vs. CompiledSoilClassifier.
+
+Run from the backend directory (needs the trained artifacts in ml/models):
+
+    python benchmarks/soil_classifier.py --response ml/models/response.json
+
+The previous path built a DataFrame, ran scaler.transform, then model.predict
+and model.predict_proba (two ensemble passes). The compiled classifier
+standardises the ndarray in place and derives labels from one predict_proba.
+With --onnx (requires skl2onnx and onnxruntime) the classifier is exported
+and timed on onnxruntime as well.
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import tempfile
+import warnings
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.soil_classifier import CompiledSoilClassifier
+from utils.soil_features import get_feature_extractor
+
+def legacy_predict(model, scaler, encoder, features: np.ndarray):
+    feature_df = pd.DataFrame(features, columns=scaler.feature_names_in_)
+    scaled_data = scaler.transform(feature_df)
+    predictions = encoder.inverse_transform(model.predict(scaled_data))
+    confidences = model.predict_proba(scaled_data).max(axis=1)
+    return predictions, confidences
+
+def time_per_call(func, repeat: int) -> float:
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+def main(args):
+    model = joblib.load(os.path.join(args.models, "soil_model.pkl"))
+    scaler = joblib.load(os.path.join(args.models, "scaler.pkl"))
+    encoder = joblib.load(os.path.join(args.models, "encoder.pkl"))
+    compiled = CompiledSoilClassifier.from_artifacts(model, scaler, encoder)
+
+    with open(args.response) as f:
+        data = json.load(f)
+    row = get_feature_extractor(tuple(compiled.feature_names)).extract(data)[np.newaxis, :]
+    rng = np.random.default_rng(0)
+    batch = np.repeat(row, args.batch, axis=0) * rng.uniform(0.8, 1.2, (args.batch, row.shape[1]))
+
+    runners = {
+        "legacy": lambda X: legacy_predict(model, scaler, encoder, X),
+        "compiled": compiled.predict,
+    }
+    if args.onnx:
+        onnx_path = os.path.join(tempfile.mkdtemp(), "soil_model.onnx")
+        compiled.export_onnx(onnx_path)
+        onnx = CompiledSoilClassifier.from_artifacts(model, scaler, encoder)
+        onnx.load_onnx(onnx_path)
+        runners["compiled+onnx"] = onnx.predict
+        agreement = np.mean(np.array(onnx.predict(batch)[0]) == np.array(compiled.predict(batch)[0]))
+        print(f"onnx/sklearn label agreement on {args.batch} rows: {agreement:.3f}")
+
+    print(f"{'':>14}  {'1 row':>12}  {f'{args.batch} rows':>14}")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for name, predict in runners.items():
+            single = time_per_call(lambda: predict(row), args.repeat)
+            many = time_per_call(lambda: predict(batch), max(1, args.repeat // 20))
+            print(f"{name:>14}  {single * 1e3:9.3f} ms  {many * 1e3 / args.batch:9.4f} ms/row")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", default="ml/models", help="Directory with soil_model.pkl, scaler.pkl, encoder.pkl")
+    parser.add_argument("--response", default="ml/models/response.json", help="Saved SoilGrids response")
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--onnx", action="store_true", help="Also export to ONNX and time onnxruntime")
+    main(parser.parse_args())
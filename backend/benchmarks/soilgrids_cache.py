@@ -0,0 +1,163 @@
+"""Exercise the SoilGrids cache against a local stand-in for rest.isric.org.
+
+Run from the backend directory:
+
+    python benchmarks/soilgrids_cache.py --latency 0.5
+
+A stand-in HTTP server answers SoilGrids-shaped queries after --latency
+seconds and counts the requests it receives; the cache is pointed at it
+through api_url (SOILGRIDS_API_URL in the app) with a temporary SQLite
+file. The script checks grid snapping and request coalescing, memory and
+disk hits, TTL expiry and disk pruning, prints the lookup latency of each
+tier, and exits non-zero if any check fails.
+"""
+import sys
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.http_client import PooledHTTPClient
+from utils.soilgrids import SOILGRIDS_CELL_DEGREES, SoilGridsCache, snap_coordinate
+
+PROPERTIES, DEPTHS, VALUES = ["clay", "phh2o"], ["0-5cm", "5-15cm"], ["mean"]
+
+class StandInSoilGrids(BaseHTTPRequestHandler):
+    latency = 0.0
+    requests = Counter()
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        type(self).requests[(query["lon"][0], query["lat"][0])] += 1
+        time.sleep(self.latency)
+        body = json.dumps({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [float(query["lon"][0]), float(query["lat"][0])]},
+            "properties": {"layers": [
+                {
+                    "name": prop,
+                    "unit_measure": {"d_factor": 10, "mapped_units": "g/kg"},
+                    "depths": [{"label": depth, "values": {value: 100 for value in query.get("value", [])}}
+                               for depth in query.get("depth", [])],
+                }
+                for prop in query.get("property", [])
+            ]},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_server(latency: float) -> ThreadingHTTPServer:
+    StandInSoilGrids.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInSoilGrids)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def disk_rows(cache: SoilGridsCache) -> int:
+    with cache._db_lock:
+        return cache._connection().execute("SELECT COUNT(*) FROM soilgrids_cache").fetchone()[0]
+
+async def timed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - start
+
+async def run(args, api_url: str, db_dir: str) -> list:
+    failures = []
+
+    def check(name: str, ok: bool, detail: str = ""):
+        print(f"{'PASS' if ok else 'FAIL'}  {name}{f'  ({detail})' if detail else ''}")
+        if not ok:
+            failures.append(name)
+
+    client = PooledHTTPClient()
+    await client.start()
+    try:
+        db_path = os.path.join(db_dir, "soilgrids_cache.db")
+        cache = SoilGridsCache(db_path=db_path, api_url=api_url)
+        lon, lat = snap_coordinate(13.4049), snap_coordinate(52.5201)
+
+        # Points scattered around one cell centre, all in flight at once
+        jitter = [(i / max(1, args.concurrent - 1) - 0.5) * 0.8 * SOILGRIDS_CELL_DEGREES
+                  for i in range(args.concurrent)]
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(
+            cache.query(lon + d, lat - d / 2, PROPERTIES, DEPTHS, VALUES, client=client) for d in jitter
+        ))
+        cold = time.perf_counter() - start
+        upstream = sum(StandInSoilGrids.requests.values())
+        check("concurrent lookups in one cell share one upstream request", upstream == 1,
+              f"{args.concurrent} lookups, {upstream} upstream")
+        check("upstream is queried at the snapped cell",
+              responses[0]["geometry"]["coordinates"] == [snap_coordinate(lon), snap_coordinate(lat)])
+
+        _, memory_hit = await timed(cache.query(lon, lat, PROPERTIES, DEPTHS, VALUES, client=client))
+        check("repeat lookup is a memory hit", cache.stats["memory_hits"] == 1 and sum(StandInSoilGrids.requests.values()) == 1)
+
+        # A fresh instance (as after a restart) only has the SQLite tier
+        restarted = SoilGridsCache(db_path=db_path, api_url=api_url)
+        _, disk_hit = await timed(restarted.query(lon, lat, PROPERTIES, DEPTHS, VALUES, client=client))
+        check("lookup after a restart is a disk hit", restarted.stats["disk_hits"] == 1 and sum(StandInSoilGrids.requests.values()) == 1)
+
+        short_lived = SoilGridsCache(db_path=os.path.join(db_dir, "ttl.db"), api_url=api_url, ttl=0.2)
+        await short_lived.query(lon, lat, PROPERTIES, DEPTHS, VALUES, client=client)
+        await asyncio.sleep(0.3)
+        await short_lived.query(lon, lat, PROPERTIES, DEPTHS, VALUES, client=client)
+        check("expired entries are fetched again", short_lived.stats["misses"] == 2)
+
+        capped = SoilGridsCache(db_path=os.path.join(db_dir, "capped.db"), api_url=api_url,
+                                max_disk_entries=args.disk_cap, prune_every=args.prune_every)
+        cells = [(lon + i * 0.01, lat) for i in range(args.cells)]
+        for cell_lon, cell_lat in cells:
+            await capped.query(cell_lon, cell_lat, PROPERTIES, DEPTHS, VALUES, client=client)
+        rows = await asyncio.to_thread(disk_rows, capped)
+        check("disk tier stays within its cap between prunes", rows < args.disk_cap + args.prune_every,
+              f"{rows} rows after {args.cells} writes, cap {args.disk_cap}, pruned every {args.prune_every} writes")
+        newest = SoilGridsCache(db_path=os.path.join(db_dir, "capped.db"), api_url=api_url,
+                                max_disk_entries=args.disk_cap)
+        rows = await asyncio.to_thread(disk_rows, newest)
+        await newest.query(*cells[-1], PROPERTIES, DEPTHS, VALUES, client=client)
+        check("opening the cache prunes to the cap and keeps the newest rows",
+              rows == args.disk_cap and newest.stats["disk_hits"] == 1, f"{rows} rows")
+
+        expiring = SoilGridsCache(db_path=os.path.join(db_dir, "capped.db"), api_url=api_url, ttl=0)
+        rows = await asyncio.to_thread(disk_rows, expiring)
+        check("opening the cache drops expired rows", rows == 0, f"{rows} rows")
+
+        print(f"\nlookup latency: upstream {cold * 1e3:.1f} ms, disk hit {disk_hit * 1e3:.2f} ms, "
+              f"memory hit {memory_hit * 1e6:.1f} µs")
+    finally:
+        await client.aclose()
+    return failures
+
+def main(args):
+    server = start_server(args.latency)
+    api_url = f"http://127.0.0.1:{server.server_port}/soilgrids/v2.0/properties/query"
+    try:
+        with tempfile.TemporaryDirectory() as db_dir:
+            failures = asyncio.run(run(args, api_url, db_dir))
+    finally:
+        server.shutdown()
+    if failures:
+        raise SystemExit(f"{len(failures)} check(s) failed")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds the stand-in server takes per request")
+    parser.add_argument("--concurrent", type=int, default=20, help="Simultaneous lookups inside one grid cell")
+    parser.add_argument("--cells", type=int, default=50, help="Distinct cells written to the capped cache")
+    parser.add_argument("--disk-cap", type=int, default=10)
+    parser.add_argument("--prune-every", type=int, default=5)
+    main(parser.parse_args())
@@ -1,21 +1,26 @@
-import rsa
+import os
 import jwt
-import base64
+import asyncio
 import logging
 import sqlite3
 from fastapi import FastAPI, Request, Depends, HTTPException, status, Response
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import timedelta
+from contextlib import asynccontextmanager
 from jose import JWTError
-from slowapi import Limiter
+from slowapi import Limiter, _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 from routers import analysis, model, crop_health
 from utils.auth import (
-    authenticate_user,
+    authenticate_user_async,
     create_access_token,
+    save_user,
+    rsa_decrypt_password,
     get_password_hash,
     ACCESS_TOKEN_EXPIRE_MINUTES,
     add_token_to_blacklist,
@@ -23,17 +28,50 @@ from utils.auth import (
     oauth2_scheme,
     is_token_blacklisted,
     get_user,
+    migrate_legacy_blacklist,
+    prune_revoked_tokens_periodically,
     SECRET_KEY, 
     ALGORITHM
 )
 from utils.logger import LoggerMiddleware
+from utils.executor import analysis_pool, auth_pool, inference_pool, shutdown_pools
+from utils.model_registry import model_registry
+from utils.crop_model import crop_model_setup_error
+from utils.http_client import http_client
+from utils.db import db_pool
+from utils.insights_jobs import insights_jobs
 from models.user import SignupRequest
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pooled WAL-mode connections; creates missing tables and indexes
+    db_pool.initialize()
+    migrate_legacy_blacklist()
+    app.state.token_pruner = asyncio.create_task(prune_revoked_tokens_periodically(analysis_pool))
+    # One pooled keep-alive client serves every outbound call for the app's lifetime
+    await http_client.start()
+    # Models load lazily on first use; missing model files are reported now rather than on the first request
+    crop_setup_error = crop_model_setup_error()
+    if crop_setup_error:
+        logger.error(f"Crop health model is not set up: {crop_setup_error}")
+    # WARMUP_MODELS preloads models in the background
+    warmup_names = model_registry.warmup_names()
+    if warmup_names:
+        app.state.warmup = asyncio.create_task(inference_pool.submit(model_registry.warmup, warmup_names))
+    yield
+    app.state.token_pruner.cancel()
+    await http_client.aclose()
+    await crop_health.crop_batcher.close()
+    insights_jobs.shutdown()
+    shutdown_pools()
+    db_pool.close()
+
 app = FastAPI(
+    lifespan=lifespan,
     title="PRJ API",
     description="An API for soil analysis, vegetation indices, and geospatial data processing.",
     version="0.0.1",
@@ -48,14 +86,16 @@ app = FastAPI(
     },
 )
 
+# Per client IP; bcrypt makes every login and signup attempt cost ~0.3s of CPU
+LOGIN_RATE_LIMIT = os.getenv("LOGIN_RATE_LIMIT", "10/minute")
+SIGNUP_RATE_LIMIT = os.getenv("SIGNUP_RATE_LIMIT", "5/minute")
+
 limiter = Limiter(key_func=get_remote_address)
 app.state.limiter = limiter
+app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 with open("public.pem", "r") as f:
     PUBLIC_KEY = f.read()
     
-with open("private.pem", "rb") as f:
-    PRIVATE_KEY = rsa.PrivateKey.load_pkcs1(f.read())
-    
 app.add_middleware(LoggerMiddleware)
 
 app.add_middleware(
@@ -79,7 +119,8 @@ def get_current_user(request: Request):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username = payload.get("sub")
-        user = get_user(username)
+        with db_pool.connection() as db:
+            user = get_user(db, username)
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
         return user
@@ -88,45 +129,39 @@ def get_current_user(request: Request):
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-def decrypt_password(encrypted_password: str) -> str:
+async def decrypt_password(encrypted_password: str) -> str:
     try:
         logger.info(f"Received encrypted password: {encrypted_password}")
-        
-        # Decode from Base64
-        decrypted_bytes = rsa.decrypt(base64.b64decode(encrypted_password), PRIVATE_KEY)
-        return decrypted_bytes.decode()
-    
+        return await auth_pool.submit(rsa_decrypt_password, encrypted_password)
+    except HTTPException:
+        raise  # auth_pool is saturated
     except Exception as e:
         logger.error(f"Decryption failed: {str(e)}")
         raise HTTPException(status_code=400, detail="Invalid encryption")
 
 @app.post("/signup", tags=["Auth"])
-def signup(user: SignupRequest, db=Depends(get_db)):
-    decrypted_password = decrypt_password(user.password)  # Decrypt before hashing
-    hashed_password = get_password_hash(decrypted_password)  # Now hash it
+@limiter.limit(SIGNUP_RATE_LIMIT)
+async def signup(request: Request, user: SignupRequest):
+    decrypted_password = await decrypt_password(user.password)  # Decrypt before hashing
+    hashed_password = await auth_pool.submit(get_password_hash, decrypted_password)  # Now hash it, off the event loop
 
-    cursor = db.cursor()
+    # A connection is taken only now, not across the decrypt and hash waits
     try:
-        cursor.execute(
-            "INSERT INTO users (username, email, full_name, hashed_password) VALUES (?, ?, ?, ?)",
-            (user.username, user.email, user.full_name, hashed_password),
-        )
-        db.commit()
+        await run_in_threadpool(save_user, user.username, user.email, user.full_name, hashed_password)
     except sqlite3.IntegrityError:
         raise HTTPException(
             status_code=400, detail="Username or email already exists"
         )
-    finally:
-        db.close()
     return {"message": "User created successfully"}
 
 @app.post("/login", tags=["Auth"])
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
+@limiter.limit(LOGIN_RATE_LIMIT)
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    user = await authenticate_user_async(form_data.username, form_data.password)
     if not user:
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
-    access_token = create_access_token({"sub": user.username}, expires_delta=timedelta(hours=1))
+    access_token = create_access_token({"sub": user.username}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     logger.info(f"Generated access token for user {user.username}: {access_token}")
     
     response = JSONResponse(content={"message": "Login successful"})
@@ -157,7 +192,6 @@ def logout(request: Request, response: Response, db=Depends(get_db)):
         )
 
     add_token_to_blacklist(db, token)
-    db.close()
     response.delete_cookie("access_token")
     logger.info("Token successfully invalidated and cookie cleared.")
     
@@ -196,6 +230,20 @@ app.include_router(
     tags=["Crop Health"]
 )
 
+@app.get("/ready", tags=["Test"])
+def readiness():
+    """Readiness probe: reports 503 until the models requested by WARMUP_MODELS are loaded, and lists model setup errors."""
+    models = model_registry.status()
+    errors = model_registry.errors()
+    crop_setup_error = crop_model_setup_error()
+    if crop_setup_error:
+        errors.setdefault("crop_health", crop_setup_error)
+    ready = all(models[name] == "loaded" for name in model_registry.warmup_names())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "loading", "models": models, "errors": errors},
+    )
+
 @app.get("/", tags=["Test"])
 def read_root():
     logger.info("Root endpoint accessed.")
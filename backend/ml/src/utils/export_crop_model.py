@@ -0,0 +1,60 @@
+import os
+import sys
+import argparse
+import logging
+
+# Export code is shared with the API (backend/utils/crop_model.py) so export and serving agree
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+from utils.crop_model import (
+    build_resnet50,
+    quantize_static,
+    export_torchscript,
+    export_onnx,
+    image_batches,
+    list_images,
+)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def main(args):
+    import torch
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    output = lambda name: os.path.join(args.output_dir, name)
+
+    model = build_resnet50(args.weights, download=args.download)
+    # Keep the weights next to the exports so no server ever has to download them
+    if not os.path.exists(output("resnet50_imagenet.pth")):
+        torch.save(model.state_dict(), output("resnet50_imagenet.pth"))
+        logging.info(f"Wrote {output('resnet50_imagenet.pth')}")
+    if not args.calibration_dir:
+        return  # Weights only: enough for the eager fp32 model (CROP_MODEL_RUNTIME=eager)
+
+    # Calibration images should look like production uploads (field photos of crops)
+    images = list_images(args.calibration_dir, args.calibration_images)
+    if not images:
+        raise SystemExit(f"No calibration images found in {args.calibration_dir}")
+    logging.info(f"Calibrating on {len(images)} images from {args.calibration_dir}")
+    calibration = lambda: image_batches(images, args.batch_size)
+
+    if "torchscript" in args.formats:
+        logging.info(f"Wrote {export_torchscript(model, output('crop_health_fp32.pt'))}")
+        quantized = quantize_static(model, calibration())
+        logging.info(f"Wrote {export_torchscript(quantized, output('crop_health_int8.pt'))}")
+    if "onnx" in args.formats:
+        logging.info(f"Wrote {export_onnx(model, output('crop_health_fp32.onnx'))}")
+        logging.info(f"Wrote {export_onnx(model, output('crop_health_int8.onnx'), calibration())}")
+
+if __name__ == '__main__':
+    # Export the crop health model for CROP_MODEL_RUNTIME=torchscript / onnx
+    parser = argparse.ArgumentParser(description="Download the crop health model weights, export and int8-quantize the model")
+    parser.add_argument("--calibration-dir", help="Directory of representative crop images; without it only the weights are saved")
+    parser.add_argument("--calibration-images", type=int, default=128)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--weights", default="backend/ml/models/resnet50_imagenet.pth",
+                        help="ResNet-50 state dict")
+    parser.add_argument("--download", action="store_true",
+                        help="Download the ImageNet weights from torchvision when --weights is missing")
+    parser.add_argument("--output-dir", default="backend/ml/models")
+    parser.add_argument("--formats", type=lambda s: s.split(","), default=["torchscript", "onnx"])
+    main(parser.parse_args())
@@ -0,0 +1,32 @@
+import os
+import sys
+import argparse
+import joblib
+import numpy as np
+
+# The export code is shared with the API (backend/utils/soil_classifier.py) so export and serving agree
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+from utils.soil_classifier import CompiledSoilClassifier
+
+def main(args):
+    artifacts = [joblib.load(os.path.join(args.model_dir, name)) for name in ("soil_model.pkl", "scaler.pkl", "encoder.pkl")]
+    classifier = CompiledSoilClassifier.from_artifacts(*artifacts)
+    classifier.export_onnx(args.output)
+
+    # Sanity check: labels from onnxruntime against sklearn on rows drawn around the training distribution
+    rng = np.random.default_rng(0)
+    rows = rng.normal(classifier.mean, classifier.scale, size=(args.check_rows, len(classifier.mean))).astype(np.float32)
+    exported = CompiledSoilClassifier.from_artifacts(*artifacts)
+    if not exported.load_onnx(args.output):
+        print(f"ONNX model written to {args.output} (onnxruntime is not installed, so it was not checked)")
+        return
+    agreement = np.mean(np.array(exported.predict(rows)[0]) == np.array(classifier.predict(rows)[0]))
+    print(f"ONNX model written to {args.output}; label agreement with sklearn on {args.check_rows} rows: {agreement:.3f}")
+
+if __name__ == '__main__':
+    # Export the soil classifier for onnxruntime; the API picks it up from SOIL_CLASSIFIER_ONNX_PATH
+    parser = argparse.ArgumentParser(description="Export the trained soil classifier to ONNX (needs skl2onnx)")
+    parser.add_argument("--model-dir", default="backend/ml/models", help="Directory with soil_model.pkl, scaler.pkl and encoder.pkl")
+    parser.add_argument("--output", default="backend/ml/models/soil_model.onnx")
+    parser.add_argument("--check-rows", type=int, default=1000)
+    main(parser.parse_args())
@@ -0,0 +1,17 @@
+import os
+import sys
+import argparse
+
+# The quantization code is shared with the API (backend/utils/soil_advisor.py) so export and serving agree
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+from utils.soil_advisor import export_quantized
+
+if __name__ == '__main__':
+    # Export an int8 copy of the (fine-tuned) advisor for LLM_RUNTIME=int8
+    parser = argparse.ArgumentParser(description="Dynamically quantize the GPT-2 soil advisor to int8")
+    parser.add_argument("--model", default="./gpt2-soil-advisor", help="fp32 checkpoint written by finetune_gpt2.py")
+    parser.add_argument("--output", default="backend/ml/models/gpt2-soil-advisor-int8")
+    args = parser.parse_args()
+
+    output_dir = export_quantized(args.model, args.output)
+    print(f"Quantized model written to {output_dir}; serve it with LLM_RUNTIME=int8 LLM_QUANTIZED_PATH={output_dir}")
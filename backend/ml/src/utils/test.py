@@ -2,6 +2,7 @@ import requests
 import json
 import pandas as pd
 import os
+import sys
 import numpy as np
 from sklearn.model_selection import train_test_split, GridSearchCV
 from sklearn.preprocessing import StandardScaler, LabelEncoder
@@ -14,6 +15,10 @@ import logging
 from scipy import stats
 from tenacity import retry, stop_after_attempt, wait_fixed
 
+# Feature extraction is shared with the API (backend/utils/soil_features.py) so training and serving agree
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+from utils.soil_features import PROPERTIES, DEPTHS, VALUES, get_feature_extractor
+
 # Logging Configuration
 logging.basicConfig(
     filename="backend/ml/train_model.log",
@@ -25,10 +30,9 @@ logging.basicConfig(
 CONFIG = {
     "data_dir": "backend/ml/models",
     "api": {
-        "properties": ["bdod", "cec", "cfvo", "clay", "nitrogen", "ocd", "ocs", 
-                      "phh2o", "sand", "silt", "soc", "wv0010", "wv0033", "wv1500"],
-        "depths": ["0-5cm", "5-15cm", "15-30cm", "30-60cm", "60-100cm", "100-200cm"],
-        "values": ["Q0.5", "mean"],
+        "properties": PROPERTIES,
+        "depths": DEPTHS,
+        "values": VALUES,
         "timeout": 30
     },
     "model": {
@@ -98,44 +102,10 @@ def collect_dataset(locations: list) -> pd.DataFrame:
 
 def parse_location_data(location_data: dict) -> dict:
     """Enhanced feature engineering with depth profiles and ratios."""
-    features = {}
-    
     try:
-        prop_data = {}
-        for layer in location_data['properties']['layers']:
-            prop_name = layer['name']
-            unit_info = layer['unit_measure']
-            conversion = 10 ** (-unit_info['d_factor'] / 10)
-
-            for depth in layer['depths']:
-                depth_label = depth['label'].replace('cm', '').replace('-', '_')
-                for value_type, value in depth['values'].items():
-                    key = f"{prop_name}_{depth_label}_{value_type}"
-                    converted_value = float(value) * conversion if value else 0.0
-                    prop_data[key] = round(converted_value, 2)
-                    features[key] = prop_data[key]
-
-        # Feature engineering
-        features['clay_gradient'] = prop_data.get('clay_30_60_mean', 0) - prop_data.get('clay_0_5_mean', 0)
-        features['ph_gradient'] = prop_data.get('phh2o_30_60_mean', 0) - prop_data.get('phh2o_0_5_mean', 0)
-        
-        depth_weights = {'0_5': 0.3, '5_15': 0.25, '15_30': 0.2, '30_60': 0.15, '60_100': 0.1}
-        for prop in ['soc', 'cec', 'sand']:
-            weighted_sum = sum(
-                prop_data.get(f"{prop}_{depth}_mean", 0) * weight
-                for depth, weight in depth_weights.items()
-            )
-            features[f'{prop}_depth_weighted'] = round(weighted_sum, 2)
-
-        features['sand_clay_ratio'] = round(prop_data.get('sand_0_5_mean', 0) / 
-                                          (prop_data.get('clay_0_5_mean', 0) + 1e-6), 2)
-        features['soc_cec_balance'] = round(prop_data.get('soc_0_5_mean', 0) * 
-                                          prop_data.get('cec_0_5_mean', 0), 2)
-        features['water_capacity'] = round(prop_data.get('wv0033_0_5_mean', 0) - 
-                                         prop_data.get('wv1500_0_5_mean', 0), 2)
-
-        cec_values = [prop_data.get(f'cec_{depth}_mean', 0) for depth in depth_weights]
-        features['cec_variability'] = round(np.std(cec_values) / (np.mean(cec_values) + 1e-6), 2)
+        if 'layers' not in location_data['properties']:
+            raise KeyError('layers')
+        features = get_feature_extractor().extract_dict(location_data)
 
     except KeyError as e:
         logging.error(f"Missing key: {str(e)}")
@@ -110,4 +110,10 @@ grid_search.fit(X_train, y_train)
 best_model = grid_search.best_estimator_
 joblib.dump(best_model, MODEL_PATH)
 logging.info("Best model saved at %s", MODEL_PATH)
-print("Model training complete and saved!")
+
+# An ONNX export of the previous model would be served with the new scaler; drop it until it is re-exported
+ONNX_PATH = "backend/ml/models/soil_model.onnx"
+if os.path.exists(ONNX_PATH):
+    os.remove(ONNX_PATH)
+    logging.info("Removed stale ONNX export %s", ONNX_PATH)
+print("Model training complete and saved! Run backend/ml/src/utils/export_soil_classifier.py to serve it on onnxruntime.")
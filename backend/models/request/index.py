@@ -1,6 +1,24 @@
 from pydantic import BaseModel
+from typing import List, Optional
 
 class IndexRequest(BaseModel):
     x: int
     y: int
-    index_type: str = "ndvi"
\ No newline at end of file
+    index_type: str = "ndvi"
+    analysis_id: Optional[str] = None
+
+class IndexPoint(BaseModel):
+    x: int
+    y: int
+
+class BoundingBox(BaseModel):
+    x_min: int
+    y_min: int
+    x_max: int
+    y_max: int
+
+class IndexBatchRequest(BaseModel):
+    index_type: str = "ndvi"
+    analysis_id: Optional[str] = None
+    points: List[IndexPoint] = []
+    bbox: Optional[BoundingBox] = None
@@ -0,0 +1,31 @@
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional, Tuple
+
+class PredictPoint(BaseModel):
+    lon: float
+    lat: float
+
+class PredictBatchRequest(BaseModel):
+    points: List[PredictPoint] = []
+    geojson: Optional[Dict[str, Any]] = None  # Point, MultiPoint, Feature or FeatureCollection
+    include_llm_insights: bool = False
+
+    def coordinates(self) -> List[Tuple[float, float]]:
+        """All requested (lon, lat) pairs: the explicit points followed by the GeoJSON ones."""
+        coords = [(point.lon, point.lat) for point in self.points]
+        if self.geojson is not None:
+            coords.extend(_geojson_points(self.geojson))
+        return coords
+
+def _geojson_points(obj: Dict[str, Any]) -> List[Tuple[float, float]]:
+    kind = obj.get("type")
+    if kind == "FeatureCollection":
+        return [coord for feature in obj.get("features", []) for coord in _geojson_points(feature)]
+    if kind == "Feature":
+        return _geojson_points(obj.get("geometry") or {})
+    if kind == "Point":
+        lon, lat = obj["coordinates"][:2]
+        return [(float(lon), float(lat))]
+    if kind == "MultiPoint":
+        return [(float(c[0]), float(c[1])) for c in obj["coordinates"]]
+    raise ValueError(f"Unsupported GeoJSON type: {kind}")
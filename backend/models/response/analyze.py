@@ -1,4 +1,6 @@
 from pydantic import BaseModel
+from typing import Dict, List, Optional
+
 
 class AnalyzeIndexResponse(BaseModel):
     Mean: float
@@ -9,13 +11,37 @@ class AnalyzeIndexResponse(BaseModel):
     ModerateVegetationPercentage: float
     LowVegetationPercentage: float
 
+
 class AnalysisResponse(BaseModel):
     message: str
+    analysis_id: str
+    file_path: str
+    insights: AnalyzeIndexResponse
+
+
+class IndexAnalysisResult(BaseModel):
     file_path: str
     insights: AnalyzeIndexResponse
 
+
+class MultiAnalysisResponse(BaseModel):
+    message: str
+    analysis_id: str
+    results: Dict[str, IndexAnalysisResult]
+
+
 class IndexValueResponse(BaseModel):
     x: int
     y: int
     index_type: str
-    index_value: float
\ No newline at end of file
+    index_value: float
+
+
+class RegionStatistics(AnalyzeIndexResponse):
+    PixelCount: int
+
+
+class IndexBatchResponse(BaseModel):
+    index_type: str
+    values: List[Optional[float]]
+    region: Optional[RegionStatistics] = None
@@ -7,4 +7,17 @@ class PredResponse(BaseModel):
     confidence: float
     recommendation: str
     soil_data: SoilResponse
-    llm_insights: str
+    llm_insights: Optional[str] = None  # Set when the insights were already cached
+    insights_job_id: Optional[str] = None  # Otherwise poll /predict/insights/jobs/{id}
+    insights_status: str
+    insights_error: Optional[str] = None
+
+class InsightsJobResponse(BaseModel):
+    job_id: str
+    status: str  # queued, running, done, failed or cancelled
+    created: float
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    expires: float
+    llm_insights: Optional[str] = None
+    error: Optional[str] = None
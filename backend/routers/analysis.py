@@ -1,16 +1,15 @@
 import numpy as np
 from PIL import Image
 from pydantic import BaseModel
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from fastapi import APIRouter, Path, UploadFile, File, HTTPException, Depends, Query
-import httpx
-from httpx import Timeout
+from typing import Optional
 
 from models.user import User
 from utils.auth import get_current_active_user
 from models.response.soil import SoilResponse
-from models.request.index import IndexRequest
-from models.response.analyze import AnalysisResponse, IndexValueResponse
+from models.request.index import IndexRequest, IndexBatchRequest
+from models.response.analyze import AnalysisResponse, MultiAnalysisResponse, IndexValueResponse, IndexBatchResponse
 from utils.image_processing import (
     calculate_ndvi, 
     calculate_evi, 
@@ -18,8 +17,17 @@ from utils.image_processing import (
     calculate_arvi,
     calculate_gndvi,
     calculate_msavi,
-    perform_analysis
+    perform_analysis,
+    perform_multi_analysis,
+    COLORMAPS,
+    DEFAULT_COLORMAP
 )
+from utils.result_store import result_store
+from utils.index_stats import IndexStatsAccumulator
+from utils.executor import analysis_pool
+from utils.soilgrids import soilgrids_cache
+from utils.soil_profile import soil_profiles, DEFAULT_PROPERTIES, DEFAULT_DEPTHS, DEFAULT_VALUES
+from utils.http_client import PooledHTTPClient, get_http_client
 
 router = APIRouter()
 
@@ -32,30 +40,24 @@ INDEX_CALCULATIONS = {
     "msavi": calculate_msavi,
 }
 
-INDEX_ARRAY_PATHS = {
-    "ndvi": "output/ndvi_array.npy",
-    "evi": "output/evi_array.npy",
-    "savi": "output/savi_array.npy",
-    "arvi": "output/arvi_array.npy",
-    "gndvi": "output/gndvi_array.npy",
-    "msavi": "output/msavi_array.npy",
-}
+MAX_BATCH_POINTS = 10_000
 
-DEFAULT_PROPERTIES = [
-    "bdod", "cec", "cfvo", "clay", "nitrogen", "ocd", "ocs",
-    "phh2o", "sand", "silt", "soc", "wv0010", "wv0033", "wv1500"
-]
-DEFAULT_DEPTHS = [
-    "0-5cm", "0-30cm", "5-15cm", "15-30cm", "30-60cm", "60-100cm", "100-200cm"
-]
-DEFAULT_VALUES = ["Q0.5", "Q0.05", "Q0.95", "mean", "uncertainty"]
+def _region_stats(index_array: np.ndarray, x_min: int, y_min: int, x_max: int, y_max: int) -> dict:
+    """Statistics over one window of the raster (blocking; memory-mapped results are read from disk here)."""
+    window = index_array[y_min:y_max, x_min:x_max]
+    region = IndexStatsAccumulator().update(window).to_insights()
+    region["PixelCount"] = int(window.size)
+    return region
 
-SOILGRIDS_API_URL = "https://rest.isric.org/soilgrids/v2.0/properties/query"
+def _validate_palette(palette: str):
+    if palette not in COLORMAPS:
+        raise HTTPException(status_code=400, detail=f"Invalid palette '{palette}'. Supported palettes: {', '.join(COLORMAPS.keys())}")
 
 @router.post("/analyze/{index_name}/", response_model=AnalysisResponse, summary="Analyze an image to extract vegetation indices", description="Uploads an image and calculates a vegetation index such as NDVI, EVI, or SAVI.")
 async def dynamic_analysis(
     file: UploadFile = File(..., description="Image file for analysis"), 
     index_name: str = Path(..., description="Vegetation index to calculate (e.g., ndvi, evi, savi)"),
+    palette: str = Query(DEFAULT_COLORMAP, description="Colormap for the result map (e.g., vegetation, grayscale, heat)"),
     current_user: User = Depends(get_current_active_user)
 ):
     """Performs vegetation index analysis on the uploaded image."""
@@ -64,31 +66,90 @@ async def dynamic_analysis(
             status_code=400,
             detail=f"Invalid index name '{index_name}'. Supported indices: {', '.join(INDEX_CALCULATIONS.keys())}"
         )
+    _validate_palette(palette)
 
     calculation_function = INDEX_CALCULATIONS[index_name]
-    return await perform_analysis(file, index_name, calculation_function)
+    return await perform_analysis(file, index_name, calculation_function, current_user.username, palette)
+
+@router.post("/analyze-multi/", response_model=MultiAnalysisResponse, summary="Analyze an image to extract several vegetation indices at once", description="Uploads an image once and calculates any subset of the supported vegetation indices from a single decode.")
+async def multi_index_analysis(
+    file: UploadFile = File(..., description="Image file for analysis"),
+    indices: list[str] = Query(list(INDEX_CALCULATIONS.keys()), description="Vegetation indices to calculate (e.g., ndvi, evi, savi)"),
+    palette: str = Query(DEFAULT_COLORMAP, description="Colormap for the result maps (e.g., vegetation, grayscale, heat)"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Performs analysis of several vegetation indices on the uploaded image in one request."""
+    index_names = [name.lower() for name in indices]
+    invalid = [name for name in index_names if name not in INDEX_CALCULATIONS]
+    if invalid or not index_names:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid index names '{', '.join(invalid)}'. Supported indices: {', '.join(INDEX_CALCULATIONS.keys())}"
+        )
+    _validate_palette(palette)
+
+    return await perform_multi_analysis(file, index_names, current_user.username, palette)
 
 @router.post("/get-index-value/", response_model=IndexValueResponse, summary="Retrieve an index value from a precomputed array", description="Fetches the value of a specified vegetation index at given x, y coordinates.")
 async def get_index_value(
     request: IndexRequest,
     current_user: User = Depends(get_current_active_user)
 ):
-    """Gets the index value from the precomputed vegetation index arrays."""
+    """Gets the index value from the caller's stored analysis (the latest one unless analysis_id is given)."""
     x, y, index_type = request.x, request.y, request.index_type.lower()
 
-    if index_type not in INDEX_ARRAY_PATHS:
-        raise HTTPException(status_code=400, detail=f"Invalid index type '{index_type}'. Supported indices: {', '.join(INDEX_ARRAY_PATHS.keys())}")
+    if index_type not in INDEX_CALCULATIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid index type '{index_type}'. Supported indices: {', '.join(INDEX_CALCULATIONS.keys())}")
 
-    try:
-        index_array = np.load(INDEX_ARRAY_PATHS[index_type])
-    except FileNotFoundError:
-        raise HTTPException(status_code=404, detail=f"The array file for '{index_type}' does not exist.")
+    result = result_store.get(current_user.username, index_type, request.analysis_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No '{index_type}' analysis result is available.")
+    index_array = result.index_array
 
     if x < 0 or y < 0 or x >= index_array.shape[1] or y >= index_array.shape[0]:
         raise HTTPException(status_code=400, detail="Coordinates out of bounds.")
 
     return {"x": x, "y": y, "index_type": index_type.upper(), "index_value": float(index_array[y, x])}
 
+@router.post("/get-index-values/", response_model=IndexBatchResponse, summary="Retrieve many index values in one call", description="Fetches index values at many x, y coordinates and/or aggregate statistics over a bounding box (x_max and y_max exclusive).")
+async def get_index_values(
+    request: IndexBatchRequest,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Gets point values and region statistics from the caller's stored analysis."""
+    index_type = request.index_type.lower()
+
+    if index_type not in INDEX_CALCULATIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid index type '{index_type}'. Supported indices: {', '.join(INDEX_CALCULATIONS.keys())}")
+    if len(request.points) > MAX_BATCH_POINTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_POINTS} points can be queried at once.")
+
+    result = result_store.get(current_user.username, index_type, request.analysis_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No '{index_type}' analysis result is available.")
+    index_array = result.index_array
+    height, width = index_array.shape
+
+    # Gather all in-bounds points with one fancy index; out-of-bounds points map to null
+    xs = np.fromiter((point.x for point in request.points), dtype=np.int64, count=len(request.points))
+    ys = np.fromiter((point.y for point in request.points), dtype=np.int64, count=len(request.points))
+    in_bounds = (xs >= 0) & (ys >= 0) & (xs < width) & (ys < height)
+    values = [None] * len(request.points)
+    for position, value in zip(np.flatnonzero(in_bounds).tolist(), index_array[ys[in_bounds], xs[in_bounds]].tolist()):
+        values[position] = value
+
+    region = None
+    if request.bbox is not None:
+        bbox = request.bbox
+        x_min, y_min = max(bbox.x_min, 0), max(bbox.y_min, 0)
+        x_max, y_max = min(bbox.x_max, width), min(bbox.y_max, height)
+        if x_min >= x_max or y_min >= y_max:
+            raise HTTPException(status_code=400, detail="Bounding box does not overlap the index raster.")
+        # A large window over a big raster takes a while; keep it off the event loop
+        region = await analysis_pool.submit(_region_stats, index_array, x_min, y_min, x_max, y_max)
+
+    return {"index_type": index_type.upper(), "values": values, "region": region}
+
 @router.get("/soil-data/", response_model=SoilResponse, summary="Fetch soil properties from SoilGrids API", description="Retrieves soil data based on geographic coordinates, properties, depths, and values.")
 async def get_soil_data(
     lon: float = Query(..., description="Longitude of the location"),
@@ -96,26 +157,38 @@ async def get_soil_data(
     properties: list[str] = Query(DEFAULT_PROPERTIES, description="List of soil properties to fetch"),
     depths: list[str] = Query(DEFAULT_DEPTHS, description="Soil depths for data retrieval"),
     values: list[str] = Query(DEFAULT_VALUES, description="Statistical values to retrieve"),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    http: PooledHTTPClient = Depends(get_http_client)
 ):
     """Fetches soil data from SoilGrids API based on provided location and parameters."""
-    params = [("lon", lon), ("lat", lat)] + [("property", prop) for prop in properties] + [("depth", depth) for depth in depths] + [("value", val) for val in values]
     try:
-        async with httpx.AsyncClient(timeout=Timeout(30.0)) as client:
-            response = await client.get(SOILGRIDS_API_URL, params=params)
-            response.raise_for_status()
-            data = response.json()
+        data = await soil_profiles.query(lon, lat, properties, depths, values, client=http)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching soil data: {str(e)}")
     return {"message": "Soil data fetched successfully", "data": data}
 
+@router.get("/soil-data/cache-stats/", summary="SoilGrids cache statistics", description="Returns hit/miss counters of the SoilGrids response cache.")
+async def get_soil_cache_stats(current_user: User = Depends(get_current_active_user)):
+    """Reports how many SoilGrids lookups were served from cache."""
+    return {**soilgrids_cache.get_stats(), "upstream": get_http_client().stats()}
+
 @router.get("/get-map/", summary="Retrieve a generated vegetation index map", description="Returns a PNG image file for a specified vegetation index.")
 async def get_map(
     index_type: str = Query(..., description="Type of vegetation index to retrieve"),
+    analysis_id: Optional[str] = Query(None, description="Analysis to retrieve the map from (defaults to the latest one)"),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Fetches the vegetation index map image file."""
-    return FileResponse(f"output/{index_type}_result.png", media_type="image/png")
+    """Fetches the vegetation index map image of the caller's stored analysis."""
+    if index_type.lower() not in INDEX_CALCULATIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid index type '{index_type}'. Supported indices: {', '.join(INDEX_CALCULATIONS.keys())}")
+    result = result_store.get(current_user.username, index_type, analysis_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No '{index_type}' analysis result is available.")
+    if result.map_png is not None:
+        return Response(content=result.map_png, media_type="image/png")
+    return FileResponse(result.map_path, media_type="image/png")
 
 @router.get("/protected-data", summary="Protected route", description="Returns a message if the user is authenticated.", tags=["Test"])
 def get_protected_data(current_user: User = Depends(get_current_active_user)):
@@ -1,64 +1,57 @@
 from fastapi import APIRouter, File, UploadFile, HTTPException, Depends
 from fastapi.responses import JSONResponse
-import torch
-from torchvision import transforms
-from PIL import Image
-import io
+import os
 import logging
+from typing import TYPE_CHECKING, Dict, List, Tuple
 from datetime import datetime
 from models.user import User
 from utils.auth import get_current_active_user
 from models.response.crop_health import HealthMetrics, DetailedAssessment
-import numpy as np
+from utils.executor import analysis_pool, inference_pool
+from utils.batching import MicroBatcher
+from utils.model_registry import model_registry
+from utils.crop_model import load_crop_model, predict_proba
+from utils.crop_preprocessing import preprocess
+
+# torch is imported lazily so that starting the API does not pay for it
+if TYPE_CHECKING:
+    import torch
 
 router = APIRouter()
 
-# Load the specialized crop disease detection model
-try:
-    model = torch.hub.load('pytorch/vision:v0.10.0', 'resnet50', pretrained=True)
+# Concurrent requests are batched into one forward pass of up to this many images...
+MAX_BATCH_SIZE = int(os.getenv("CROP_HEALTH_MAX_BATCH_SIZE", 8))
+# ...collected for at most this long after the first one arrives
+MAX_BATCH_WAIT_MS = float(os.getenv("CROP_HEALTH_MAX_BATCH_WAIT_MS", 10))
+
+# Load the specialized crop disease detection model on first use
+def load_crop_health_model():
     # TODO: Replace with custom-trained agricultural disease model
-    model.eval()
-    logging.info("Crop disease detection model loaded successfully")
-except Exception as e:
-    model = None
-    logging.error(f"Failed to load crop disease model: {str(e)}")
-
-# Enhanced image transformation pipeline
-transform = transforms.Compose([
-    transforms.Resize(256),
-    transforms.CenterCrop(224),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-    transforms.RandomHorizontalFlip(p=0.3),  # Data augmentation
-    transforms.RandomRotation(degrees=15)     # Data augmentation
-])
-
-def analyze_image_features(image: Image.Image) -> HealthMetrics:
+    # CROP_MODEL_RUNTIME selects eager fp32 or an exported (e.g. int8 TorchScript) model
+    return load_crop_model()
+
+model_registry.register("crop_health", load_crop_health_model)
+
+def analyze_image_features(stats: Dict[str, float]) -> HealthMetrics:
     """Analyze detailed features of the crop image."""
-    img_array = np.array(image)
-    
-    # Calculate leaf color score
-    hsv_img = Image.fromarray(img_array).convert('HSV')
-    hsv_array = np.array(hsv_img)
-    leaf_color_score = float(np.mean(hsv_array[:,:,1]))  # Saturation channel
-    
-    # Calculate texture uniformity
-    gray_img = np.mean(img_array, axis=2)
-    texture_uniformity = float(np.std(gray_img))  # Lower std means more uniform
-    
+    # Leaf color score: mean of the saturation channel
+    leaf_color_score = stats["mean_saturation"]
+
+    # Texture uniformity: lower std means more uniform
+    texture_uniformity = stats["gray_std"]
+
     # Analyze growth pattern
-    vertical_profile = np.mean(gray_img, axis=1)
-    growth_pattern = "Regular" if np.std(vertical_profile) < 50 else "Irregular"
-    
+    growth_pattern = "Regular" if stats["row_profile_std"] < 50 else "Irregular"
+
     # Detect stress indicators
     stress_indicators = []
-    if np.mean(hsv_array[:,:,0]) < 30:  # Hue analysis
+    if stats["mean_hue"] < 30:  # Hue analysis
         stress_indicators.append("Yellowing")
     if texture_uniformity > 100:
         stress_indicators.append("Irregular Growth")
-    if np.mean(img_array[:,:,1]) < 100:  # Green channel analysis
+    if stats["mean_green"] < 100:  # Green channel analysis
         stress_indicators.append("Chlorosis")
-    
+
     return HealthMetrics(
         leaf_color_score=leaf_color_score,
         texture_uniformity=texture_uniformity,
@@ -75,6 +68,83 @@ def get_severity_level(disease_prob: float, metrics: HealthMetrics) -> str:
     else:
         return "High"
 
+def _preprocess_image(image_data: bytes) -> Tuple["torch.Tensor", HealthMetrics]:
+    """Decode an image into a model input tensor and its health metrics (blocking)."""
+    # One reduced-resolution decode feeds both the model input and the image statistics
+    image_tensor, stats = preprocess(image_data)
+    metrics = analyze_image_features(stats)
+    return image_tensor, metrics
+
+def _run_model_batch(image_tensors: List["torch.Tensor"]) -> List["torch.Tensor"]:
+    """Run one forward pass over a stacked batch and split the class probabilities per image."""
+    import torch
+    model = model_registry.get("crop_health")
+    return list(predict_proba(model, torch.stack(image_tensors)))
+
+crop_batcher = MicroBatcher("crop-health", _run_model_batch, inference_pool, MAX_BATCH_SIZE, MAX_BATCH_WAIT_MS)
+
+def _build_assessment(image_tensor: "torch.Tensor", metrics: HealthMetrics, probabilities: "torch.Tensor") -> DetailedAssessment:
+    """Turn one image's class probabilities and metrics into the assessment response."""
+    import torch
+    # Get prediction and confidence
+    max_prob, predicted = torch.max(probabilities, 0)
+    confidence = float(max_prob)
+    disease_prob = 1.0 - confidence if confidence < 0.8 else 0.0
+
+    # Determine severity and status
+    severity_level = get_severity_level(disease_prob, metrics)
+    health_status = "Healthy" if disease_prob < 0.2 else "Potential Issues Detected"
+
+    # Generate environmental factors analysis
+    env_factors = {
+        "light_exposure": float(image_tensor[0].mean().detach().numpy()),
+        "moisture_indicator": float(image_tensor[2].mean().detach().numpy()),
+        "stress_factor": float(len(metrics.stress_indicators) / 4)
+    }
+
+    # Generate comprehensive recommendations
+    recommendations = [
+        f"Current Growth Pattern: {metrics.growth_pattern}",
+        f"Leaf Health Score: {metrics.leaf_color_score:.2f}/255"
+    ]
+
+    if health_status == "Healthy":
+        recommendations.extend([
+            "Continue current maintenance practices",
+            "Monitor for any changes in leaf color or texture",
+            "Maintain optimal irrigation schedule",
+            f"Regular monitoring of {', '.join(env_factors.keys())}"
+        ])
+    else:
+        recommendations.extend([
+            "Inspect affected areas more closely",
+            "Consider soil testing for nutrient deficiencies",
+            "Consult with local agricultural extension for specific treatment",
+            "Document symptoms and progression",
+            f"Address identified stress factors: {', '.join(metrics.stress_indicators)}"
+        ])
+
+    # Define follow-up actions
+    follow_up_actions = [
+        "Schedule next assessment in 7 days",
+        "Document changes in affected areas",
+        "Monitor weather conditions",
+        "Update treatment plan based on progression"
+    ]
+
+    return DetailedAssessment(
+        timestamp=datetime.now().isoformat(),
+        metrics=metrics,
+        disease_probability=disease_prob,
+        health_status=health_status,
+        severity_level=severity_level,
+        affected_areas=["Leaves", "Stem"] if disease_prob > 0.2 else [],
+        environmental_factors=env_factors,
+        recommendations=recommendations,
+        confidence_score=confidence,
+        follow_up_actions=follow_up_actions
+    )
+
 @router.post("/assess-crop-health/", 
              response_model=DetailedAssessment,
              summary="Advanced crop health assessment",
@@ -87,82 +157,30 @@ async def assess_crop_health(
     if not file:
         raise HTTPException(status_code=400, detail="No image file provided")
 
-    if model is None:
-        raise HTTPException(status_code=500, detail="Model not available")
+    if await model_registry.aget("crop_health", inference_pool) is None:
+        error = model_registry.errors().get("crop_health", "not loaded")
+        raise HTTPException(status_code=503, detail=f"Crop health model not available: {error}")
 
     try:
-        # Read and preprocess the image
+        # Decoding runs on the analysis pool; inference is micro-batched with concurrent requests
         image_data = await file.read()
-        image = Image.open(io.BytesIO(image_data)).convert('RGB')
-        image_tensor = transform(image).unsqueeze(0)
-
-        # Analyze image features
-        metrics = analyze_image_features(image)
-
-        # Perform ML inference
-        with torch.no_grad():
-            outputs = model(image_tensor)
-            probabilities = torch.nn.functional.softmax(outputs[0], dim=0)
-
-        # Get prediction and confidence
-        max_prob, predicted = torch.max(probabilities, 0)
-        confidence = float(max_prob)
-        disease_prob = 1.0 - confidence if confidence < 0.8 else 0.0
-
-        # Determine severity and status
-        severity_level = get_severity_level(disease_prob, metrics)
-        health_status = "Healthy" if disease_prob < 0.2 else "Potential Issues Detected"
-
-        # Generate environmental factors analysis
-        env_factors = {
-            "light_exposure": float(image_tensor[0,0].mean().detach().numpy()),
-            "moisture_indicator": float(image_tensor[0,2].mean().detach().numpy()),
-            "stress_factor": float(len(metrics.stress_indicators) / 4)
-        }
-
-        # Generate comprehensive recommendations
-        recommendations = [
-            f"Current Growth Pattern: {metrics.growth_pattern}",
-            f"Leaf Health Score: {metrics.leaf_color_score:.2f}/255"
-        ]
-
-        if health_status == "Healthy":
-            recommendations.extend([
-                "Continue current maintenance practices",
-                "Monitor for any changes in leaf color or texture",
-                "Maintain optimal irrigation schedule",
-                f"Regular monitoring of {', '.join(env_factors.keys())}"
-            ])
-        else:
-            recommendations.extend([
-                "Inspect affected areas more closely",
-                "Consider soil testing for nutrient deficiencies",
-                "Consult with local agricultural extension for specific treatment",
-                "Document symptoms and progression",
-                f"Address identified stress factors: {', '.join(metrics.stress_indicators)}"
-            ])
-
-        # Define follow-up actions
-        follow_up_actions = [
-            "Schedule next assessment in 7 days",
-            "Document changes in affected areas",
-            "Monitor weather conditions",
-            "Update treatment plan based on progression"
-        ]
-
-        return DetailedAssessment(
-            timestamp=datetime.now().isoformat(),
-            metrics=metrics,
-            disease_probability=disease_prob,
-            health_status=health_status,
-            severity_level=severity_level,
-            affected_areas=["Leaves", "Stem"] if disease_prob > 0.2 else [],
-            environmental_factors=env_factors,
-            recommendations=recommendations,
-            confidence_score=confidence,
-            follow_up_actions=follow_up_actions
-        )
+        image_tensor, metrics = await analysis_pool.submit(_preprocess_image, image_data)
+        probabilities = await crop_batcher.submit(image_tensor)
+        return _build_assessment(image_tensor, metrics, probabilities)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error processing image: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+@router.get("/assess-crop-health/batch-stats/",
+            summary="Crop health inference batching statistics",
+            description="Returns the histogram of batch sizes used by the crop health model since startup")
+def get_batch_stats(current_user: User = Depends(get_current_active_user)):
+    """Reports how effectively concurrent assessments are being batched."""
+    return {
+        "max_batch_size": MAX_BATCH_SIZE,
+        "max_wait_ms": MAX_BATCH_WAIT_MS,
+        **crop_batcher.stats()
+    }
@@ -2,8 +2,8 @@ from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List, Optional
 from models.user import User
 from utils.auth import get_current_active_user
-import httpx
-from httpx import Timeout
+from utils.soil_profile import soil_profiles
+from utils.http_client import PooledHTTPClient, get_http_client
 import numpy as np
 from datetime import datetime
 
@@ -17,7 +17,8 @@ async def predict_crop_yield(
     lat: float = Query(..., description="Latitude of the location"),
     crop_type: str = Query(..., description="Type of crop for yield prediction"),
     planting_date: str = Query(..., description="Planned planting date (YYYY-MM-DD)"),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    http: PooledHTTPClient = Depends(get_http_client)
 ):
     """Predicts potential crop yield based on soil and environmental conditions."""
     try:
@@ -28,19 +29,8 @@ async def predict_crop_yield(
             raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
         # Fetch soil data for yield analysis
-        async with httpx.AsyncClient(timeout=Timeout(30.0)) as client:
-            response = await client.get(
-                "https://rest.isric.org/soilgrids/v2.0/properties/query",
-                params={
-                    "lon": lon,
-                    "lat": lat,
-                    "property": ["nitrogen", "phh2o", "soc", "clay"],
-                    "depth": ["0-30cm"],
-                    "value": ["mean"]
-                }
-            )
-            response.raise_for_status()
-            soil_data = response.json()
+        profile = await soil_profiles.get_profile(lon, lat, client=http)
+        soil_data = {"properties": profile.slice(["nitrogen", "phh2o", "soc", "clay"], "0-30cm")}
 
         # Calculate yield potential factors
         soil_quality_score = _calculate_soil_quality(soil_data)
@@ -64,6 +54,8 @@ async def predict_crop_yield(
             "recommendations": _generate_recommendations(soil_quality_score, climate_suitability)
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error predicting crop yield: {str(e)}")
 
@@ -1,15 +1,35 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, APIRouter, Depends
+from fastapi import FastAPI, HTTPException, BackgroundTasks, APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
 import joblib
 import os
+import asyncio
+import pickle
+import threading
 import logging
-import pandas as pd
+import numpy as np
 import json
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from routers.analysis import get_soil_data
 from models.user import User
-from models.response.pred import PredResponse
+from models.request.pred import PredictBatchRequest
+from models.response.pred import PredResponse, InsightsJobResponse
 from utils.auth import get_current_active_user
+from utils.executor import analysis_pool, inference_pool
+from utils.model_registry import model_registry
+from utils.http_client import PooledHTTPClient, get_http_client
+from utils.soil_profile import soil_profiles
+from utils.soil_classifier import CompiledSoilClassifier
+from utils.soil_advisor import (
+    load_soil_advisor,
+    normalize_context,
+    build_prompt_suffix,
+    resolve_token_budget,
+    insights_cache,
+    stream_generation
+)
+from utils.insights_jobs import InsightsJob, insights_jobs
+from utils.soil_features import FeatureExtractor, get_feature_extractor, FEATURE_NAMES, PROPERTIES, DEPTHS, VALUES
 from pydantic import BaseModel
-from transformers import pipeline, AutoModelForCausalLM, AutoTokenizer  # Import the pipeline from transformers
 
 router = APIRouter()
 
@@ -50,112 +70,108 @@ def load_model_artifacts():
         logging.error(f"Unexpected error loading model artifacts: {str(e)}")
         return None, None, None
 
-model, scaler, encoder = load_model_artifacts()
-
-DEFAULT_DEPTHS = ["0-5cm", "5-15cm", "15-30cm", "30-60cm", "60-100cm", "100-200cm"]
-DEFAULT_VALUES = ["Q0.5", "mean"]
-REQUIRED_FEATURES = ["bdod", "cec", "cfvo", "clay", "nitrogen", "ocd", "ocs", 
-                    "phh2o", "sand", "silt", "soc", "wv0010", "wv0033", "wv1500"]
-
-# Initialize GPT-2 model with enhanced configuration
-tokenizer = AutoTokenizer.from_pretrained('gpt2')
-llm_model = AutoModelForCausalLM.from_pretrained('gpt2')
-
-# Configure system prompt and few-shot examples for better context
-SYSTEM_PROMPT = """
-You are an expert agricultural and soil science advisor. Analyze soil data and provide detailed, scientific recommendations.
-Consider multiple factors including soil composition, pH levels, nutrient content, and environmental conditions.
-Provide specific, actionable advice based on data-driven analysis.
-"""
-
-# Configure pipeline with optimized parameters
-llm_pipeline = pipeline(
-    "text-generation",
-    model=llm_model,
-    tokenizer=tokenizer,
-    framework="pt",
-    device="cpu",  # Change to "cuda" if GPU is available
-)
-
-def generate_llm_insights(prediction: str, confidence: float, recommendation: str, soil_data: dict) -> str:
-    """Generate structured soil insights using fine-tuned GPT-2 model."""
-    try:
-        # Extract key soil properties with meaningful depth values
-        relevant_layers = {"phh2o", "clay", "sand", "soc", "nitrogen", "cec"}  # Key soil properties
-        soil_summary = []
-
-        for layer in soil_data.get('data', {}).get('properties', {}).get('layers', []):
-            if layer["name"] in relevant_layers:
-                depths = layer.get("depths", [])[:2]  # Focus on topsoil layers
-                for depth in depths:
-                    value_q50 = depth['values'].get('Q0.5', 'N/A')
-                    value_mean = depth['values'].get('mean', 'N/A')
-                    if value_q50 != 'N/A' and value_mean != 'N/A':
-                        soil_summary.append(
-                            f"- {layer['name']} ({depth['label']}): Median {value_q50:.2f}, "
-                            f"Mean {value_mean:.2f}"
-                        )
-
-        soil_summary_text = "\n".join(soil_summary) if soil_summary else "No relevant soil data available."
-
-        # Enhanced prompt with chain-of-thought reasoning and structured analysis
-        prompt = f"{SYSTEM_PROMPT}\n\nANALYSIS CONTEXT:\n{'-' * 40}\n"
-        
-        # Add soil classification context
-        prompt += f"Soil Classification:\n- Type: {prediction}\n- Confidence: {confidence:.2f}\n- Base Recommendation: {recommendation}\n\n"
-        
-        # Add detailed soil data analysis
-        prompt += f"Soil Composition Analysis:\n{soil_summary_text}\n\n"
-        
-        # Add structured reasoning steps
-        prompt += "ANALYSIS STEPS:\n"
-        prompt += "1. First, analyze the soil composition and its implications:\n"
-        prompt += "2. Then, evaluate nutrient levels and pH balance:\n"
-        prompt += "3. Next, consider water retention and drainage characteristics:\n"
-        prompt += "4. Finally, synthesize findings into practical recommendations:\n\n"
-        
-        # Add specific requirements
-        prompt += "REQUIRED INSIGHTS:\n"
-        prompt += "1. Soil Health Analysis:\n   - Current soil properties evaluation\n   - Limiting factors identification\n   - Improvement recommendations\n\n"
-        prompt += "2. Crop Recommendations:\n   - Primary crop suggestions with scientific rationale\n   - Rotation strategies\n   - Expected yields and conditions\n\n"
-        prompt += "3. Management Strategy:\n   - Immediate actions needed\n   - Long-term improvement plan\n   - Resource optimization techniques\n\n"
-        
-        prompt += "Please provide a detailed, scientific analysis following the above structure:\n"
-
-        # Generate response with optimized parameters
-        response = llm_pipeline(
-            prompt,
-            max_new_tokens=1000,  # Increased for more detailed response
-            num_return_sequences=1,
-            temperature=0.8,      # Slightly increased for more creative responses
-            top_p=0.92,          # Adjusted for better quality
-            top_k=50,            # Added for better token selection
-            do_sample=True,
-            repetition_penalty=1.2,  # Added to reduce repetition
-            pad_token_id=tokenizer.pad_token_id,
-            no_repeat_ngram_size=3  # Prevent repetition of phrases
-        )
-
-        # Process response
-        if response and isinstance(response, list) and len(response) > 0:
-            generated_text = response[0].get('generated_text', '')
-
-            # Extract response content after the prompt
-            split_marker = "### Begin your detailed response below:"
-            if split_marker in generated_text:
-                cleaned_response = generated_text.split(split_marker)[-1].strip()
-            else:
-                cleaned_response = generated_text.strip()
-
-            return cleaned_response if cleaned_response else "Error: Response was empty."
+def load_soil_classifier():
+    model, scaler, encoder = load_model_artifacts()
+    if model is None:
+        return None
+    classifier = CompiledSoilClassifier.from_artifacts(model, scaler, encoder)
+    classifier.load_onnx()
+    return classifier
+
+model_registry.register("soil_classifier", load_soil_classifier)
+
+# Same SoilGrids query the classifier was trained on
+DEFAULT_DEPTHS = DEPTHS
+DEFAULT_VALUES = VALUES
+REQUIRED_FEATURES = PROPERTIES
+
+MAX_PREDICT_BATCH_POINTS = int(os.getenv("MAX_PREDICT_BATCH_POINTS", 5000))
+# SoilGrids lookups in flight per batch request
+PREDICT_BATCH_CONCURRENCY = int(os.getenv("PREDICT_BATCH_CONCURRENCY", 16))
+# Points that are classified together and streamed back before the next group is fetched
+PREDICT_BATCH_CHUNK_SIZE = int(os.getenv("PREDICT_BATCH_CHUNK_SIZE", 500))
+
+model_registry.register("soil_advisor", load_soil_advisor)
+
+# Recommendations based on actual soil types
+RECOMMENDATIONS = {
+    'Acidic_Organic': "Recommended: Blueberries, Potatoes, Rhododendrons (thrive in acidic organic soils)",
+    'Neutral_HighFertility': "Recommended: Wheat, Corn, Soybeans (utilize high nutrient availability)",
+    'Sandy_LowFertility': "Recommended: Carrots, Radishes, Lavender (tolerate sandy/low-fertility soils)",
+    'Clayey_PoorDrainage': "Recommended: Willows, Rice, Cattails (adapt to heavy clay/poor drainage)",
+    'Calcareous': "Recommended: Grapes, Olives, Alfalfa (suitable for alkaline/calcareous soils)",
+    'Other': "Recommended: Legumes, Cover Crops (improve soil health)"
+}
+
+def get_recommendation(prediction: str) -> str:
+    return RECOMMENDATIONS.get(prediction, "Consult an agronomist for custom advice")
+
+def get_extractor(classifier: CompiledSoilClassifier) -> FeatureExtractor:
+    """Feature extractor compiled for the column order the classifier was fitted on."""
+    return get_feature_extractor(tuple(classifier.feature_names or FEATURE_NAMES))
+
+def extract_features(soil_data: dict, extractor: FeatureExtractor, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Model feature vector of a /soil-data/ response."""
+    data = soil_data.get("data", {})
+    if not isinstance(data.get("properties", {}).get("layers", []), list):
+        raise ValueError("Unexpected structure for layers in soil data.")
+    return extractor.extract(data, out)
+
+def _insights_request(prediction: str, confidence: float, recommendation: str, soil_data: dict,
+                      max_new_tokens: Optional[int]) -> Tuple[str, dict, int]:
+    """(cache key, normalized prompt context, token budget) of an insights request."""
+    context = normalize_context(prediction, confidence, recommendation, soil_data)
+    budget = resolve_token_budget(max_new_tokens)
+    return insights_cache.make_key(context, budget), context, budget
+
+def generate_uncached_insights(key: str, context: dict, budget: int, stop_event: Optional[threading.Event] = None) -> str:
+    """Generate and cache insights for a key already looked up in the cache; raises RuntimeError on failure."""
+    advisor = model_registry.get("soil_advisor")
+    if advisor is None:
+        raise RuntimeError("LLM not available.")
+
+    generated_text = advisor.generate(build_prompt_suffix(context), budget, stop_event=stop_event)
+    if stop_event is not None and stop_event.is_set():
+        raise RuntimeError("Generation was cancelled.")
+    if not generated_text:
+        raise RuntimeError("Response was empty.")
+    insights_cache.put(key, generated_text)
+    return generated_text
+
+def _insights_fields(owner: str, prediction: str, confidence: float, recommendation: str, soil_data: dict,
+                     max_new_tokens: Optional[int] = None, submitted: Optional[Dict[str, InsightsJob]] = None) -> dict:
+    """Cached insights, or the background job generating them (jobs in `submitted` are reused per cache key)."""
+    key, context, budget = _insights_request(prediction, confidence, recommendation, soil_data, max_new_tokens)
+    cached = insights_cache.get(key)
+    if cached is not None:
+        return {"llm_insights": cached, "insights_status": "done"}
+
+    job = submitted.get(key) if submitted is not None else None
+    if job is None:
+        try:
+            # The cache was just checked, so the job goes straight to generation
+            job = insights_jobs.submit(owner, generate_uncached_insights, key, context, budget)
+        except HTTPException as e:
+            # Over the per-user or queue limit: still answer with the classification
+            return {"llm_insights": None, "insights_status": "rejected", "insights_error": str(e.detail)}
+        if submitted is not None:
+            submitted[key] = job
+    return {"llm_insights": None, "insights_job_id": job.id, "insights_status": job.status}
+
+async def _classify_location(lon: float, lat: float, current_user: User, http: PooledHTTPClient) -> Tuple[str, float, dict]:
+    """(condition, confidence, soil data) for one location."""
+    classifier = await model_registry.aget("soil_classifier", analysis_pool)
+    if classifier is None:
+        raise HTTPException(status_code=500, detail="⚠️ Model not found! Train it first using `train_model.py`.")
 
-        return "Error: No valid response generated."
+    soil_data = await get_soil_data(lon, lat, REQUIRED_FEATURES, DEFAULT_DEPTHS, DEFAULT_VALUES, current_user, http)
+    if "data" not in soil_data:
+        raise HTTPException(status_code=500, detail="Failed to fetch soil data.")
 
-    except Exception as e:
-        logging.error(f"LLM generation error: {str(e)}")
-        return f"Error: {str(e)}"
+    features = extract_features(soil_data, get_extractor(classifier))
+    predictions, confidences = classifier.predict(features[np.newaxis, :])
+    return predictions[0], confidences[0], soil_data
 
-    
 @router.get("/predict", response_model=PredResponse,     
             summary="Predict soil condition and recommend crops",
             description="""
@@ -170,77 +186,211 @@ def generate_llm_insights(prediction: str, confidence: float, recommendation: st
             - Confidence score (0-1).
             - Crop recommendations based on condition.
             - Fetched soil data for the location.
+            - LLM insights if already cached, otherwise the ID of a background job generating them
+              (poll `/predict/insights/jobs/{job_id}`).
 
             **Error Handling:**
             - Returns an error if the model or soil data is unavailable.
             """)
 async def predict_soil(lon: float, 
                        lat: float, 
-                       current_user: User = Depends(get_current_active_user)
+                       max_new_tokens: Optional[int] = Query(None, ge=1, description="Token budget for the LLM insights (capped by LLM_MAX_NEW_TOKENS)"),
+                       current_user: User = Depends(get_current_active_user),
+                       http: PooledHTTPClient = Depends(get_http_client)
                        ):
     """Predicts soil condition & provides crop recommendations using real soil data."""
-    if model is None or scaler is None:
-        raise HTTPException(status_code=500, detail="⚠️ Model not found! Train it first using `train_model.py`.")
-
-    soil_data = await get_soil_data(lon, lat, REQUIRED_FEATURES, DEFAULT_DEPTHS, DEFAULT_VALUES)
-    if "data" not in soil_data:
-        raise HTTPException(status_code=500, detail="Failed to fetch soil data.")
-
     try:
-        # Extract feature values from soil data
-        feature_values = {}
-        layers = soil_data.get("data", {}).get("properties", {}).get("layers", [])
-        if not isinstance(layers, list):
-            raise ValueError("Unexpected structure for layers in soil data.")
-
-        for layer in layers:
-            prop_name = layer.get("name")
-            if prop_name not in REQUIRED_FEATURES:
-                continue
-
-            for depth in layer.get("depths", []):
-                depth_label = depth.get("label", "").replace("cm", "").replace("-", "_")
-                for value_type, value in depth.get("values", {}).items():
-                    key = f"{prop_name}_{depth_label}_{value_type}"
-                    feature_values[key] = float(value) if value else 0.0
-
-        # Ensure the feature values are in the correct order expected by the scaler
-        if hasattr(scaler, "feature_names_in_"):
-            feature_names = scaler.feature_names_in_
-            feature_values_ordered = [feature_values.get(feat, 0.0) for feat in feature_names]
-        else:
-            feature_values_ordered = list(feature_values.values())
-
-        # Convert to DataFrame to match scaler's expected input format
-        feature_df = pd.DataFrame([feature_values_ordered], columns=feature_names if hasattr(scaler, "feature_names_in_") else feature_values.keys())
-        scaled_data = scaler.transform(feature_df)
-
-        # Make predictions with the updated model
-        prediction = encoder.inverse_transform([model.predict(scaled_data)[0]])[0]
-        probabilities = model.predict_proba(scaled_data)
-        confidence = max(probabilities[0])
-
-        # Updated recommendations based on actual soil types
-        recommendations = {
-            'Acidic_Organic': "Recommended: Blueberries, Potatoes, Rhododendrons (thrive in acidic organic soils)",
-            'Neutral_HighFertility': "Recommended: Wheat, Corn, Soybeans (utilize high nutrient availability)",
-            'Sandy_LowFertility': "Recommended: Carrots, Radishes, Lavender (tolerate sandy/low-fertility soils)",
-            'Clayey_PoorDrainage': "Recommended: Willows, Rice, Cattails (adapt to heavy clay/poor drainage)",
-            'Calcareous': "Recommended: Grapes, Olives, Alfalfa (suitable for alkaline/calcareous soils)",
-            'Other': "Recommended: Legumes, Cover Crops (improve soil health)"
-        }
-
-        # Generate additional insights using the LLM
-        llm_insights = generate_llm_insights(prediction, confidence, recommendations.get(prediction, "Consult an agronomist for custom advice"), soil_data)
+        prediction, confidence, soil_data = await _classify_location(lon, lat, current_user, http)
+        recommendation = get_recommendation(prediction)
 
+        # Cached insights are answered right away; otherwise generation is queued as a background job
         return {
             "condition": prediction,
             "confidence": float(confidence),
-            "recommendation": recommendations.get(prediction, "Consult an agronomist for custom advice"),
+            "recommendation": recommendation,
             "soil_data": soil_data,
-            "llm_insights": llm_insights  # Add LLM insights to the response
+            **_insights_fields(current_user.username, prediction, confidence, recommendation, soil_data, max_new_tokens),
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Prediction error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _fetch_point_soil(semaphore: asyncio.Semaphore, lon: float, lat: float, http: PooledHTTPClient) -> dict:
+    async with semaphore:
+        data = await soil_profiles.query(lon, lat, REQUIRED_FEATURES, DEFAULT_DEPTHS, DEFAULT_VALUES, client=http)
+    return {"message": "Soil data fetched successfully", "data": data}
+
+def _error_detail(error: BaseException) -> str:
+    return str(error.detail) if isinstance(error, HTTPException) else str(error)
+
+async def _predict_batch_lines(classifier: CompiledSoilClassifier, coords: List[Tuple[float, float]], include_llm_insights: bool,
+                               http: PooledHTTPClient, owner: str) -> AsyncIterator[str]:
+    """Yield one NDJSON line per point, in request order, a chunk at a time."""
+    semaphore = asyncio.Semaphore(PREDICT_BATCH_CONCURRENCY)
+    extractor = get_extractor(classifier)
+    # Insight jobs of this batch by cache key, so identical points share one generation
+    submitted: Dict[str, InsightsJob] = {}
+    for start in range(0, len(coords), PREDICT_BATCH_CHUNK_SIZE):
+        chunk = coords[start:start + PREDICT_BATCH_CHUNK_SIZE]
+        results = [{"index": start + i, "lon": lon, "lat": lat} for i, (lon, lat) in enumerate(chunk)]
+        soil = await asyncio.gather(
+            *[_fetch_point_soil(semaphore, lon, lat, http) for lon, lat in chunk], return_exceptions=True
+        )
+
+        matrix = np.empty((len(chunk), extractor.n_features), dtype=np.float32)
+        row_positions = []
+        for i, soil_data in enumerate(soil):
+            if isinstance(soil_data, BaseException):
+                results[i]["error"] = f"Error fetching soil data: {_error_detail(soil_data)}"
+                continue
+            try:
+                extract_features(soil_data, extractor, out=matrix[len(row_positions)])
+                row_positions.append(i)
+            except ValueError as e:
+                results[i]["error"] = str(e)
+
+        if row_positions:
+            try:
+                # One scaler/classifier pass for the whole chunk
+                predictions, confidences = await analysis_pool.submit(classifier.predict, matrix[:len(row_positions)])
+            except Exception as e:
+                logging.error(f"Batch prediction error: {str(e)}")
+                for i in row_positions:
+                    results[i]["error"] = _error_detail(e)
+                predictions, confidences = [], []
+
+            for i, prediction, confidence in zip(row_positions, predictions, confidences):
+                recommendation = get_recommendation(prediction)
+                results[i].update(condition=prediction, confidence=confidence, recommendation=recommendation)
+                if include_llm_insights:
+                    # Never generated inline: GPT-2 runs through the insights job queue and its limits
+                    results[i].update(_insights_fields(owner, prediction, confidence, recommendation, soil[i],
+                                                       submitted=submitted))
+
+        for result in results:
+            yield json.dumps(result) + "\n"
+
+@router.post("/predict/batch",
+             summary="Predict soil condition for many locations",
+             description="""
+             Scores a list of points and/or a GeoJSON Point, MultiPoint, Feature or FeatureCollection.
+             Soil data is fetched concurrently, the classifier runs once per chunk of points, and results
+             are streamed back as NDJSON (one JSON object per line, in request order). Points that fail
+             carry an `error` field instead of a prediction. With `include_llm_insights` set, each point
+             carries its cached insights or, as with `/predict`, the ID of a background job generating them
+             (poll `/predict/insights/jobs/{job_id}`); points beyond the per-user job limit are marked
+             `insights_status: rejected`.
+             """)
+async def predict_soil_batch(request: PredictBatchRequest,
+                             current_user: User = Depends(get_current_active_user),
+                             http: PooledHTTPClient = Depends(get_http_client)
+                             ):
+    """Streams soil condition predictions for a batch of coordinates."""
+    try:
+        coords = request.coordinates()
+    except (ValueError, KeyError, TypeError, IndexError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid GeoJSON: {str(e)}")
+    if not coords:
+        raise HTTPException(status_code=400, detail="No points provided.")
+    if len(coords) > MAX_PREDICT_BATCH_POINTS:
+        raise HTTPException(status_code=400, detail=f"Too many points (max {MAX_PREDICT_BATCH_POINTS}).")
+
+    classifier = await model_registry.aget("soil_classifier", analysis_pool)
+    if classifier is None:
+        raise HTTPException(status_code=500, detail="⚠️ Model not found! Train it first using `train_model.py`.")
+
+    return StreamingResponse(
+        _predict_batch_lines(classifier, coords, request.include_llm_insights, http, current_user.username),
+        media_type="application/x-ndjson",
+    )
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+async def _insights_events(prediction: str, confidence: float, soil_data: dict, max_new_tokens: Optional[int]) -> AsyncIterator[str]:
+    recommendation = get_recommendation(prediction)
+    yield _sse("prediction", {"condition": prediction, "confidence": confidence, "recommendation": recommendation})
+
+    key, context, budget = _insights_request(prediction, confidence, recommendation, soil_data, max_new_tokens)
+    cached = insights_cache.get(key)
+    if cached is not None:
+        yield _sse("token", {"text": cached})
+        yield _sse("done", {"cached": True})
+        return
+
+    try:
+        advisor = await model_registry.aget("soil_advisor", inference_pool)
+        if advisor is None:
+            yield _sse("error", {"detail": "LLM not available."})
+            return
+
+        chunks = []
+        async for text in stream_generation(advisor, inference_pool, build_prompt_suffix(context), budget):
+            chunks.append(text)
+            yield _sse("token", {"text": text})
+        generated_text = "".join(chunks).strip()
+        if generated_text:
+            insights_cache.put(key, generated_text)
+        yield _sse("done", {"cached": False})
+    except Exception as e:
+        logging.error(f"LLM streaming error: {_error_detail(e)}")
+        yield _sse("error", {"detail": _error_detail(e)})
+
+@router.get("/predict/insights/stream",
+            summary="Stream LLM soil insights",
+            description="""
+            Classifies the soil at a location and streams the GPT-2 insights as Server-Sent Events:
+            a `prediction` event, then `token` events with text chunks as they are generated, and a
+            final `done` event (or `error`). Insights for an equivalent soil context are served from cache.
+            """)
+async def stream_soil_insights(lon: float,
+                               lat: float,
+                               max_new_tokens: Optional[int] = Query(None, ge=1, description="Token budget (capped by LLM_MAX_NEW_TOKENS)"),
+                               current_user: User = Depends(get_current_active_user),
+                               http: PooledHTTPClient = Depends(get_http_client)
+                               ):
+    """Streams soil insights token by token."""
+    prediction, confidence, soil_data = await _classify_location(lon, lat, current_user, http)
+    return StreamingResponse(
+        _insights_events(prediction, confidence, soil_data, max_new_tokens),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/predict/insights/cache-stats/", summary="LLM insights cache statistics")
+async def get_insights_cache_stats(current_user: User = Depends(get_current_active_user)):
+    """Reports how often insights were served from cache."""
+    return insights_cache.stats
+
+def _get_job(job_id: str, current_user: User):
+    job = insights_jobs.get(job_id, current_user.username)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Insights job not found or expired.")
+    return job
+
+@router.get("/predict/insights/jobs/{job_id}", response_model=InsightsJobResponse,
+            summary="Poll an LLM insights job",
+            description="Returns the state of an insights job queued by `/predict`, with the insights once it is done. "
+                        "With `wait` the request long-polls for up to that many seconds until the job finishes.")
+async def get_insights_job(job_id: str,
+                           wait: float = Query(0, ge=0, le=60, description="Seconds to wait for the job to finish"),
+                           current_user: User = Depends(get_current_active_user)):
+    """Polls an insights job."""
+    job = await insights_jobs.wait(_get_job(job_id, current_user), wait)
+    return job.to_dict()
+
+@router.delete("/predict/insights/jobs/{job_id}", response_model=InsightsJobResponse,
+               summary="Cancel an LLM insights job")
+async def cancel_insights_job(job_id: str, current_user: User = Depends(get_current_active_user)):
+    """Cancels a queued job, or stops a running one after its current token."""
+    job = _get_job(job_id, current_user)
+    insights_jobs.cancel(job)
+    return job.to_dict()
+
+@router.get("/predict/insights/job-stats/", summary="LLM insights job queue statistics")
+async def get_insights_job_stats(current_user: User = Depends(get_current_active_user)):
+    """Counts of insights jobs by state."""
+    return insights_jobs.stats()
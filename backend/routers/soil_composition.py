@@ -3,8 +3,8 @@ from typing import List, Optional
 from models.user import User
 from utils.auth import get_current_active_user
 from models.response.soil import SoilResponse
-import httpx
-from httpx import Timeout
+from utils.soil_profile import soil_profiles
+from utils.http_client import PooledHTTPClient, get_http_client
 import numpy as np
 
 router = APIRouter()
@@ -16,27 +16,16 @@ async def analyze_soil_nutrients(
     lon: float = Query(..., description="Longitude of the location"),
     lat: float = Query(..., description="Latitude of the location"),
     depth: str = Query("0-30cm", description="Soil depth for analysis"),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    http: PooledHTTPClient = Depends(get_http_client)
 ):
     """Analyzes soil nutrient composition and provides recommendations."""
     try:
         # Fetch soil data for nutrient analysis
-        async with httpx.AsyncClient(timeout=Timeout(30.0)) as client:
-            response = await client.get(
-                "https://rest.isric.org/soilgrids/v2.0/properties/query",
-                params={
-                    "lon": lon,
-                    "lat": lat,
-                    "property": ["nitrogen", "phh2o", "cec"],
-                    "depth": [depth],
-                    "value": ["mean"]
-                }
-            )
-            response.raise_for_status()
-            soil_data = response.json()
+        profile = await soil_profiles.get_profile(lon, lat, client=http)
 
         # Extract and analyze nutrient levels
-        properties = soil_data.get("properties", {})
+        properties = profile.slice(["nitrogen", "phh2o", "cec"], depth)
         analysis = {
             "nitrogen_level": _analyze_nitrogen(properties),
             "ph_level": _analyze_ph(properties),
@@ -54,6 +43,8 @@ async def analyze_soil_nutrients(
 
         return analysis
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error analyzing soil nutrients: {str(e)}")
 
@@ -64,27 +55,16 @@ async def analyze_soil_texture(
     lon: float = Query(..., description="Longitude of the location"),
     lat: float = Query(..., description="Latitude of the location"),
     depth: str = Query("0-30cm", description="Soil depth for analysis"),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    http: PooledHTTPClient = Depends(get_http_client)
 ):
     """Analyzes soil texture composition and provides physical property insights."""
     try:
         # Fetch soil texture data
-        async with httpx.AsyncClient(timeout=Timeout(30.0)) as client:
-            response = await client.get(
-                "https://rest.isric.org/soilgrids/v2.0/properties/query",
-                params={
-                    "lon": lon,
-                    "lat": lat,
-                    "property": ["sand", "silt", "clay"],
-                    "depth": [depth],
-                    "value": ["mean"]
-                }
-            )
-            response.raise_for_status()
-            soil_data = response.json()
+        profile = await soil_profiles.get_profile(lon, lat, client=http)
 
         # Calculate texture class and properties
-        properties = soil_data.get("properties", {})
+        properties = profile.slice(["sand", "silt", "clay"], depth)
         texture_analysis = _calculate_texture_class(properties)
         
         return {
@@ -102,6 +82,8 @@ async def analyze_soil_texture(
             "management_recommendations": texture_analysis["recommendations"]
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error analyzing soil texture: {str(e)}")
 
@@ -1,21 +1,41 @@
 import os
 import jwt
-import sqlite3
-from typing import Optional
+import rsa
+import time
+import base64
+import asyncio
+import logging
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
 from dotenv import load_dotenv
 from fastapi import Depends, HTTPException, status, Request, Response
 from fastapi.security import OAuth2PasswordBearer
+from fastapi.concurrency import run_in_threadpool
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from models.user import User, UserInDB, TokenData
+from utils.db import ConnectionPool, db_pool, get_db
+from utils.executor import WorkerPool, auth_pool
 
 # Load environment variables
 load_dotenv(".env")
 
-DB_PATH = os.getenv("DB_PATH", "users.db")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 SECRET_KEY = os.getenv("SECRET_KEY", "your_secret_key")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+# Lifetime of login tokens; revocations are never kept longer than this
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 60))
+# Authenticated users are cached per token for at most this long (and never past the token's exp)
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", 60))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000))
+# How often the in-memory blacklist picks up logouts made by other processes
+AUTH_BLACKLIST_REFRESH = float(os.getenv("AUTH_BLACKLIST_REFRESH", 1.0))
+# Expired revocations are deleted this often, in batches of this many rows
+TOKEN_PRUNE_INTERVAL = float(os.getenv("TOKEN_PRUNE_INTERVAL", 300))
+TOKEN_PRUNE_BATCH_SIZE = int(os.getenv("TOKEN_PRUNE_BATCH_SIZE", 1000))
+RSA_PRIVATE_KEY_PATH = os.getenv("RSA_PRIVATE_KEY_PATH", "private.pem")
 
 # Secure password hashing
 pwd_context = CryptContext(
@@ -26,25 +46,167 @@ pwd_context = CryptContext(
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
-# Database connection
-def get_db():
-    conn = sqlite3.connect(DB_PATH, timeout=10)  # Set timeout to prevent locking issues
-    conn.row_factory = sqlite3.Row
-    return conn
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+def token_expiry(token: str) -> Optional[int]:
+    """The token's exp claim, read without verifying it (None for malformed tokens)."""
+    try:
+        exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.InvalidTokenError:
+        return None
+    return int(exp) if isinstance(exp, (int, float)) else None
+
+class BlacklistMirror:
+    """In-memory map of revoked token digests to their expiry.
+
+    The first lookup loads revoked_tokens; after that only rows with a
+    higher id are fetched, at most once per refresh_interval, so logouts
+    in other worker processes are seen within that interval. Logouts in
+    this process are added immediately, and entries are dropped again
+    once their token has expired.
+    """
+
+    def __init__(self, pool: ConnectionPool = db_pool, refresh_interval: float = AUTH_BLACKLIST_REFRESH):
+        self.pool = pool
+        self.refresh_interval = refresh_interval
+        self._digests: Dict[bytes, int] = {}
+        self._last_id = 0
+        self._checked: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and self._checked is not None and now - self._checked < self.refresh_interval:
+            return
+        with self._lock:
+            if not force and self._checked is not None and now - self._checked < self.refresh_interval:
+                return
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    "SELECT id, digest, exp FROM revoked_tokens WHERE id > ? ORDER BY id", (self._last_id,)
+                ).fetchall()
+            expired_before = time.time()
+            for row_id, digest, exp in rows:
+                if exp > expired_before:
+                    self._digests[bytes(digest)] = exp
+                self._last_id = row_id
+            self._checked = now
+
+    def add(self, digest: bytes, exp: int):
+        with self._lock:
+            self._digests[digest] = exp
+
+    def prune(self, now: float):
+        # Expired entries are deleted from the live dict, so a concurrent add() is never lost
+        with self._lock:
+            for digest in [digest for digest, exp in self._digests.items() if exp <= now]:
+                del self._digests[digest]
+
+    def __contains__(self, digest: bytes) -> bool:
+        self.refresh()
+        return digest in self._digests
+
+class TokenCache:
+    """LRU of token digest -> authenticated user, each entry valid until min(exp, now + ttl)."""
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL, max_entries: int = AUTH_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[float, UserInDB]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: bytes) -> Optional[UserInDB]:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return entry[1]
+
+    def put(self, digest: bytes, user: UserInDB, exp: float):
+        with self._lock:
+            self._entries[digest] = (min(exp, time.time() + self.ttl), user)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, digest: bytes):
+        with self._lock:
+            self._entries.pop(digest, None)
+
+token_blacklist = BlacklistMirror()
+token_cache = TokenCache()
 
 # Blacklist token storage (JWT invalidation)
 def add_token_to_blacklist(db, token: str):
-    cursor = db.cursor()
-    try:
-        cursor.execute("INSERT INTO token_blacklist (token) VALUES (?)", (token,))
-        db.commit()
-    except sqlite3.IntegrityError:
-        pass  # Prevent duplicate entries
+    """Revoke a token issued by this server; forged, malformed or expired tokens raise 401 and are not stored."""
+    _, exp = decode_token(token)
+    digest = token_digest(token)
+    token_cache.discard(digest)
+    # No token this server issues outlives ACCESS_TOKEN_EXPIRE_MINUTES, so neither does its revocation
+    exp = min(int(exp), int(time.time()) + ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+    db.execute("INSERT OR IGNORE INTO revoked_tokens (digest, exp) VALUES (?, ?)", (digest, exp))
+    db.commit()
+    token_blacklist.add(digest, exp)
 
 def is_token_blacklisted(db, token: str) -> bool:
-    cursor = db.cursor()
-    cursor.execute("SELECT 1 FROM token_blacklist WHERE token = ? LIMIT 1", (token,))
-    return cursor.fetchone() is not None
+    # Expired tokens are never stored, so they are answered without a query
+    exp = token_expiry(token)
+    if exp is not None and exp <= time.time():
+        return False
+    row = db.execute("SELECT 1 FROM revoked_tokens WHERE digest = ? LIMIT 1", (token_digest(token),)).fetchone()
+    return row is not None
+
+def prune_revoked_tokens(batch_size: int = TOKEN_PRUNE_BATCH_SIZE) -> int:
+    """Delete expired revocations, one short write transaction per batch (blocking)."""
+    now = int(time.time())
+    removed = 0
+    while True:
+        with db_pool.connection() as conn:
+            deleted = conn.execute(
+                "DELETE FROM revoked_tokens WHERE id IN (SELECT id FROM revoked_tokens WHERE exp <= ? LIMIT ?)",
+                (now, batch_size),
+            ).rowcount
+            conn.commit()
+        removed += deleted
+        if deleted < batch_size:
+            break
+    token_blacklist.prune(now)
+    return removed
+
+async def prune_revoked_tokens_periodically(pool: WorkerPool, interval: float = TOKEN_PRUNE_INTERVAL):
+    while True:
+        try:
+            removed = await pool.submit(prune_revoked_tokens)
+            if removed:
+                logging.info(f"Pruned {removed} expired token revocations")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Token blacklist pruning failed: {str(e)}")
+        await asyncio.sleep(interval)
+
+def migrate_legacy_blacklist():
+    """Move the old token_blacklist table (full JWT strings, kept forever) into revoked_tokens."""
+    with db_pool.connection() as conn:
+        legacy = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'token_blacklist'").fetchone()
+        if legacy is None:
+            return
+        now = time.time()
+        rows = []
+        for (token,) in conn.execute("SELECT token FROM token_blacklist"):
+            exp = token_expiry(token)
+            if exp is not None and exp > now:
+                rows.append((token_digest(token), exp))
+        conn.executemany("INSERT OR IGNORE INTO revoked_tokens (digest, exp) VALUES (?, ?)", rows)
+        conn.execute("DROP TABLE IF EXISTS token_blacklist")
+        conn.commit()
+        logging.info(f"Migrated {len(rows)} unexpired tokens from token_blacklist to revoked_tokens")
 
 # Password security functions
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -53,6 +215,16 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+@lru_cache(maxsize=1)
+def _private_key() -> rsa.PrivateKey:
+    # Loaded once per process, including each auth_pool worker
+    with open(RSA_PRIVATE_KEY_PATH, "rb") as f:
+        return rsa.PrivateKey.load_pkcs1(f.read())
+
+def rsa_decrypt_password(encrypted_password: str) -> str:
+    """Decrypt a base64, RSA-encrypted password from the frontend (blocking; run it on auth_pool)."""
+    return rsa.decrypt(base64.b64decode(encrypted_password), _private_key()).decode()
+
 # Secure user retrieval with parameterized queries
 def get_user(db, username: str) -> Optional[UserInDB]:
     cursor = db.cursor()
@@ -60,10 +232,34 @@ def get_user(db, username: str) -> Optional[UserInDB]:
     user = cursor.fetchone()
     return UserInDB(**user) if user else None
 
+def create_user(db, username: str, email: str, full_name: Optional[str], hashed_password: str):
+    """Insert a user; raises sqlite3.IntegrityError if the username or email is taken."""
+    db.execute(
+        "INSERT INTO users (username, email, full_name, hashed_password) VALUES (?, ?, ?, ?)",
+        (username, email, full_name, hashed_password),
+    )
+    db.commit()
+
+def save_user(username: str, email: str, full_name: Optional[str], hashed_password: str):
+    """create_user on a pooled connection held only for the insert (blocking)."""
+    with db_pool.connection() as db:
+        create_user(db, username, email, full_name, hashed_password)
+
+def _fetch_user(username: str) -> Optional[UserInDB]:
+    with db_pool.connection() as db:
+        return get_user(db, username)
+
+async def authenticate_user_async(username: str, password: str) -> Optional[UserInDB]:
+    """authenticate_user without blocking: the lookup runs on the threadpool, bcrypt in auth_pool."""
+    user = await run_in_threadpool(_fetch_user, username)
+    if not user or not await auth_pool.submit(verify_password, password, user.hashed_password):
+        return None  # Do NOT reveal if the username is invalid
+    return user
+
 # User authentication
 def authenticate_user(username: str, password: str) -> Optional[UserInDB]:
-    db = get_db()
-    user = get_user(db, username)
+    with db_pool.connection() as db:
+        user = get_user(db, username)
     if not user or not verify_password(password, user.hashed_password):
         return None  # Do NOT reveal if the username is invalid
     return user
@@ -75,17 +271,16 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-# Secure token validation and retrieval
-def get_current_user(request: Request, db=Depends(get_db)) -> User:
-    token = request.cookies.get("access_token")
-    
-    if not token or is_token_blacklisted(db, token):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
 
+# Secure token validation and retrieval
+def decode_token(token: str) -> Tuple[TokenData, int]:
+    """Verified token subject and expiry (epoch seconds)."""
     try:
         # Decode JWT securely
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -94,42 +289,39 @@ def get_current_user(request: Request, db=Depends(get_db)) -> User:
 
         # Ensure token is not expired
         if exp is None or datetime.utcfromtimestamp(exp) < datetime.utcnow():
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token has expired",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+            raise _unauthorized("Token has expired")
 
         if not username:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+            raise _unauthorized("Invalid token")
 
-        token_data = TokenData(username=username)
+        return TokenData(username=username), exp
     except jwt.ExpiredSignatureError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token has expired",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _unauthorized("Token has expired")
     except jwt.InvalidTokenError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _unauthorized("Invalid token")
+
+def get_current_user(request: Request) -> User:
+    token = request.cookies.get("access_token")
+    if not token:
+        raise _unauthorized("Invalid or expired token")
+
+    # Fast path: blacklist and recently authenticated tokens are checked in memory
+    digest = token_digest(token)
+    if digest in token_blacklist:
+        raise _unauthorized("Invalid or expired token")
+    user = token_cache.get(digest)
+    if user is not None:
+        return user
+
+    token_data, exp = decode_token(token)
 
     # Retrieve user securely
-    user = get_user(db, username=token_data.username)
+    with db_pool.connection() as db:
+        user = get_user(db, username=token_data.username)
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _unauthorized("Invalid credentials")
 
+    token_cache.put(digest, user, exp)
     return user
 
 def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Any, Callable, List, Optional, Tuple
+from utils.executor import WorkerPool
+
+class MicroBatcher:
+    """Coalesces concurrent single-item requests into batched calls.
+
+    Items submitted within max_wait_ms of the first item of a batch (up to
+    max_batch_size of them) are handed to batch_fn together on the given
+    worker pool; batch_fn must return one result per item, in order.
+    """
+
+    def __init__(self, name: str, batch_fn: Callable[[List[Any]], List[Any]], pool: WorkerPool,
+                 max_batch_size: int, max_wait_ms: float):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.pool = pool
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batch_size_counts: Counter = Counter()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its share of the batched result."""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            self.batch_size_counts[len(batch)] += 1
+            items = [item for item, _ in batch]
+            try:
+                results = await self.pool.submit(self.batch_fn, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self) -> dict:
+        """Batch-size histogram and the derived mean batch size."""
+        batches = sum(self.batch_size_counts.values())
+        items = sum(size * count for size, count in self.batch_size_counts.items())
+        return {
+            "batches": batches,
+            "items": items,
+            "mean_batch_size": items / batches if batches else 0.0,
+            "histogram": {str(size): count for size, count in sorted(self.batch_size_counts.items())},
+        }
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            logging.info(f"{self.name} batcher stopped: {self.stats()}")
+            self._worker = None
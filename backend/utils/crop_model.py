@@ -0,0 +1,183 @@
+import os
+import copy
+import logging
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Sequence
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+from utils.crop_preprocessing import INPUT_SIZE, decode, to_model_input
+
+# torch is imported lazily so that starting the API does not pay for it
+if TYPE_CHECKING:
+    import torch
+
+# "eager" (fp32 ResNet-50), or an export from ml/src/utils/export_crop_model.py: "torchscript" or "onnx"
+CROP_MODEL_RUNTIME = os.getenv("CROP_MODEL_RUNTIME", "eager").lower()
+CROP_MODEL_PATH = os.getenv("CROP_MODEL_PATH", "./ml/models/crop_health_int8.pt")
+# Local ResNet-50 state dict (written by ml/src/utils/export_crop_model.py --download); never downloaded at startup
+CROP_MODEL_WEIGHTS = os.getenv("CROP_MODEL_WEIGHTS", "./ml/models/resnet50_imagenet.pth")
+# onnxruntime intra-op threads; 0 lets it pick one per core
+CROP_MODEL_ORT_THREADS = int(os.getenv("CROP_MODEL_ORT_THREADS", 0))
+
+# Backend the int8 kernels are built for; must match at export and at load time
+QUANTIZED_ENGINE = "x86"
+
+def example_input(batch_size: int = 1) -> "torch.Tensor":
+    import torch
+    return torch.randn(batch_size, 3, INPUT_SIZE, INPUT_SIZE)
+
+def image_batches(image_paths: Sequence[str], batch_size: int = 8) -> Iterator["torch.Tensor"]:
+    """Batches of images from disk, preprocessed exactly as the API does."""
+    import torch
+    for start in range(0, len(image_paths), batch_size):
+        tensors = []
+        for path in image_paths[start:start + batch_size]:
+            with open(path, "rb") as f:
+                tensors.append(to_model_input(decode(f.read())))
+        yield torch.stack(tensors)
+
+def build_resnet50(weights_path: str = CROP_MODEL_WEIGHTS, download: bool = False):
+    """fp32 ResNet-50 with the ImageNet weights the torch.hub `pretrained=True` model used.
+
+    The weights are read from weights_path; only with download=True are
+    they fetched from torchvision when that file is missing.
+    """
+    import torch
+    from torchvision.models import resnet50, ResNet50_Weights
+
+    if os.path.exists(weights_path):
+        model = resnet50(weights=None)
+        model.load_state_dict(torch.load(weights_path, map_location="cpu", weights_only=True))
+    elif download:
+        model = resnet50(weights=ResNet50_Weights.IMAGENET1K_V1)
+    else:
+        raise FileNotFoundError(missing_weights_message(weights_path))
+    return model.eval()
+
+def missing_weights_message(weights_path: str) -> str:
+    return (f"ResNet-50 weights not found at {weights_path}; download them once with "
+            "`python backend/ml/src/utils/export_crop_model.py --download` (see ml/README.md) or set CROP_MODEL_WEIGHTS")
+
+def crop_model_setup_error(runtime: str = CROP_MODEL_RUNTIME, path: str = CROP_MODEL_PATH,
+                           weights_path: str = CROP_MODEL_WEIGHTS) -> Optional[str]:
+    """Why load_crop_model() would fail for lack of model files, or None (checked at startup, no torch import)."""
+    if runtime != "eager" and os.path.exists(path):
+        return None
+    return None if os.path.exists(weights_path) else missing_weights_message(weights_path)
+
+def set_quantized_engine():
+    import torch
+    if QUANTIZED_ENGINE in torch.backends.quantized.supported_engines:
+        torch.backends.quantized.engine = QUANTIZED_ENGINE
+
+def quantize_static(model, calibration: Iterable["torch.Tensor"]):
+    """Post-training static int8 quantization (FX graph mode).
+
+    Conv/BatchNorm/ReLU are fused and observers record activation ranges
+    while the calibration batches run; convert_fx then bakes the collected
+    scales into int8 kernels. Dynamic quantization would leave a CNN's
+    convolutions in fp32, so it does not help here.
+    """
+    import torch
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    set_quantized_engine()
+    prepared = prepare_fx(copy.deepcopy(model).eval(), get_default_qconfig_mapping(QUANTIZED_ENGINE), (example_input(),))
+    batches = 0
+    with torch.inference_mode():
+        for batch in calibration:
+            prepared(batch)
+            batches += 1
+    if batches == 0:
+        raise ValueError("Static quantization needs at least one calibration batch")
+    return convert_fx(prepared)
+
+def export_torchscript(model, path: str) -> str:
+    """Trace and freeze a (possibly quantized) model into a self-contained TorchScript file."""
+    import torch
+    with torch.inference_mode():
+        traced = torch.jit.trace(model, example_input(), check_trace=False)
+    torch.jit.save(torch.jit.freeze(traced.eval()), path)
+    return path
+
+def export_onnx(model, path: str, calibration: Optional[Iterable["torch.Tensor"]] = None) -> str:
+    """Export an fp32 model to ONNX; with calibration batches, quantize it statically to int8 (QDQ)."""
+    import torch
+    fp32_path = path if calibration is None else f"{os.path.splitext(path)[0]}_fp32.onnx"
+    torch.onnx.export(
+        model, (example_input(),), fp32_path, input_names=["input"], output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}}, opset_version=17, dynamo=False,
+    )
+    if calibration is None:
+        return path
+
+    from onnxruntime.quantization import CalibrationDataReader, QuantType, quantize_static as ort_quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    class BatchReader(CalibrationDataReader):
+        def __init__(self, batches):
+            self.batches = iter(batches)
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else {"input": batch.numpy()}
+
+    prepared_path = f"{os.path.splitext(path)[0]}_prep.onnx"
+    quant_pre_process(fp32_path, prepared_path)
+    ort_quantize_static(prepared_path, path, BatchReader(calibration),
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+    for intermediate in (fp32_path, prepared_path):
+        os.remove(intermediate)
+    return path
+
+class OnnxCropModel:
+    """onnxruntime session with the eager model's calling convention (NCHW tensor in, logits out)."""
+
+    def __init__(self, path: str, threads: int = CROP_MODEL_ORT_THREADS):
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch: "torch.Tensor") -> "torch.Tensor":
+        import torch
+        return torch.from_numpy(self.session.run(None, {self.input_name: batch.numpy()})[0])
+
+def load_exported(runtime: str, path: str):
+    import torch
+    if runtime == "torchscript":
+        set_quantized_engine()
+        return torch.jit.load(path, map_location="cpu").eval()
+    if runtime == "onnx":
+        if onnxruntime is None:
+            raise RuntimeError("onnxruntime is not installed")
+        return OnnxCropModel(path)
+    raise ValueError(f"Unknown CROP_MODEL_RUNTIME '{runtime}' (expected eager, torchscript or onnx)")
+
+def load_crop_model(runtime: str = CROP_MODEL_RUNTIME, path: str = CROP_MODEL_PATH):
+    """The configured crop model, falling back to eager fp32 when the export is missing."""
+    if runtime != "eager":
+        if os.path.exists(path):
+            logging.info(f"Crop health model running on {runtime} ({path})")
+            return load_exported(runtime, path)
+        logging.warning(f"Crop model export {path} not found, falling back to the eager fp32 model")
+    return build_resnet50()
+
+def predict_proba(model, batch: "torch.Tensor") -> "torch.Tensor":
+    import torch
+    with torch.inference_mode():
+        return torch.nn.functional.softmax(model(batch), dim=1)
+
+def list_images(directory: str, limit: Optional[int] = None) -> List[str]:
+    extensions = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names
+        if name.lower().endswith(extensions)
+    )
+    return paths[:limit] if limit else paths
@@ -0,0 +1,85 @@
+import io
+import numpy as np
+from PIL import Image
+from typing import TYPE_CHECKING, Dict, Tuple
+
+# torch is imported lazily so that starting the API does not pay for it
+if TYPE_CHECKING:
+    import torch
+
+RESIZE = 256
+INPUT_SIZE = 224
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+# ToTensor + Normalize folded into one multiply-add on the uint8 pixels
+_SCALE = 1.0 / (255.0 * IMAGENET_STD)
+_OFFSET = -IMAGENET_MEAN / IMAGENET_STD
+
+def resized_size(width: int, height: int, short_side: int = RESIZE) -> Tuple[int, int]:
+    """Size with the short side scaled to short_side, rounded like torchvision's Resize(int)."""
+    if width <= height:
+        return short_side, int(short_side * height / width)
+    return int(short_side * width / height), short_side
+
+def decode(image_data: bytes) -> np.ndarray:
+    """Decode an upload straight to an RGB uint8 array whose short side is RESIZE pixels.
+
+    For JPEGs, draft() lets libjpeg decode at 1/2, 1/4 or 1/8 scale (never
+    below the target size), so a 12 MP photo is never materialised at full
+    resolution; the remaining downscale is one antialiased resize.
+    """
+    image = Image.open(io.BytesIO(image_data))
+    size = resized_size(*image.size)
+    image.draft("RGB", size)
+    image = image.convert("RGB")
+    if image.size != size:
+        image = image.resize(size, Image.BILINEAR, reducing_gap=3.0)
+    return np.asarray(image)
+
+def to_model_input(rgb: np.ndarray) -> "torch.Tensor":
+    """Center-crop to INPUT_SIZE and normalize into a CHW float32 tensor."""
+    import torch
+    height, width = rgb.shape[:2]
+    # Offsets rounded like torchvision's CenterCrop (Python round, not floor), so odd margins crop the same pixels
+    top, left = int(round((height - INPUT_SIZE) / 2.0)), int(round((width - INPUT_SIZE) / 2.0))
+    crop = rgb[top:top + INPUT_SIZE, left:left + INPUT_SIZE]
+    normalized = crop.astype(np.float32)
+    normalized *= _SCALE
+    normalized += _OFFSET
+    return torch.from_numpy(np.ascontiguousarray(normalized.transpose(2, 0, 1)))
+
+def image_statistics(rgb: np.ndarray) -> Dict[str, float]:
+    """Colour and texture statistics of an RGB array in one vectorized pass.
+
+    Hue and saturation follow PIL's 8-bit HSV conversion, so the values
+    match the previous Image.convert('HSV') path on the same pixels.
+    """
+    pixels = rgb.astype(np.float32)
+    r, g, b = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    maxc = pixels.max(axis=2)
+    chroma = maxc - pixels.min(axis=2)
+    colored = chroma > 0
+    safe_chroma = np.where(colored, chroma, 1.0).astype(np.float32)
+
+    # Mirrors the float/double mix of Pillow's rgb2hsv so the truncated 8-bit values agree exactly
+    saturation = np.floor((chroma / np.maximum(maxc, 1.0)).astype(np.float64) * 255.0)
+    rc, gc, bc = (maxc - r) / safe_chroma, (maxc - g) / safe_chroma, (maxc - b) / safe_chroma
+    rc64, gc64, bc64 = rc.astype(np.float64), gc.astype(np.float64), bc.astype(np.float64)
+    hue = np.where(r == maxc, bc - gc,
+                   np.where(g == maxc, (2.0 + rc64 - bc64).astype(np.float32), (4.0 + gc64 - rc64).astype(np.float32)))
+    hue = np.mod(hue.astype(np.float64) / 6.0 + 1.0, 1.0).astype(np.float32)
+    hue = np.where(colored, np.floor(hue.astype(np.float64) * 255.0), 0.0)
+
+    gray = pixels.mean(axis=2)
+    return {
+        "mean_hue": float(hue.mean()),
+        "mean_saturation": float(saturation.mean()),
+        "mean_green": float(g.mean()),
+        "gray_std": float(gray.std()),
+        "row_profile_std": float(gray.mean(axis=1).std()),
+    }
+
+def preprocess(image_data: bytes) -> Tuple["torch.Tensor", Dict[str, float]]:
+    """Model input tensor and image statistics from a single decode (blocking)."""
+    rgb = decode(image_data)
+    return to_model_input(rgb), image_statistics(rgb)
@@ -0,0 +1,122 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from dotenv import load_dotenv
+
+load_dotenv(".env")
+
+DB_PATH = os.getenv("DB_PATH", "users.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 8))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+# WAL lets readers run alongside the single writer; NORMAL only fsyncs at checkpoints in WAL mode
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL").upper()
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", 5000))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", 8192))
+# Compiled statements kept per connection, keyed by SQL text
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", 128))
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        full_name TEXT,
+        disabled BOOLEAN DEFAULT 0,
+        hashed_password TEXT NOT NULL
+    )""",
+    # Revoked JWTs as sha256 digests with their exp; rows are pruned once the token expires
+    """CREATE TABLE IF NOT EXISTS revoked_tokens (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        digest BLOB UNIQUE NOT NULL,
+        exp INTEGER NOT NULL
+    )""",
+    # Databases created before the UNIQUE constraints existed still get indexed lookups
+    "CREATE INDEX IF NOT EXISTS idx_users_username ON users (username)",
+    "CREATE INDEX IF NOT EXISTS idx_revoked_tokens_exp ON revoked_tokens (exp)",
+]
+
+class ConnectionPool:
+    """A bounded set of reusable SQLite connections.
+
+    Connections are opened on demand up to max_size and handed out one
+    caller at a time through connection(), which returns them to the pool
+    afterwards (rolling back anything left uncommitted) instead of leaving
+    them for the garbage collector. Every connection runs in WAL mode with
+    the tuned pragmas, and because connections live on, the statements
+    they have compiled are reused across requests.
+    """
+
+    def __init__(self, path: str = DB_PATH, max_size: int = DB_POOL_SIZE, timeout: float = DB_POOL_TIMEOUT):
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Handed between threadpool workers, but only ever used by one at a time
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False,
+                               cached_statements=DB_STATEMENT_CACHE)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        # Negative cache_size is in KiB rather than pages
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.max_size:
+                self._opened += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"No database connection available within {self.timeout}s")
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def initialize(self):
+        """Create missing tables and indexes."""
+        with self.connection() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+
+    def close(self):
+        while True:
+            try:
+                conn: Optional[sqlite3.Connection] = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+db_pool = ConnectionPool()
+
+def get_db() -> Iterator[sqlite3.Connection]:
+    """FastAPI dependency: a pooled connection for the duration of the request."""
+    with db_pool.connection() as conn:
+        yield conn
@@ -0,0 +1,95 @@
+import os
+import asyncio
+import logging
+import functools
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Optional, Type
+from fastapi import HTTPException
+
+class WorkerPool:
+    """An executor that CPU-bound work is submitted to from async handlers.
+
+    At most max_workers jobs run at once and at most max_queue more may wait;
+    beyond that submissions are rejected with 503 so callers back off instead
+    of piling up behind a saturated pool.
+    """
+
+    def __init__(self, name: str, executor_class: Type[Executor], max_workers: int, max_queue: int):
+        self.name = name
+        self.executor_class = executor_class
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+
+    @classmethod
+    def from_env(cls, name: str, executor_class: Type[Executor], default_workers: int, default_queue: int) -> "WorkerPool":
+        prefix = f"{name.upper()}_POOL"
+        return cls(
+            name,
+            executor_class,
+            int(os.getenv(f"{prefix}_WORKERS", default_workers)),
+            int(os.getenv(f"{prefix}_QUEUE_LIMIT", default_queue)),
+        )
+
+    @property
+    def executor(self) -> Executor:
+        # Created on first use so importing the app does not fork or spawn threads
+        if self._executor is None:
+            if self.executor_class is ThreadPoolExecutor:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix=f"{self.name}-pool")
+            else:
+                self._executor = self.executor_class(self.max_workers)
+        return self._executor
+
+    async def submit(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run func in the pool and await its result without blocking the event loop."""
+        if self.pending >= self.max_workers + self.max_queue:
+            logging.warning(f"{self.name} pool saturated ({self.pending} jobs pending), rejecting request")
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+
+        # pending is only touched from the event loop thread, so no lock is needed
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            future = self.executor.submit(functools.partial(func, *args, **kwargs))
+        except Exception:
+            self.pending -= 1
+            raise
+        # Released when the job itself ends: a cancelled caller (e.g. a client disconnect)
+        # cannot stop a job that is already running, so it must keep counting until then
+        future.add_done_callback(lambda _: self._release(loop))
+        return await asyncio.wrap_future(future)
+
+    def _release(self, loop: asyncio.AbstractEventLoop):
+        # Runs on the worker (or the thread that cancelled the job); hand the decrement to the loop
+        try:
+            loop.call_soon_threadsafe(self._decrement)
+        except RuntimeError:
+            pass  # The loop is already closed, at shutdown
+
+    def _decrement(self):
+        self.pending -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+CPU_COUNT = os.cpu_count() or 1
+
+# NumPy index math and PIL decoding release the GIL, so threads scale for them
+analysis_pool = WorkerPool.from_env("analysis", ThreadPoolExecutor, CPU_COUNT, 2 * CPU_COUNT)
+# torch inference releases the GIL too, but jobs are long; keep them off the analysis workers
+inference_pool = WorkerPool.from_env("inference", ThreadPoolExecutor, 2, 8)
+# bcrypt and RSA decryption hold the GIL, so they get separate processes (functions must be picklable);
+# the pool is dedicated so a login storm cannot take over the analysis and inference workers
+auth_pool = WorkerPool.from_env("auth", ProcessPoolExecutor, max(1, CPU_COUNT // 2), 100)
+
+def shutdown_pools():
+    for pool in (analysis_pool, inference_pool, auth_pool):
+        pool.shutdown()
@@ -0,0 +1,158 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import httpx
+from typing import Dict, Optional
+from fastapi import HTTPException
+
+try:
+    import h2  # noqa: F401 - enables HTTP/2 in httpx (pip install "httpx[http2]")
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 30))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 60))
+# Requests in flight to any single upstream host; the rest wait their turn
+HTTP_PER_HOST_LIMIT = int(os.getenv("HTTP_PER_HOST_LIMIT", 8))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 3))
+HTTP_RETRY_BASE_DELAY = float(os.getenv("HTTP_RETRY_BASE_DELAY", 0.25))
+HTTP_RETRY_MAX_DELAY = float(os.getenv("HTTP_RETRY_MAX_DELAY", 4))
+# Consecutive failed calls before a host is short-circuited, and how long it stays that way
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", 30))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class CircuitBreaker:
+    """Stops calling a host after repeated failures.
+
+    After failure_threshold consecutive failed calls the circuit opens and
+    calls are rejected for reset_timeout seconds; then a single probe call is
+    let through (half-open) which either closes the circuit or re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return False
+        # Re-arming opened_at means a probe that never reports back only blocks one more period
+        self.state = "half_open"
+        self.opened_at = time.monotonic()
+        return True
+
+    def retry_after(self) -> int:
+        return max(1, int(self.reset_timeout - (time.monotonic() - self.opened_at)) + 1)
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+class PooledHTTPClient:
+    """One keep-alive httpx client shared by every outbound call.
+
+    Adds a per-host concurrency cap, retries of transient failures with
+    full-jitter exponential backoff, and a per-host circuit breaker that
+    fails fast with 503 while an upstream is down.
+    """
+
+    def __init__(self, per_host_limit: int = HTTP_PER_HOST_LIMIT, max_retries: int = HTTP_MAX_RETRIES):
+        self.per_host_limit = per_host_limit
+        self.max_retries = max_retries
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+                ),
+            )
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _host_state(self, host: str):
+        if host not in self._breakers:
+            self._semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+            self._breakers[host] = CircuitBreaker()
+        return self._semaphores[host], self._breakers[host]
+
+    async def get(self, url: str, params=None) -> httpx.Response:
+        """GET url, retrying transient errors; raises for any non-2xx final response."""
+        # Outside the app lifespan (scripts, tests) the client is opened on first use
+        await self.start()
+        host = httpx.URL(url).host
+        semaphore, breaker = self._host_state(host)
+        if not breaker.allow():
+            raise HTTPException(
+                status_code=503,
+                detail=f"Upstream service {host} is unavailable, please retry shortly",
+                headers={"Retry-After": str(breaker.retry_after())},
+            )
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with semaphore:
+                    response = await self._client.get(url, params=params)
+            except httpx.TransportError as e:
+                error = e
+            else:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    # 4xx responses are the caller's fault, not the upstream's
+                    breaker.record_success()
+                    response.raise_for_status()
+                    return response
+                error = httpx.HTTPStatusError(
+                    f"Upstream returned {response.status_code}", request=response.request, response=response
+                )
+
+            if attempt < self.max_retries:
+                delay = random.uniform(0, min(HTTP_RETRY_MAX_DELAY, HTTP_RETRY_BASE_DELAY * 2 ** attempt))
+                logging.warning(f"GET {host} failed ({str(error)}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+        breaker.record_failure()
+        raise error
+
+    def stats(self) -> dict:
+        return {
+            "http2": HTTP2_AVAILABLE,
+            "hosts": {
+                host: {"circuit": breaker.state, "failures": breaker.failures}
+                for host, breaker in self._breakers.items()
+            },
+        }
+
+http_client = PooledHTTPClient()
+
+def get_http_client() -> PooledHTTPClient:
+    """FastAPI dependency for the shared outbound HTTP client."""
+    return http_client
@@ -1,172 +1,393 @@
 from PIL import Image
 import numpy as np
 # from fastapi.responses import FileResponse
-from typing import Callable
+from typing import Callable, Dict, Iterable, List, Tuple
 from fastapi import UploadFile, HTTPException
 import io
+import os
+import struct
+import zlib
+from utils.index_stats import IndexStatsAccumulator
+from utils.result_store import StoredResult, result_store
+from utils.executor import analysis_pool
 
+# Images above this many pixels are processed in row blocks of TILE_ROWS rows
+TILED_PIXEL_THRESHOLD = int(os.getenv("TILED_PIXEL_THRESHOLD", 50_000_000))
+TILE_ROWS = int(os.getenv("TILE_ROWS", 512))
 
-def calculate_ndvi(image: Image.Image, nir_channel=3, red_channel=0) -> Image.Image:
-    img_array = np.array(image)
-    nir = img_array[:, :, nir_channel].astype(float)
-    red = img_array[:, :, red_channel].astype(float)
-    denominator = nir + red
-    denominator[denominator == 0] = 1e-5
-    ndvi = (nir - red) / denominator
-
-    # Save the NDVI array for later use
-    np.save("output/ndvi_array.npy", ndvi)
-
-    ndvi_normalized = ((ndvi + 1) / 2 * 255).astype(np.uint8)
-    return apply_colormap(ndvi_normalized)
-
-def calculate_evi(image: Image.Image, G: float = 2.5, C1: float = 6, C2: float = 7.5, L: float = 1) -> Image.Image:
-    image_array = np.array(image)
+# Orthomosaics routinely exceed PIL's default decompression-bomb limit
+Image.MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", 600_000_000))
 
-    # Validate image dimensions
-    if image_array.ndim < 3 or image_array.shape[2] < 3:
-        raise ValueError("Input image must have at least three channels for EVI calculation.")
 
-    nir = image_array[:, :, 0].astype(float)  #  NIR is the first channel
-    red = image_array[:, :, 1].astype(float)  #  Red is the second channel
-    blue = image_array[:, :, 2].astype(float)  #  Blue is the third channel
-
-    denominator = nir + C1 * red - C2 * blue + L
+# Index kernels operate on float32 band arrays and never modify their inputs,
+# so a band cast once can be shared by every index that needs it.
+def _normalized_difference(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    denominator = np.add(a, b)
     denominator[denominator == 0] = 1e-5
-
-    evi = G * (nir - red) / denominator
-    np.save("output/evi_array.npy", evi)
-
-    evi_normalized = ((evi + 1) / 2 * 255).clip(0, 255).astype(np.uint8)
-
-    evi_colorized = apply_colormap(evi_normalized)
-
-    return evi_colorized
-
-def calculate_savi(image: Image.Image, nir_channel=3, red_channel=0, L: float = 0.5) -> Image.Image:
-    img_array = np.array(image)
-
-    # Validate image has enough channels
-    if img_array.ndim < 3 or img_array.shape[2] <= max(nir_channel, red_channel):
-        raise ValueError("Input image does not have sufficient channels for SAVI calculation.")
-
-    nir = img_array[:, :, nir_channel].astype(float)
-    red = img_array[:, :, red_channel].astype(float)
-
-    # Avoid division by zero
-    denominator = nir + red + L
+    result = np.subtract(a, b)
+    result /= denominator
+    return result
+
+def _ndvi_kernel(nir: np.ndarray, red: np.ndarray) -> np.ndarray:
+    return _normalized_difference(nir, red)
+
+def _evi_kernel(nir: np.ndarray, red: np.ndarray, blue: np.ndarray, G: float = 2.5, C1: float = 6, C2: float = 7.5, L: float = 1) -> np.ndarray:
+    denominator = np.multiply(red, C1)
+    denominator += nir
+    denominator -= C2 * blue
+    denominator += L
     denominator[denominator == 0] = 1e-5
-
-    # Calculate SAVI
-    savi = ((nir - red) / denominator) * (1 + L)
-    np.save("output/savi_array.npy", savi)
-
-    savi_normalized = ((savi + 1) / 2 * 255).clip(0, 255).astype(np.uint8)
-
-    savi_colorized = apply_colormap(savi_normalized)
-
-    return savi_colorized
-
-def calculate_arvi(image: Image.Image, red_channel=0, blue_channel=2, green_channel=1) -> Image.Image:
-    img_array = np.array(image)
-    red = img_array[:, :, red_channel].astype(float)
-    blue = img_array[:, :, blue_channel].astype(float)
-    green = img_array[:, :, green_channel].astype(float)
-
-    denominator = red + (2 * blue) - green
+    result = np.subtract(nir, red)
+    result *= G
+    result /= denominator
+    return result
+
+def _savi_kernel(nir: np.ndarray, red: np.ndarray, L: float = 0.5) -> np.ndarray:
+    denominator = np.add(nir, red)
+    denominator += L
     denominator[denominator == 0] = 1e-5
-    arvi = (red - (2 * blue) + green) / denominator
-
-    # Save the ARVI array for later use
-    np.save("output/arvi_array.npy", arvi)
-
-    arvi_normalized = ((arvi + 1) / 2 * 255).astype(np.uint8)
-    return apply_colormap(arvi_normalized)
-
-def calculate_gndvi(image: Image.Image, nir_channel=3, green_channel=1) -> Image.Image:
-    img_array = np.array(image)
-    nir = img_array[:, :, nir_channel].astype(float)
-    green = img_array[:, :, green_channel].astype(float)
-
-    denominator = nir + green
+    result = np.subtract(nir, red)
+    result /= denominator
+    result *= (1 + L)
+    return result
+
+def _arvi_kernel(red: np.ndarray, blue: np.ndarray, green: np.ndarray) -> np.ndarray:
+    double_blue = np.multiply(blue, 2)
+    denominator = np.add(red, double_blue)
+    denominator -= green
     denominator[denominator == 0] = 1e-5
-    gndvi = (nir - green) / denominator
-
-    # Save the GNDVI array for later use
-    np.save("output/gndvi_array.npy", gndvi)
-
-    gndvi_normalized = ((gndvi + 1) / 2 * 255).astype(np.uint8)
-    return apply_colormap(gndvi_normalized)
-
-def calculate_msavi(image: Image.Image, nir_channel=3, red_channel=0) -> Image.Image:
-    img_array = np.array(image)
-    nir = img_array[:, :, nir_channel].astype(float)
-    red = img_array[:, :, red_channel].astype(float)
-
-    msavi = (2 * nir + 1 - np.sqrt((2 * nir + 1)**2 - 8 * (nir - red))) / 2
-
-    # Save the MSAVI array for later use
-    np.save("output/msavi_array.npy", msavi)
-
-    msavi_normalized = ((msavi + 1) / 2 * 255).astype(np.uint8)
-    return apply_colormap(msavi_normalized)
+    result = np.subtract(red, double_blue, out=double_blue)
+    result += green
+    result /= denominator
+    return result
+
+def _gndvi_kernel(nir: np.ndarray, green: np.ndarray) -> np.ndarray:
+    return _normalized_difference(nir, green)
+
+def _msavi_kernel(nir: np.ndarray, red: np.ndarray) -> np.ndarray:
+    term = np.multiply(nir, 2)
+    term += 1
+    radicand = np.square(term)
+    radicand -= 8 * (nir - red)
+    np.sqrt(radicand, out=radicand)
+    term -= radicand
+    term /= 2
+    return term
+
+# Default channel layout of each index, in kernel argument order
+INDEX_CHANNELS = {
+    "ndvi": (3, 0),
+    "evi": (0, 1, 2),
+    "savi": (3, 0),
+    "arvi": (0, 2, 1),
+    "gndvi": (3, 1),
+    "msavi": (3, 0),
+}
+
+INDEX_KERNELS = {
+    "ndvi": _ndvi_kernel,
+    "evi": _evi_kernel,
+    "savi": _savi_kernel,
+    "arvi": _arvi_kernel,
+    "gndvi": _gndvi_kernel,
+    "msavi": _msavi_kernel,
+}
+
+def _vegetation_colormap() -> np.ndarray:
+    levels = np.arange(256)
+    low = levels < 128  # Low NDVI values (e.g., non-vegetation areas)
+    colormap = np.empty((256, 3), dtype=np.uint8)
+    colormap[:, 0] = np.where(low, 255, (255 - levels) * 2)  # Gradient from red to yellow...
+    colormap[:, 1] = np.where(low, levels * 2, 255)
+    colormap[:, 2] = np.where(low, 0, (levels - 128) * 2)  # ...then from yellow to green
+    return colormap
+
+def _gradient_colormap(*stops) -> np.ndarray:
+    positions = np.linspace(0, 255, len(stops))
+    stops = np.array(stops, dtype=float)
+    levels = np.arange(256)
+    return np.stack([np.interp(levels, positions, stops[:, channel]) for channel in range(3)], axis=1).round().astype(np.uint8)
+
+# Precomputed 256-entry palettes
+COLORMAPS = {
+    "vegetation": _vegetation_colormap(),
+    "grayscale": _gradient_colormap((0, 0, 0), (255, 255, 255)),
+    "heat": _gradient_colormap((0, 0, 0), (200, 0, 0), (255, 200, 0), (255, 255, 255)),
+    "diverging": _gradient_colormap((165, 0, 38), (255, 255, 191), (0, 104, 55)),
+}
+DEFAULT_COLORMAP = "vegetation"
+# Flattened RGB bytes in the layout expected by putpalette and the PNG PLTE chunk
+PALETTES = {name: colormap.tobytes() for name, colormap in COLORMAPS.items()}
+
+def _load_bands(image: Image.Image, channels: Iterable[int]) -> Dict[int, np.ndarray]:
+    """Cast each requested channel of the image to float32 exactly once."""
+    img_array = np.asarray(image)
+    channels = sorted(set(channels))
+    if img_array.ndim < 3 or img_array.shape[2] <= channels[-1]:
+        raise ValueError("Input image does not have sufficient channels for the requested indices.")
+    return {channel: img_array[:, :, channel].astype(np.float32) for channel in channels}
+
+def normalize_index(index_array: np.ndarray) -> np.ndarray:
+    """Scale an index from [-1, 1] to the 0-255 range used by the colormap."""
+    normalized = index_array + 1
+    normalized *= 127.5
+    np.clip(normalized, 0, 255, out=normalized)
+    return normalized.astype(np.uint8)
+
+def calculate_ndvi(image: Image.Image, nir_channel=3, red_channel=0) -> Tuple[Image.Image, np.ndarray]:
+    bands = _load_bands(image, (nir_channel, red_channel))
+    ndvi = _ndvi_kernel(bands[nir_channel], bands[red_channel])
+
+    return apply_colormap(normalize_index(ndvi)), ndvi
+
+def calculate_evi(image: Image.Image, G: float = 2.5, C1: float = 6, C2: float = 7.5, L: float = 1) -> Tuple[Image.Image, np.ndarray]:
+    #  NIR, Red and Blue are the first three channels
+    bands = _load_bands(image, (0, 1, 2))
+    evi = _evi_kernel(bands[0], bands[1], bands[2], G=G, C1=C1, C2=C2, L=L)
+
+    return apply_colormap(normalize_index(evi)), evi
+
+def calculate_savi(image: Image.Image, nir_channel=3, red_channel=0, L: float = 0.5) -> Tuple[Image.Image, np.ndarray]:
+    bands = _load_bands(image, (nir_channel, red_channel))
+    savi = _savi_kernel(bands[nir_channel], bands[red_channel], L=L)
+
+    return apply_colormap(normalize_index(savi)), savi
+
+def calculate_arvi(image: Image.Image, red_channel=0, blue_channel=2, green_channel=1) -> Tuple[Image.Image, np.ndarray]:
+    bands = _load_bands(image, (red_channel, blue_channel, green_channel))
+    arvi = _arvi_kernel(bands[red_channel], bands[blue_channel], bands[green_channel])
+
+    return apply_colormap(normalize_index(arvi)), arvi
+
+def calculate_gndvi(image: Image.Image, nir_channel=3, green_channel=1) -> Tuple[Image.Image, np.ndarray]:
+    bands = _load_bands(image, (nir_channel, green_channel))
+    gndvi = _gndvi_kernel(bands[nir_channel], bands[green_channel])
+
+    return apply_colormap(normalize_index(gndvi)), gndvi
+
+def calculate_msavi(image: Image.Image, nir_channel=3, red_channel=0) -> Tuple[Image.Image, np.ndarray]:
+    bands = _load_bands(image, (nir_channel, red_channel))
+    msavi = _msavi_kernel(bands[nir_channel], bands[red_channel])
+
+    return apply_colormap(normalize_index(msavi)), msavi
+
+def compute_indices(image: Image.Image, index_names: Iterable[str]) -> Dict[str, np.ndarray]:
+    """Compute several vegetation indices from a single decode and band cast."""
+    index_names = list(dict.fromkeys(name.lower() for name in index_names))
+    unknown = [name for name in index_names if name not in INDEX_KERNELS]
+    if unknown:
+        raise ValueError(f"Invalid index type: {', '.join(unknown)}.")
+
+    bands = _load_bands(image, (channel for name in index_names for channel in INDEX_CHANNELS[name]))
+    return {
+        name: INDEX_KERNELS[name](*(bands[channel] for channel in INDEX_CHANNELS[name]))
+        for name in index_names
+    }
 
 def analyze_index(index_array: np.ndarray, index_type: str):
     index_type = index_type.lower()
     if index_type in ["ndvi", "evi", "savi", "arvi", "gndvi", "msavi"]:
-        stats = {
-            "Mean": float(np.mean(index_array)),
-            "StandardDeviation": float(np.std(index_array)),
-            "Minimum": float(np.min(index_array)),
-            "Maximum": float(np.max(index_array)),
-            "HighVegetationPercentage": float((index_array > 0.6).sum()) / index_array.size * 100,
-            "ModerateVegetationPercentage": float(((index_array > 0.2) & (index_array <= 0.6)).sum()) / index_array.size * 100,
-            "LowVegetationPercentage": float((index_array <= 0.2).sum()) / index_array.size * 100,
-        }
-        return stats
+        return IndexStatsAccumulator().update(index_array).to_insights()
     else:
         raise ValueError(f"Invalid index type: {index_type}.")
 
-async def perform_analysis(
-    file: UploadFile,
-    index_name: str,
-    calculation_function: Callable[[Image.Image], Image.Image]
-):
+class _PNGStreamWriter:
+    """Writes an 8-bit paletted PNG row block by row block."""
+
+    def __init__(self, path: str, width: int, height: int, palette: str = DEFAULT_COLORMAP):
+        self._file = open(path, "wb")
+        self._compressor = zlib.compressobj(6)
+        self._file.write(b"\x89PNG\r\n\x1a\n")
+        self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0))
+        self._write_chunk(b"PLTE", PALETTES[palette])
+
+    def _write_chunk(self, chunk_type: bytes, data: bytes):
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(chunk_type + data)
+        self._file.write(struct.pack(">I", zlib.crc32(chunk_type + data)))
+
+    def write_rows(self, rows: np.ndarray):
+        # Every scanline is prefixed with filter type 0 (None)
+        scanlines = np.zeros((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+        scanlines[:, 1:] = rows
+        data = self._compressor.compress(scanlines.tobytes())
+        if data:
+            self._write_chunk(b"IDAT", data)
+
+    def close(self):
+        try:
+            self._write_chunk(b"IDAT", self._compressor.flush())
+            self._write_chunk(b"IEND", b"")
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def analyze_tiled(image: Image.Image, index_names: Iterable[str], output_prefix: str, palette: str = DEFAULT_COLORMAP, tile_rows: int = TILE_ROWS) -> Dict[str, dict]:
+    """Stream the image through the index kernels in row blocks of tile_rows rows.
+
+    Index rasters are written to memory-mapped {output_prefix}{index}_array.npy
+    files and the colorized maps are PNG-encoded incrementally to
+    {output_prefix}{index}_result.png, so the float working set is bounded by
+    the block size instead of the image size.
+    """
+    index_names = list(dict.fromkeys(name.lower() for name in index_names))
+    unknown = [name for name in index_names if name not in INDEX_KERNELS]
+    if unknown:
+        raise ValueError(f"Invalid index type: {', '.join(unknown)}.")
+
+    width, height = image.size
+    channels = [channel for name in index_names for channel in INDEX_CHANNELS[name]]
+
+    output_paths = [f"{output_prefix}{name}{suffix}" for name in index_names for suffix in ("_array.npy", "_result.png")]
+    rasters: Dict[str, np.memmap] = {}
+    writers: List[_PNGStreamWriter] = []
+    completed = False
+    try:
+        for name in index_names:
+            rasters[name] = np.lib.format.open_memmap(f"{output_prefix}{name}_array.npy", mode="w+", dtype=np.float32, shape=(height, width))
+            writers.append(_PNGStreamWriter(f"{output_prefix}{name}_result.png", width, height, palette))
+        stats = {name: IndexStatsAccumulator() for name in index_names}
+
+        for top in range(0, height, tile_rows):
+            bottom = min(top + tile_rows, height)
+            bands = _load_bands(image.crop((0, top, width, bottom)), channels)
+            for name, writer in zip(index_names, writers):
+                block = INDEX_KERNELS[name](*(bands[channel] for channel in INDEX_CHANNELS[name]))
+                rasters[name][top:bottom] = block
+                writer.write_rows(normalize_index(block))
+                stats[name].update(block)
+        completed = True
+    finally:
+        for writer in writers:
+            writer.close()
+        for raster in rasters.values():
+            raster.flush()
+        if not completed:
+            # Drop the maps before unlinking so no partial result is left behind
+            rasters.clear()
+            for path in output_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    return {name: stats[name].to_insights() for name in index_names}
+
+def _needs_tiling(image: Image.Image) -> bool:
+    return image.width * image.height > TILED_PIXEL_THRESHOLD
+
+async def _read_image(file: UploadFile) -> Image.Image:
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Uploaded file is not an image")
 
     try:
-        image = Image.open(io.BytesIO(await file.read()))
+        return Image.open(io.BytesIO(await file.read()))
     except Exception as e:
         raise HTTPException(status_code=400, detail="Could not process the image file")
 
-    # Perform the calculation
-    result_image = calculation_function(image)
-    array_path = f"output/{index_name}_array.npy"
-    result_array = np.load(array_path)  # Load the array saved by the calculation function
+def _map_url(index_name: str, analysis_id: str) -> str:
+    return f"get-map/?index_type={index_name}&analysis_id={analysis_id}"
+
+def _in_memory_result(result_image: Image.Image, index_array: np.ndarray) -> StoredResult:
+    buffer = io.BytesIO()
+    result_image.save(buffer, format="PNG")
+    return StoredResult(index_array=index_array, map_png=buffer.getvalue())
+
+def _analyze_tiled_into_store(image: Image.Image, index_names: List[str], owner: str, analysis_id: str, palette: str) -> Dict[str, dict]:
+    try:
+        tiled_insights = analyze_tiled(image, index_names, result_store.result_path(analysis_id, "", ""), palette)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result_store.put_many(owner, analysis_id, {
+        index_name: StoredResult(
+            array_path=result_store.result_path(analysis_id, index_name, "_array.npy"),
+            map_path=result_store.result_path(analysis_id, index_name, "_result.png"),
+        )
+        for index_name in tiled_insights
+    })
+    return tiled_insights
+
+def _analyze_single(
+    image: Image.Image,
+    index_name: str,
+    calculation_function: Callable[[Image.Image], Tuple[Image.Image, np.ndarray]],
+    owner: str,
+    analysis_id: str,
+    palette: str
+) -> dict:
+    if _needs_tiling(image):
+        return _analyze_tiled_into_store(image, [index_name], owner, analysis_id, palette)[index_name]
+
+    # Perform the calculation and keep the raster for later lookups
+    try:
+        result_image, result_array = calculation_function(image)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     insights = analyze_index(result_array, index_name)
+    if palette != DEFAULT_COLORMAP:
+        result_image.putpalette(PALETTES[palette])
+    result_store.put(owner, analysis_id, index_name, _in_memory_result(result_image, result_array))
+    return insights
+
+def _analyze_multi(image: Image.Image, index_names: List[str], owner: str, analysis_id: str, palette: str) -> Dict[str, dict]:
+    if _needs_tiling(image):
+        return _analyze_tiled_into_store(image, index_names, owner, analysis_id, palette)
 
-    # Save the resulting image
-    file_path = f"output/{index_name}_result.png"
-    result_image.save(file_path)
+    try:
+        index_arrays = compute_indices(image, index_names)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    insights, results = {}, {}
+    for index_name, index_array in index_arrays.items():
+        insights[index_name] = analyze_index(index_array, index_name)
+        results[index_name] = _in_memory_result(apply_colormap(normalize_index(index_array), palette), index_array)
+    # Stored together so the analysis' own indices never evict each other
+    result_store.put_many(owner, analysis_id, results)
+    return insights
+
+async def perform_analysis(
+    file: UploadFile,
+    index_name: str,
+    calculation_function: Callable[[Image.Image], Tuple[Image.Image, np.ndarray]],
+    owner: str,
+    palette: str = DEFAULT_COLORMAP
+):
+    image = await _read_image(file)
+    analysis_id = result_store.new_analysis_id()
+
+    # Decoding and index math run on the analysis pool, off the event loop
+    insights = await analysis_pool.submit(_analyze_single, image, index_name, calculation_function, owner, analysis_id, palette)
 
     # Return a standardized response
     return {
         "message": f"{index_name.upper()} analysis complete",
-        "file_path": file_path,
+        "analysis_id": analysis_id,
+        "file_path": _map_url(index_name, analysis_id),
         "insights": insights
     }
 
-def apply_colormap(ndvi_array: np.ndarray) -> Image.Image:
-    colormap = np.zeros((256, 3), dtype=np.uint8)
-    for i in range(256):
-        if i < 128:  # Low NDVI values (e.g., non-vegetation areas)
-            colormap[i] = [255, int(i * 2), 0]  # Gradient from red to yellow
-        else:  # High NDVI values (e.g., vegetation areas)
-            colormap[i] = [int((255 - i) * 2), 255, int((i - 128) * 2)]  # Gradient from yellow to green
+async def perform_multi_analysis(file: UploadFile, index_names: List[str], owner: str, palette: str = DEFAULT_COLORMAP):
+    image = await _read_image(file)
+    analysis_id = result_store.new_analysis_id()
+
+    insights = await analysis_pool.submit(_analyze_multi, image, index_names, owner, analysis_id, palette)
 
-    # Map NDVI values to the colormap
-    colorized = colormap[ndvi_array]
+    return {
+        "message": f"{', '.join(name.upper() for name in insights)} analysis complete",
+        "analysis_id": analysis_id,
+        "results": {
+            index_name: {"file_path": _map_url(index_name, analysis_id), "insights": index_insights}
+            for index_name, index_insights in insights.items()
+        }
+    }
 
-    # Return as a PIL Image
-    return Image.fromarray(colorized, mode="RGB")
\ No newline at end of file
+def apply_colormap(ndvi_array: np.ndarray, palette: str = DEFAULT_COLORMAP) -> Image.Image:
+    """Wrap normalized index values in a paletted ("P") image without expanding them to RGB."""
+    image = Image.fromarray(ndvi_array)
+    image.putpalette(PALETTES[palette])
+    return image
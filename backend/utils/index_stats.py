@@ -0,0 +1,139 @@
+import numpy as np
+from typing import Dict, Iterable, Tuple
+
+# Vegetation buckets used by AnalyzeIndexResponse: low <= 0.2 < moderate <= 0.6 < high
+VEGETATION_THRESHOLDS = (0.2, 0.6)
+HISTOGRAM_RANGE = (-1.0, 1.0)
+HISTOGRAM_BINS = 200
+
+# Large rasters are folded in in chunks so temporaries stay cache-sized
+UPDATE_CHUNK_SIZE = 1 << 18
+
+class IndexStatsAccumulator:
+    """Mergeable one-pass statistics for vegetation index rasters.
+
+    Mean and variance are tracked with Chan's parallel update, so accumulators
+    built over separate tiles or threads can be merged exactly. Values are also
+    binned into a fixed histogram whose edges include the vegetation thresholds,
+    which gives the bucket percentages exactly and percentiles approximately.
+    """
+
+    def __init__(self, bins: int = HISTOGRAM_BINS, value_range: Tuple[float, float] = HISTOGRAM_RANGE):
+        edges = np.linspace(value_range[0], value_range[1], bins + 1)
+        self._threshold_bins = []
+        for threshold in VEGETATION_THRESHOLDS:
+            position = int(np.argmin(np.abs(edges - threshold)))
+            edges[position] = threshold
+            self._threshold_bins.append(position)
+        self.edges = edges
+        self._edges_by_dtype = {}
+
+        # Bin i holds edges[i - 1] < value <= edges[i]; the first and last bins are open-ended
+        self.counts = np.zeros(edges.size + 1, dtype=np.int64)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+
+    def _edges_for(self, dtype: np.dtype) -> np.ndarray:
+        # Compare in the raster's own precision so thresholds behave like `array <= 0.2`
+        if dtype not in self._edges_by_dtype:
+            self._edges_by_dtype[dtype] = self.edges.astype(dtype if np.issubdtype(dtype, np.floating) else np.float64)
+        return self._edges_by_dtype[dtype]
+
+    def _combine(self, count: int, mean: float, m2: float, minimum: float, maximum: float):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.minimum = min(self.minimum, minimum)
+        self.maximum = max(self.maximum, maximum)
+
+    def update(self, values: np.ndarray) -> "IndexStatsAccumulator":
+        """Fold a block of index values into the running statistics.
+
+        A non-contiguous window of a larger raster is folded in blocks of
+        whole rows, so it is never flattened into a copy.
+        """
+        values = np.asarray(values)
+        if values.ndim > 1 and not values.flags.c_contiguous:
+            rows = max(1, UPDATE_CHUNK_SIZE // max(1, values[0].size))
+            for start in range(0, values.shape[0], rows):
+                self._update_chunk(values[start:start + rows])
+            return self
+
+        values = values.ravel()
+        for start in range(0, values.size, UPDATE_CHUNK_SIZE):
+            self._update_chunk(values[start:start + UPDATE_CHUNK_SIZE])
+        return self
+
+    def _update_chunk(self, values: np.ndarray):
+        bin_indices = np.searchsorted(self._edges_for(values.dtype), values, side="left")
+        self.counts += np.bincount(bin_indices.ravel(), minlength=self.counts.size)
+
+        block_mean = float(np.mean(values, dtype=np.float64))
+        deviations = np.subtract(values, block_mean, dtype=np.float64)
+        self._combine(
+            values.size,
+            block_mean,
+            float(np.vdot(deviations, deviations)),
+            float(np.min(values)),
+            float(np.max(values)),
+        )
+
+    def merge(self, other: "IndexStatsAccumulator") -> "IndexStatsAccumulator":
+        """Fold another accumulator with the same histogram layout into this one."""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge accumulators with different histogram edges.")
+        if other.count:
+            self.counts += other.counts
+            self._combine(other.count, other.mean, other.m2, other.minimum, other.maximum)
+        return self
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count else 0.0
+
+    def vegetation_counts(self) -> Tuple[int, int, int]:
+        """Return the (low, moderate, high) vegetation pixel counts."""
+        low_bin, high_bin = self._threshold_bins
+        low = int(self.counts[:low_bin + 1].sum())
+        moderate = int(self.counts[low_bin + 1:high_bin + 1].sum())
+        return low, moderate, self.count - low - moderate
+
+    def percentiles(self, percentiles: Iterable[float]) -> Dict[float, float]:
+        """Estimate percentiles by interpolating linearly inside histogram bins."""
+        if not self.count:
+            raise ValueError("Cannot compute percentiles of an empty accumulator.")
+
+        cumulative = np.cumsum(self.counts)
+        lower_edges = np.concatenate(([self.minimum], self.edges))
+        upper_edges = np.concatenate((self.edges, [self.maximum]))
+        results = {}
+        for percentile in percentiles:
+            target = percentile / 100 * self.count
+            bin_index = min(int(np.searchsorted(cumulative, target, side="left")), self.counts.size - 1)
+            preceding = cumulative[bin_index - 1] if bin_index else 0
+            lower = max(lower_edges[bin_index], self.minimum)
+            upper = min(upper_edges[bin_index], self.maximum)
+            fraction = (target - preceding) / self.counts[bin_index] if self.counts[bin_index] else 0.0
+            results[percentile] = float(lower + (upper - lower) * fraction)
+        return results
+
+    def to_insights(self) -> dict:
+        """Return the statistics in the AnalyzeIndexResponse layout."""
+        if not self.count:
+            raise ValueError("Cannot summarize an empty accumulator.")
+
+        low, moderate, high = self.vegetation_counts()
+        return {
+            "Mean": self.mean,
+            "StandardDeviation": float(np.sqrt(self.variance)),
+            "Minimum": self.minimum,
+            "Maximum": self.maximum,
+            "HighVegetationPercentage": high / self.count * 100,
+            "ModerateVegetationPercentage": moderate / self.count * 100,
+            "LowVegetationPercentage": low / self.count * 100,
+        }
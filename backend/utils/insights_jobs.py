@@ -0,0 +1,165 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+from fastapi import HTTPException
+from utils.executor import WorkerPool, inference_pool
+
+# Generation jobs run concurrently (each holds an inference worker while sampling)
+LLM_JOB_WORKERS = int(os.getenv("LLM_JOB_WORKERS", inference_pool.max_workers))
+# Jobs allowed to wait for a worker across all users
+LLM_JOB_QUEUE_LIMIT = int(os.getenv("LLM_JOB_QUEUE_LIMIT", 32))
+# Queued + running jobs per user
+LLM_JOB_PER_USER_LIMIT = int(os.getenv("LLM_JOB_PER_USER_LIMIT", 2))
+# How long a job (and its result) is kept after it was submitted
+LLM_JOB_TTL = float(os.getenv("LLM_JOB_TTL", 3600))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED_STATES = {DONE, FAILED, CANCELLED}
+
+@dataclass
+class InsightsJob:
+    """One queued LLM generation and, once finished, its result."""
+    id: str
+    owner: str
+    created: float
+    status: str = QUEUED
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    result: Optional[str] = None
+    error: Optional[str] = None
+    stop_event: threading.Event = field(default_factory=threading.Event)
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+    task: Optional[asyncio.Task] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "expires": self.created + LLM_JOB_TTL,
+            "llm_insights": self.result,
+            "error": self.error,
+        }
+
+class InsightsJobQueue:
+    """Bounded, per-user-limited background queue for LLM insight generation.
+
+    Jobs run on the inference pool, at most max_workers at a time; further
+    jobs wait in FIFO order up to max_queue. A user may have at most
+    per_user_limit jobs queued or running, so one client cannot occupy every
+    generation worker. Jobs are dropped ttl seconds after submission, and a
+    running job is cancelled by setting its stop_event, which the generation
+    checks after every token.
+    """
+
+    def __init__(self, pool: WorkerPool = inference_pool, max_workers: int = LLM_JOB_WORKERS,
+                 max_queue: int = LLM_JOB_QUEUE_LIMIT, per_user_limit: int = LLM_JOB_PER_USER_LIMIT,
+                 ttl: float = LLM_JOB_TTL):
+        self.pool = pool
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.per_user_limit = per_user_limit
+        self.ttl = ttl
+        self._jobs: Dict[str, InsightsJob] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def submit(self, owner: str, func: Callable[..., str], *args, **kwargs) -> InsightsJob:
+        """Enqueue func(*args, stop_event=..., **kwargs); raises 429/503 when over the limits.
+
+        func returns the insights text or raises; its exception message becomes the job's error.
+        """
+        self.prune()
+        active = [job for job in self._jobs.values() if job.status not in FINISHED_STATES]
+        if sum(job.owner == owner for job in active) >= self.per_user_limit:
+            raise HTTPException(
+                status_code=429,
+                detail=f"At most {self.per_user_limit} insight jobs may be pending per user",
+                headers={"Retry-After": "5"},
+            )
+        if sum(job.status == QUEUED for job in active) >= self.max_queue:
+            logging.warning(f"Insights job queue full ({len(active)} jobs pending), rejecting request")
+            raise HTTPException(status_code=503, detail="Server is busy, please retry shortly", headers={"Retry-After": "5"})
+
+        # Created lazily so the semaphore binds to the running event loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        job = InsightsJob(id=uuid.uuid4().hex, owner=owner, created=time.time())
+        job.task = asyncio.create_task(self._run(job, func, args, kwargs))
+        self._jobs[job.id] = job
+        return job
+
+    async def _run(self, job: InsightsJob, func: Callable[..., str], args: tuple, kwargs: dict):
+        try:
+            async with self._slots:
+                if job.status != QUEUED:
+                    return
+                job.status, job.started = RUNNING, time.time()
+                result = await self.pool.submit(func, *args, stop_event=job.stop_event, **kwargs)
+                if job.stop_event.is_set():
+                    job.status = CANCELLED
+                else:
+                    job.status, job.result = DONE, result
+        except asyncio.CancelledError:
+            job.status = CANCELLED
+        except HTTPException as e:
+            job.status, job.error = FAILED, str(e.detail)
+        except Exception as e:
+            if job.stop_event.is_set():
+                job.status = CANCELLED
+            else:
+                logging.error(f"Insights job {job.id} failed: {str(e)}")
+                job.status, job.error = FAILED, str(e)
+        finally:
+            job.finished = time.time()
+            job.done.set()
+
+    def get(self, job_id: str, owner: str) -> Optional[InsightsJob]:
+        self.prune()
+        job = self._jobs.get(job_id)
+        return job if job is not None and job.owner == owner else None
+
+    async def wait(self, job: InsightsJob, timeout: float) -> InsightsJob:
+        """Long-poll: return once the job finished or timeout seconds passed."""
+        if timeout > 0 and job.status not in FINISHED_STATES:
+            try:
+                await asyncio.wait_for(job.done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    def cancel(self, job: InsightsJob):
+        """Cancel a queued job outright; a running one stops at its next token."""
+        if job.status in FINISHED_STATES:
+            return
+        job.stop_event.set()
+        if job.status == QUEUED:
+            job.status = CANCELLED
+            job.task.cancel()
+
+    def prune(self):
+        """Drop jobs older than the TTL, cancelling any that are still pending."""
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.created < cutoff:
+                self.cancel(job)
+                del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, int]:
+        counts = {state: 0 for state in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return counts
+
+    def shutdown(self):
+        for job in self._jobs.values():
+            self.cancel(job)
+        self._jobs.clear()
+
+insights_jobs = InsightsJobQueue()
@@ -1,67 +1,135 @@
-import logging
-import time
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
 import os
+import copy
+import json
+import time
+import queue
+import random
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_FILE = os.getenv("LOG_FILE", "api.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# api.log is rotated at this size, keeping LOG_BACKUP_COUNT old files
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+# Fraction of requests logged; server errors and slow requests are always logged
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 1.0))
+LOG_SLOW_REQUEST_MS = float(os.getenv("LOG_SLOW_REQUEST_MS", 1000))
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; a record's `fields` extra is merged into it."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback on the caller's thread, but leave the JSON formatting to the listener
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def configure_logging(log_dir: str = LOG_DIR, filename: str = LOG_FILE) -> QueueListener:
+    """Route all logging through a queue to a rotating JSON file written by a background thread.
+
+    Callers only pay for putting the record on the queue; formatting and
+    file I/O happen on the listener thread.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    file_handler = RotatingFileHandler(
+        os.path.join(log_dir, filename), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(_QueueHandler(log_queue))
+    root.setLevel(LOG_LEVEL)
+
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+access_logger = logging.getLogger("api.access")
+
+class LoggerMiddleware:
+    """Pure ASGI access log: one structured record per request.
+
+    The request body is never read and headers are not copied; the status
+    is taken from the response start message as it passes through.
+    Requests are sampled at sample_rate, except that server errors and
+    requests slower than slow_ms are always logged.
+    """
+
+    def __init__(self, app, sample_rate: float = LOG_SAMPLE_RATE, slow_ms: float = LOG_SLOW_REQUEST_MS):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
 
-log_dir = "logs"
-os.makedirs(log_dir, exist_ok=True)
-
-# Configure logging
-logging.basicConfig(
-    filename="logs/api.log",
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
-    encoding="utf-8",
-    force=True
-)
-
-class LoggerMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        
-        # Log request details
         try:
-            request_body = await request.body()
-            body_str = request_body.decode() if request_body else ""
-            request_log = (
-                f"\nRequest Details:\n"
-                f"Time: {time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-                f"Client IP: {request.client.host}\n"
-                f"Method: {request.method}\n"
-                f"Path: {request.url.path}\n"
-                f"Headers: {dict(request.headers)}\n"
-                f"Query Params: {dict(request.query_params)}\n"
-                # f"Body: {body_str[:500] if len(body_str) > 500 else body_str}\n"
-            )
-            logging.info(request_log)
-            
-            # Process request and catch any errors
-            response = await call_next(request)
-            process_time = time.time() - start_time
-            
-            # Log response details
-            response_log = (
-                f"\nResponse Details:\n"
-                f"Status: {response.status_code}\n"
-                f"Duration: {process_time:.4f}s\n"
-                f"Headers: {dict(response.headers)}\n"
-            )
-            logging.info(response_log)
-            
-        except Exception as e:
-            # Log any unhandled exceptions
-            error_log = (
-                f"\nError Details:\n"
-                f"Time: {time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-                f"Error Type: {type(e).__name__}\n"
-                f"Error Message: {str(e)}\n"
-            )
-            logging.error(error_log)
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            self._log(scope, 500, start, exc_info=True)
             raise
-            
-        finally:
-            # Ensure logs are written
-            logging.getLogger().handlers[0].flush()
-            
-        return response
+        self._log(scope, status_code, start)
+
+    def _log(self, scope, status_code: int, start: float, exc_info: bool = False):
+        duration_ms = (time.perf_counter() - start) * 1000
+        if status_code < 500 and duration_ms < self.slow_ms and random.random() >= self.sample_rate:
+            return
+        fields = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status_code,
+            "duration_ms": round(duration_ms, 2),
+            "client": scope["client"][0] if scope.get("client") else None,
+        }
+        if scope["query_string"]:
+            fields["query"] = scope["query_string"].decode("latin-1")
+        level = logging.ERROR if status_code >= 500 else logging.INFO
+        access_logger.log(level, f"{scope['method']} {scope['path']} {status_code}",
+                          extra={"fields": fields}, exc_info=exc_info)
+
+log_listener = configure_logging()
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,76 @@
+import os
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+from utils.executor import WorkerPool
+
+# Comma-separated model names to load at startup, or "all"; empty loads everything lazily
+WARMUP_MODELS = os.getenv("WARMUP_MODELS", "")
+
+class ModelRegistry:
+    """Loads models on first use instead of at import time.
+
+    Each model is registered with a zero-argument loader. The first get()
+    runs the loader (once, even under concurrent callers) and caches the
+    result; a loader that fails is remembered as failed and get() returns
+    None, mirroring the previous module-level `model = None` fallback.
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._errors: Dict[str, str] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def get(self, name: str) -> Optional[Any]:
+        """Return the model, loading it on first use (blocking)."""
+        if name in self._models:
+            return self._models[name]
+
+        with self._locks[name]:
+            if name not in self._models and name not in self._errors:
+                try:
+                    model = self._loaders[name]()
+                    if model is None:
+                        raise RuntimeError("loader returned no model")
+                    self._models[name] = model
+                    logging.info(f"Model '{name}' loaded")
+                except Exception as e:
+                    self._errors[name] = str(e)
+                    logging.error(f"Failed to load model '{name}': {str(e)}")
+            return self._models.get(name)
+
+    async def aget(self, name: str, pool: WorkerPool) -> Optional[Any]:
+        """Like get(), but a first-time load runs on the given pool instead of the event loop."""
+        if name in self._models:
+            return self._models[name]
+        return await pool.submit(self.get, name)
+
+    def warmup(self, names: Optional[Iterable[str]] = None):
+        for name in names if names is not None else list(self._loaders):
+            self.get(name)
+
+    def status(self) -> Dict[str, str]:
+        return {
+            name: "loaded" if name in self._models else "failed" if name in self._errors else "not_loaded"
+            for name in self._loaders
+        }
+
+    def errors(self) -> Dict[str, str]:
+        """Why each failed model could not be loaded."""
+        return dict(self._errors)
+
+    def warmup_names(self, setting: str = WARMUP_MODELS) -> list:
+        """Resolve the WARMUP_MODELS setting to registered model names."""
+        if setting.strip().lower() == "all":
+            return list(self._loaders)
+        return [name.strip() for name in setting.split(",") if name.strip() in self._loaders]
+
+model_registry = ModelRegistry()
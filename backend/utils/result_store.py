@@ -0,0 +1,186 @@
+import os
+import uuid
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+RESULT_DIR = os.getenv("RESULT_DIR", "results")
+RESULT_STORE_MAX_BYTES = int(os.getenv("RESULT_STORE_MAX_BYTES", 1 << 30))
+RESULT_STORE_MAX_DISK_BYTES = int(os.getenv("RESULT_STORE_MAX_DISK_BYTES", 20 << 30))
+RESULT_STORE_SPILL = os.getenv("RESULT_STORE_SPILL", "false").lower() in ("1", "true", "yes")
+
+ResultKey = Tuple[str, str, str]
+
+@dataclass
+class StoredResult:
+    """A computed index raster and its colorized map.
+
+    In-memory results carry the PNG as bytes; results that live on disk
+    (tiled runs and spilled entries) carry file paths instead, and their
+    index_array is a read-only memory map opened on first access.
+    """
+    index_array: Optional[np.ndarray] = None
+    map_png: Optional[bytes] = None
+    array_path: Optional[str] = None
+    map_path: Optional[str] = None
+
+    @property
+    def nbytes(self) -> int:
+        array_bytes = self.index_array.nbytes if self.index_array is not None else 0
+        return array_bytes + len(self.map_png or b"")
+
+    @property
+    def disk_bytes(self) -> int:
+        return sum(os.path.getsize(path) for path in (self.array_path, self.map_path) if path and os.path.exists(path))
+
+class ResultStore:
+    """Keyed index results per user and analysis, bounded in bytes with LRU eviction.
+
+    Results evicted from memory are written to RESULT_DIR when spilling is
+    enabled, and disk-resident results are themselves evicted LRU by file size.
+    The indices of the most recently stored analysis are never evicted from
+    either tier, so an analysis_id handed back to a client always resolves at
+    least once, even when that analysis alone exceeds the budget.
+    """
+
+    def __init__(self, max_bytes: int = RESULT_STORE_MAX_BYTES, max_disk_bytes: int = RESULT_STORE_MAX_DISK_BYTES,
+                 spill: bool = RESULT_STORE_SPILL, result_dir: str = RESULT_DIR):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.spill = spill
+        self.result_dir = result_dir
+        os.makedirs(result_dir, exist_ok=True)
+
+        self._memory: "OrderedDict[ResultKey, StoredResult]" = OrderedDict()
+        self._disk: "OrderedDict[ResultKey, StoredResult]" = OrderedDict()
+        # Evicted from memory and being written to disk outside the lock; still served by get()
+        self._spilling: Dict[ResultKey, StoredResult] = {}
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._latest: Dict[str, str] = {}
+        # (owner, analysis_id) of the last put; none of its indices are evicted
+        self._newest: Optional[Tuple[str, str]] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_analysis_id() -> str:
+        return uuid.uuid4().hex
+
+    def result_path(self, analysis_id: str, index_name: str, suffix: str) -> str:
+        """Path for a disk-resident artifact of one analysis."""
+        return os.path.join(self.result_dir, f"{analysis_id}_{index_name}{suffix}")
+
+    def put(self, owner: str, analysis_id: str, index_name: str, result: StoredResult):
+        """Store a result; file-backed results go straight to the disk tier."""
+        self.put_many(owner, analysis_id, {index_name: result})
+
+    def put_many(self, owner: str, analysis_id: str, results: Dict[str, StoredResult]):
+        """Store every index of one analysis at once, so that storing one cannot evict another."""
+        with self._lock:
+            for index_name, result in results.items():
+                key = (owner, analysis_id, index_name.lower())
+                self._discard(key)
+                if result.array_path:
+                    self._disk[key] = result
+                    self._disk_bytes += result.disk_bytes
+                else:
+                    self._memory[key] = result
+                    self._memory_bytes += result.nbytes
+            self._latest[owner] = analysis_id
+            self._newest = (owner, analysis_id)
+            evicted = self._evict()
+        self._spill_evicted(evicted)
+
+    def get(self, owner: str, index_name: str, analysis_id: Optional[str] = None) -> Optional[StoredResult]:
+        """Look up a result, defaulting to the owner's most recent analysis."""
+        with self._lock:
+            analysis_id = analysis_id or self._latest.get(owner)
+            if analysis_id is None:
+                return None
+
+            key = (owner, analysis_id, index_name.lower())
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            if key in self._spilling:
+                return self._spilling[key]
+            if key in self._disk:
+                self._disk.move_to_end(key)
+                stored = self._disk[key]
+                if stored.index_array is None:
+                    # Map the raster once; lookups then only fault in the pages they touch
+                    stored.index_array = np.load(stored.array_path, mmap_mode="r")
+                return stored
+            return None
+
+    def _discard(self, key: ResultKey):
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key).nbytes
+        self._spilling.pop(key, None)
+        if key in self._disk:
+            stored = self._disk.pop(key)
+            self._disk_bytes -= stored.disk_bytes
+            self._remove_files(stored)
+
+    def _spill(self, key: ResultKey, result: StoredResult) -> StoredResult:
+        _, analysis_id, index_name = key
+        array_path = self.result_path(analysis_id, index_name, "_array.npy")
+        map_path = self.result_path(analysis_id, index_name, "_result.png")
+        np.save(array_path, result.index_array)
+        with open(map_path, "wb") as f:
+            f.write(result.map_png or b"")
+        return StoredResult(array_path=array_path, map_path=map_path)
+
+    def _spill_evicted(self, evicted: List[Tuple[ResultKey, StoredResult]]):
+        """Write results evicted from memory to disk without holding the store lock."""
+        for key, result in evicted:
+            try:
+                spilled = self._spill(key, result)
+            except OSError as e:
+                logging.error(f"Failed to spill result {key[1]}/{key[2]}: {str(e)}")
+                spilled = None
+
+            with self._lock:
+                if self._spilling.get(key) is not result:
+                    # Replaced or discarded while it was being written
+                    if spilled:
+                        self._remove_files(spilled)
+                    continue
+                del self._spilling[key]
+                if spilled:
+                    self._disk[key] = spilled
+                    self._disk_bytes += spilled.disk_bytes
+                    self._evict_disk()
+
+    def _evict(self) -> List[Tuple[ResultKey, StoredResult]]:
+        """Evict LRU results over budget; returns the ones the caller must spill after releasing the lock."""
+        evicted = []
+        for key in [key for key in self._memory if key[:2] != self._newest]:
+            if self._memory_bytes <= self.max_bytes:
+                break
+            result = self._memory.pop(key)
+            self._memory_bytes -= result.nbytes
+            if self.spill:
+                self._spilling[key] = result
+                evicted.append((key, result))
+        self._evict_disk()
+        return evicted
+
+    def _evict_disk(self):
+        for key in [key for key in self._disk if key[:2] != self._newest]:
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            stored = self._disk.pop(key)
+            self._disk_bytes -= stored.disk_bytes
+            self._remove_files(stored)
+
+    @staticmethod
+    def _remove_files(stored: StoredResult):
+        for path in (stored.array_path, stored.map_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+result_store = ResultStore()
@@ -0,0 +1,286 @@
+import os
+import copy
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, AsyncIterator, Optional, Tuple
+
+# torch/transformers are imported lazily so that starting the API does not pay for them
+if TYPE_CHECKING:
+    import torch
+
+# Checkpoint to serve (a Hugging Face name or a fine-tuned directory such as ./gpt2-soil-advisor)
+LLM_MODEL_PATH = os.getenv("LLM_MODEL_PATH", "gpt2")
+# "fp32", or "int8" for dynamically quantized Linear layers (CPU only)
+LLM_RUNTIME = os.getenv("LLM_RUNTIME", "fp32").lower()
+# Output of ml/src/utils/quantize_gpt2.py; without it the int8 runtime quantizes LLM_MODEL_PATH at load time
+LLM_QUANTIZED_PATH = os.getenv("LLM_QUANTIZED_PATH", "./ml/models/gpt2-soil-advisor-int8")
+# torch intra-op threads; 0 keeps torch's default (one per core), shared by all inference workers
+LLM_NUM_THREADS = int(os.getenv("LLM_NUM_THREADS", 0))
+QUANTIZED_WEIGHTS = "quantized_weights.pt"
+
+# Upper bound on generated tokens; requests may ask for fewer
+LLM_MAX_NEW_TOKENS = int(os.getenv("LLM_MAX_NEW_TOKENS", 1000))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 512))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+
+# Configure system prompt and few-shot examples for better context
+SYSTEM_PROMPT = """
+You are an expert agricultural and soil science advisor. Analyze soil data and provide detailed, scientific recommendations.
+Consider multiple factors including soil composition, pH levels, nutrient content, and environmental conditions.
+Provide specific, actionable advice based on data-driven analysis.
+"""
+# Identical for every request, so its attention keys/values are computed once
+PROMPT_PREFIX = f"{SYSTEM_PROMPT}\n\nANALYSIS CONTEXT:\n{'-' * 40}\n"
+
+RELEVANT_PROPERTIES = {"phh2o", "clay", "sand", "soc", "nitrogen", "cec"}  # Key soil properties
+
+def summarize_soil(soil_data: dict) -> Tuple[Tuple[str, str, float, float], ...]:
+    """(property, depth, median, mean) of the topsoil layers the prompt mentions, rounded to whole mapped units."""
+    summary = []
+    for layer in soil_data.get('data', {}).get('properties', {}).get('layers', []):
+        if layer["name"] in RELEVANT_PROPERTIES:
+            depths = layer.get("depths", [])[:2]  # Focus on topsoil layers
+            for depth in depths:
+                value_q50 = depth['values'].get('Q0.5')
+                value_mean = depth['values'].get('mean')
+                if value_q50 is not None and value_mean is not None:
+                    summary.append((layer['name'], depth['label'], float(round(value_q50)), float(round(value_mean))))
+    return tuple(sorted(summary))
+
+def normalize_context(prediction: str, confidence: float, recommendation: str, soil_data: dict) -> dict:
+    """The discrete inputs the prompt is built from; equal contexts produce identical prompts."""
+    return {
+        "prediction": prediction,
+        "confidence": round(confidence, 1),
+        "recommendation": recommendation,
+        "soil": summarize_soil(soil_data),
+    }
+
+def build_prompt_suffix(context: dict) -> str:
+    """Everything after PROMPT_PREFIX."""
+    soil_summary = [
+        f"- {name} ({label}): Median {q50:.2f}, Mean {mean:.2f}" for name, label, q50, mean in context["soil"]
+    ]
+    soil_summary_text = "\n".join(soil_summary) if soil_summary else "No relevant soil data available."
+
+    # Add soil classification context
+    prompt = (f"Soil Classification:\n- Type: {context['prediction']}\n- Confidence: {context['confidence']:.2f}\n"
+              f"- Base Recommendation: {context['recommendation']}\n\n")
+
+    # Add detailed soil data analysis
+    prompt += f"Soil Composition Analysis:\n{soil_summary_text}\n\n"
+
+    # Add structured reasoning steps
+    prompt += "ANALYSIS STEPS:\n"
+    prompt += "1. First, analyze the soil composition and its implications:\n"
+    prompt += "2. Then, evaluate nutrient levels and pH balance:\n"
+    prompt += "3. Next, consider water retention and drainage characteristics:\n"
+    prompt += "4. Finally, synthesize findings into practical recommendations:\n\n"
+
+    # Add specific requirements
+    prompt += "REQUIRED INSIGHTS:\n"
+    prompt += "1. Soil Health Analysis:\n   - Current soil properties evaluation\n   - Limiting factors identification\n   - Improvement recommendations\n\n"
+    prompt += "2. Crop Recommendations:\n   - Primary crop suggestions with scientific rationale\n   - Rotation strategies\n   - Expected yields and conditions\n\n"
+    prompt += "3. Management Strategy:\n   - Immediate actions needed\n   - Long-term improvement plan\n   - Resource optimization techniques\n\n"
+
+    prompt += "Please provide a detailed, scientific analysis following the above structure:\n"
+    return prompt
+
+def resolve_token_budget(max_new_tokens: Optional[int]) -> int:
+    if max_new_tokens is None:
+        return LLM_MAX_NEW_TOKENS
+    return max(1, min(max_new_tokens, LLM_MAX_NEW_TOKENS))
+
+class SoilAdvisor:
+    """GPT-2 text generation that reuses the attention cache of PROMPT_PREFIX.
+
+    The prefix is run through the model once at load time; each request
+    starts from a copy of that cache, so only the request-specific part of
+    the prompt is encoded before sampling begins.
+    """
+
+    def __init__(self, model, tokenizer, prefix: str = PROMPT_PREFIX):
+        import torch
+        self.model = model
+        self.tokenizer = tokenizer
+        self.prefix_ids = tokenizer(prefix, return_tensors="pt").input_ids
+        with torch.inference_mode():
+            self.prefix_cache = model(self.prefix_ids, use_cache=True).past_key_values
+        self.context_size = model.config.n_positions
+
+    def generate(self, prompt_suffix: str, max_new_tokens: int, streamer=None,
+                 stop_event: Optional[threading.Event] = None) -> str:
+        """Sample a continuation of PROMPT_PREFIX + prompt_suffix (blocking)."""
+        import torch
+        from transformers import StoppingCriteria, StoppingCriteriaList
+
+        class StopOnEvent(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                return stop_event is not None and stop_event.is_set()
+
+        suffix_ids = self.tokenizer(prompt_suffix, return_tensors="pt").input_ids
+        input_ids = torch.cat([self.prefix_ids, suffix_ids], dim=1)
+        # GPT-2 cannot attend past its context window, so the budget shrinks with the prompt
+        max_new_tokens = min(max_new_tokens, self.context_size - input_ids.shape[1])
+        if max_new_tokens <= 0:
+            raise ValueError("Prompt does not fit into the model context")
+
+        with torch.inference_mode():
+            output = self.model.generate(
+                input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                past_key_values=copy.deepcopy(self.prefix_cache),
+                max_new_tokens=max_new_tokens,
+                num_return_sequences=1,
+                temperature=0.8,      # Slightly increased for more creative responses
+                top_p=0.92,          # Adjusted for better quality
+                top_k=50,            # Added for better token selection
+                do_sample=True,
+                repetition_penalty=1.2,  # Added to reduce repetition
+                pad_token_id=self.tokenizer.eos_token_id,
+                no_repeat_ngram_size=3,  # Prevent repetition of phrases
+                streamer=streamer,
+                stopping_criteria=StoppingCriteriaList([StopOnEvent()]),
+            )
+        return self.tokenizer.decode(output[0, input_ids.shape[1]:], skip_special_tokens=True).strip()
+
+def conv1d_to_linear(model):
+    """Swap GPT-2's Conv1D projections for equivalent nn.Linear modules, which torch can quantize."""
+    import torch
+    from transformers.pytorch_utils import Conv1D
+
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                # Conv1D computes x @ W + b with W of shape (in, out); Linear stores W transposed
+                n_in, n_out = child.weight.shape
+                linear = torch.nn.Linear(n_in, n_out, dtype=child.weight.dtype)
+                linear.weight = torch.nn.Parameter(child.weight.detach().t().contiguous())
+                linear.bias = torch.nn.Parameter(child.bias.detach().clone())
+                setattr(parent, name, linear)
+    return model
+
+def quantize_model(model):
+    """Dynamic int8 quantization: int8 Linear weights, activations quantized on the fly."""
+    import torch
+    model = conv1d_to_linear(model.eval())
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def export_quantized(model_path: str = LLM_MODEL_PATH, output_dir: str = LLM_QUANTIZED_PATH) -> str:
+    """Write an int8 copy of a checkpoint (config, tokenizer, quantized weights) for load_quantized()."""
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    model = quantize_model(AutoModelForCausalLM.from_pretrained(model_path))
+    model.config.save_pretrained(output_dir)
+    AutoTokenizer.from_pretrained(model_path).save_pretrained(output_dir)
+    torch.save(model.state_dict(), os.path.join(output_dir, QUANTIZED_WEIGHTS))
+    return output_dir
+
+def load_quantized(path: str = LLM_QUANTIZED_PATH):
+    import torch
+    from transformers import AutoConfig, AutoModelForCausalLM
+
+    # Build the quantized module structure first so the packed int8 weights load straight into it
+    model = quantize_model(AutoModelForCausalLM.from_config(AutoConfig.from_pretrained(path)))
+    model.load_state_dict(torch.load(os.path.join(path, QUANTIZED_WEIGHTS), weights_only=False))
+    return model.eval()
+
+def load_advisor_model(runtime: str = LLM_RUNTIME, model_path: str = LLM_MODEL_PATH,
+                       quantized_path: str = LLM_QUANTIZED_PATH):
+    """(model, tokenizer) for the configured runtime."""
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    if runtime == "int8":
+        if os.path.exists(os.path.join(quantized_path, QUANTIZED_WEIGHTS)):
+            return load_quantized(quantized_path), AutoTokenizer.from_pretrained(quantized_path)
+        logging.warning(f"No quantized export in {quantized_path}, quantizing {model_path} at load time")
+        return quantize_model(AutoModelForCausalLM.from_pretrained(model_path)), AutoTokenizer.from_pretrained(model_path)
+    if runtime != "fp32":
+        raise ValueError(f"Unknown LLM_RUNTIME '{runtime}' (expected fp32 or int8)")
+    model = AutoModelForCausalLM.from_pretrained(model_path)
+    model.eval()
+    return model, AutoTokenizer.from_pretrained(model_path)
+
+def load_soil_advisor() -> SoilAdvisor:
+    import torch
+    if LLM_NUM_THREADS > 0:
+        torch.set_num_threads(LLM_NUM_THREADS)
+    llm_model, tokenizer = load_advisor_model()
+    logging.info(f"Soil advisor loaded from {LLM_MODEL_PATH} ({LLM_RUNTIME}, {torch.get_num_threads()} threads)")
+    return SoilAdvisor(llm_model, tokenizer)
+
+class InsightsCache:
+    """LRU + TTL cache of generated insights keyed on the normalized prompt context and token budget."""
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl: float = LLM_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0}
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(context: dict, max_new_tokens: int) -> str:
+        return hashlib.sha256(json.dumps([context, max_new_tokens], sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                self._entries.pop(key, None)
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def put(self, key: str, text: str):
+        with self._lock:
+            self._entries[key] = (time.time(), text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+insights_cache = InsightsCache()
+
+def stream_to_queue(tokenizer, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+    """A transformers streamer that hands decoded text chunks to an asyncio queue."""
+    from transformers import TextStreamer
+
+    class QueueStreamer(TextStreamer):
+        def on_finalized_text(self, text: str, stream_end: bool = False):
+            if text:
+                loop.call_soon_threadsafe(queue.put_nowait, text)
+
+    return QueueStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+async def stream_generation(advisor: SoilAdvisor, pool, prompt_suffix: str, max_new_tokens: int) -> AsyncIterator[str]:
+    """Yield text chunks as they are sampled; the full text is the generation's return value."""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop_event = threading.Event()
+    streamer = stream_to_queue(advisor.tokenizer, loop, queue)
+    job = asyncio.ensure_future(pool.submit(advisor.generate, prompt_suffix, max_new_tokens, streamer, stop_event))
+    try:
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, job}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield getter.result()
+                continue
+            getter.cancel()
+            # Generation finished: drain what the streamer queued before it returned
+            while not queue.empty():
+                yield queue.get_nowait()
+            job.result()
+            return
+    finally:
+        # Client went away (or we are done): stop sampling at the next token
+        stop_event.set()
@@ -0,0 +1,89 @@
+import os
+import logging
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+# Optional ONNX export of the classifier; used instead of sklearn when present and onnxruntime is installed
+SOIL_CLASSIFIER_ONNX_PATH = os.getenv("SOIL_CLASSIFIER_ONNX_PATH", "./ml/models/soil_model.onnx")
+
+class CompiledSoilClassifier:
+    """Scaler, classifier and label encoder folded into one ndarray-in, labels-out object.
+
+    Standardisation is a fused (X - mean) / scale on the raw feature matrix
+    (no DataFrame), the ensemble is evaluated once through predict_proba and
+    labels come from its argmax. If the saved model is a training pipeline
+    (scaler -> SMOTE -> classifier), its own fitted scaler is used and the
+    final estimator is called directly; samplers do nothing at predict time.
+    """
+
+    def __init__(self, classifier, mean: np.ndarray, scale: np.ndarray, classes: np.ndarray,
+                 feature_names: Optional[Sequence[str]] = None):
+        self.classifier = classifier
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.classes = np.asarray(classes)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.session = None
+
+    @classmethod
+    def from_artifacts(cls, model, scaler, encoder) -> "CompiledSoilClassifier":
+        classifier = model
+        steps = getattr(model, "steps", None)
+        if steps:
+            classifier = steps[-1][1]
+            fitted_scalers = [step for _, step in steps[:-1] if hasattr(step, "scale_")]
+            if fitted_scalers:
+                scaler = fitted_scalers[0]
+
+        # StandardScaler(with_mean=False / with_std=False) stores None for the skipped statistic
+        n_features = scaler.n_features_in_
+        mean = scaler.mean_ if getattr(scaler, "mean_", None) is not None and scaler.with_mean else np.zeros(n_features)
+        scale = scaler.scale_ if getattr(scaler, "scale_", None) is not None else np.ones(n_features)
+        # The classifier predicts encoded class ids; map its columns straight to label names
+        classes = encoder.classes_[np.asarray(classifier.classes_, dtype=np.intp)]
+        return cls(classifier, mean, scale, classes, getattr(scaler, "feature_names_in_", None))
+
+    def load_onnx(self, path: str = SOIL_CLASSIFIER_ONNX_PATH) -> bool:
+        """Evaluate the classifier with onnxruntime from now on, if the export and runtime exist."""
+        if onnxruntime is None or not os.path.exists(path):
+            return False
+        self.session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+        logging.info(f"Soil classifier running on onnxruntime ({path})")
+        return True
+
+    def export_onnx(self, path: str = SOIL_CLASSIFIER_ONNX_PATH):
+        """Convert the classifier (which sees already-scaled float32 input) to ONNX; needs skl2onnx."""
+        from skl2onnx import convert_sklearn
+        from skl2onnx.common.data_types import FloatTensorType
+
+        onnx_model = convert_sklearn(
+            self.classifier,
+            initial_types=[("input", FloatTensorType([None, len(self.mean)]))],
+            options={id(self.classifier): {"zipmap": False}},
+        )
+        with open(path, "wb") as f:
+            f.write(onnx_model.SerializeToString())
+
+    def transform(self, features: np.ndarray) -> np.ndarray:
+        scaled = np.subtract(features, self.mean, dtype=np.float64)
+        scaled /= self.scale
+        return scaled
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        scaled = self.transform(np.atleast_2d(features))
+        if self.session is not None:
+            # Outputs are [label, probabilities]
+            return self.session.run(None, {"input": scaled.astype(np.float32)})[1]
+        return self.classifier.predict_proba(scaled)
+
+    def predict(self, features: np.ndarray) -> Tuple[List[str], List[float]]:
+        """(conditions, confidences) for a feature matrix, from a single ensemble pass."""
+        probabilities = self.predict_proba(features)
+        best = probabilities.argmax(axis=1)
+        confidences = probabilities[np.arange(len(best)), best]
+        return self.classes[best].tolist(), confidences.astype(float).tolist()
@@ -0,0 +1,152 @@
+import numpy as np
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# The SoilGrids layout the soil classifier is trained and served on
+PROPERTIES = ["bdod", "cec", "cfvo", "clay", "nitrogen", "ocd", "ocs",
+              "phh2o", "sand", "silt", "soc", "wv0010", "wv0033", "wv1500"]
+DEPTHS = ["0-5cm", "5-15cm", "15-30cm", "30-60cm", "60-100cm", "100-200cm"]
+VALUES = ["Q0.5", "mean"]
+
+# Topsoil-heavy weights of the depth-weighted features (100-200cm is not used)
+DEPTH_WEIGHTS = {"0_5": 0.3, "5_15": 0.25, "15_30": 0.2, "30_60": 0.15, "60_100": 0.1}
+DEPTH_WEIGHTED_PROPERTIES = ["soc", "cec", "sand"]
+
+def depth_key(label: str) -> str:
+    return label.replace("cm", "").replace("-", "_")
+
+def feature_name(prop: str, depth_label: str, value_type: str) -> str:
+    return f"{prop}_{depth_key(depth_label)}_{value_type}"
+
+BASE_FEATURES = [feature_name(p, d, v) for p in PROPERTIES for d in DEPTHS for v in VALUES]
+ENGINEERED_FEATURES = (
+    ["clay_gradient", "ph_gradient"]
+    + [f"{prop}_depth_weighted" for prop in DEPTH_WEIGHTED_PROPERTIES]
+    + ["sand_clay_ratio", "soc_cec_balance", "water_capacity", "cec_variability"]
+)
+FEATURE_NAMES = BASE_FEATURES + ENGINEERED_FEATURES
+
+def round2(values: np.ndarray) -> np.ndarray:
+    """Round a float64 array to two decimals in place, with the same result as Python's round(x, 2).
+
+    np.round computes rint(x * 100) / 100, which can only disagree with
+    round() when x * 100 lands within rounding error of a .5 tie; those few
+    elements are rounded with round() itself.
+    """
+    scaled = values * 100.0
+    ties = np.flatnonzero(np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6)
+    exact = [round(float(values[i]), 2) for i in ties.tolist()]
+    np.rint(scaled, out=scaled)
+    np.divide(scaled, 100.0, out=values)
+    values[ties] = exact
+    return values
+
+class FeatureExtractor:
+    """Turns SoilGrids responses into model feature vectors in a fixed column order.
+
+    The requested column order is compiled once into slot tables and an index
+    array; extract() writes converted values straight into their slots of a
+    float64 row, derives the engineered features in place and gathers the
+    columns into a float32 vector (or a preallocated row) with one
+    fancy-indexing step. Values are converted (mapped value *
+    10^(-d_factor/10)) and rounded to two decimals exactly as the training
+    data was (see round2), and missing values are 0.
+    """
+
+    def __init__(self, feature_names: Sequence[str] = FEATURE_NAMES):
+        self.feature_names = list(feature_names)
+        # (property, depth label) -> (value type, slot in the raw buffer) pairs
+        self._slots = {
+            (prop, depth): tuple((value, (p * len(DEPTHS) + d) * len(VALUES) + v) for v, value in enumerate(VALUES))
+            for p, prop in enumerate(PROPERTIES)
+            for d, depth in enumerate(DEPTHS)
+        }
+        self._raw_size = len(BASE_FEATURES) + len(ENGINEERED_FEATURES)
+        raw_index = {name: i for i, name in enumerate(FEATURE_NAMES)}
+        # Unknown columns read a slot that always stays 0, like the old .get(feat, 0.0)
+        self._zero_slot = self._raw_size
+        self._columns = np.array([raw_index.get(name, self._zero_slot) for name in self.feature_names], dtype=np.intp)
+
+        slot = lambda prop, depth: raw_index[feature_name(prop, depth, "mean")]
+        self._gradients = [(slot(prop, "30-60cm"), slot(prop, "0-5cm")) for prop in ("clay", "phh2o")]
+        weighted_depths = [f"{key.replace('_', '-')}cm" for key in DEPTH_WEIGHTS]
+        self._weighted = [[slot(prop, d) for d in weighted_depths] for prop in DEPTH_WEIGHTED_PROPERTIES]
+        self._weights = list(DEPTH_WEIGHTS.values())
+        self._cec = [slot("cec", d) for d in weighted_depths]
+        self._topsoil = [slot(prop, "0-5cm") for prop in ("sand", "clay", "soc", "cec", "wv0033", "wv1500")]
+        self._engineered = len(BASE_FEATURES)
+        # The few base slots the engineered formulas read, fetched in one gather
+        self._inputs = np.array(sorted({i for pair in self._gradients for i in pair}
+                                       | {i for row in self._weighted for i in row}
+                                       | set(self._cec) | set(self._topsoil)), dtype=np.intp)
+
+    @property
+    def n_features(self) -> int:
+        return len(self.feature_names)
+
+    def _filled_slots(self, data: dict) -> List[int]:
+        """Raw slots of the base values present in a response (missing ones are left out of training records)."""
+        return [
+            slot
+            for layer in data.get("properties", {}).get("layers", [])
+            for depth in layer.get("depths", [])
+            for value_type, slot in self._slots.get((layer.get("name"), depth.get("label")), ())
+            if value_type in depth.get("values", {})
+        ]
+
+    def _fill_raw(self, data: dict) -> np.ndarray:
+        """Converted base values and engineered features, laid out as FEATURE_NAMES plus a zero slot."""
+        raw = np.zeros(self._raw_size + 1)
+        slots = self._slots
+        for layer in data.get("properties", {}).get("layers", []):
+            name = layer.get("name")
+            conversion = 10 ** (-(layer.get("unit_measure") or {}).get("d_factor", 0) / 10)
+            for depth in layer.get("depths", []):
+                depth_values = depth.get("values", {})
+                for value_type, slot in slots.get((name, depth.get("label")), ()):
+                    value = depth_values.get(value_type)
+                    if value:
+                        raw[slot] = value * conversion
+
+        e = self._engineered
+        round2(raw[:e])
+
+        # A handful of scalar formulas, in plain Python so they round exactly like the training code did
+        r = dict(zip(self._inputs.tolist(), raw[self._inputs].tolist()))
+        sand, clay, soc, cec, wv0033, wv1500 = [r[slot] for slot in self._topsoil]
+        engineered = [r[deep] - r[shallow] for deep, shallow in self._gradients]
+        engineered += [round(sum(r[slot] * weight for slot, weight in zip(row, self._weights)), 2) for row in self._weighted]
+        engineered += [round(sand / (clay + 1e-6), 2), round(soc * cec, 2), round(wv0033 - wv1500, 2)]
+        cec_profile = [r[slot] for slot in self._cec]
+        mean = sum(cec_profile) / len(cec_profile)
+        std = (sum((v - mean) ** 2 for v in cec_profile) / len(cec_profile)) ** 0.5
+        engineered.append(round(std / (mean + 1e-6), 2))
+        raw[e:e + len(engineered)] = engineered
+        return raw
+
+    def extract(self, data: dict, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Feature vector of one SoilGrids response (the `data` part of /soil-data/)."""
+        if out is None:
+            out = np.empty(self.n_features, dtype=np.float32)
+        return np.take(self._fill_raw(data), self._columns, out=out)
+
+    def extract_many(self, responses: Iterable[dict]) -> np.ndarray:
+        """Feature matrix with one row per response."""
+        responses = list(responses)
+        matrix = np.empty((len(responses), self.n_features), dtype=np.float32)
+        for row, data in zip(matrix, responses):
+            np.take(self._fill_raw(data), self._columns, out=row)
+        return matrix
+
+    def extract_dict(self, data: dict) -> Dict[str, float]:
+        """Training-style record: the base features present in the response plus every engineered one."""
+        raw = self._fill_raw(data).tolist()
+        record = {FEATURE_NAMES[i]: raw[i] for i in self._filled_slots(data)}
+        for i, name in enumerate(ENGINEERED_FEATURES, start=self._engineered):
+            record[name] = raw[i]
+        return record
+
+@lru_cache(maxsize=8)
+def get_feature_extractor(feature_names: tuple = tuple(FEATURE_NAMES)) -> FeatureExtractor:
+    """Shared extractor for a column order (e.g. tuple(scaler.feature_names_in_))."""
+    return FeatureExtractor(feature_names)
@@ -0,0 +1,126 @@
+import re
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from utils.http_client import PooledHTTPClient, http_client
+from utils.soilgrids import SoilGridsCache, soilgrids_cache, SOILGRIDS_CACHE_MAX_ENTRIES
+
+# The superset fetched once per location; every soil endpoint is served from it
+DEFAULT_PROPERTIES = [
+    "bdod", "cec", "cfvo", "clay", "nitrogen", "ocd", "ocs",
+    "phh2o", "sand", "silt", "soc", "wv0010", "wv0033", "wv1500"
+]
+DEFAULT_DEPTHS = [
+    "0-5cm", "0-30cm", "5-15cm", "15-30cm", "30-60cm", "60-100cm", "100-200cm"
+]
+DEFAULT_VALUES = ["Q0.5", "Q0.05", "Q0.95", "mean", "uncertainty"]
+
+DEPTH_PATTERN = re.compile(r"(\d+)-(\d+)cm")
+
+def parse_depth(label: str) -> Optional[Tuple[int, int]]:
+    match = DEPTH_PATTERN.fullmatch(label)
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+class SoilProfile:
+    """A parsed SoilGrids response for one location.
+
+    Keeps the raw layers so sub-selections can be returned in the upstream
+    format, and offers value lookups in conventional units (mapped value /
+    d_factor) for any depth range covered by the standard layers.
+    """
+
+    def __init__(self, data: dict):
+        self.data = data
+        self.layers: Dict[str, dict] = {}
+        for layer in data.get("properties", {}).get("layers", []):
+            self.layers[layer.get("name")] = layer
+
+    def value(self, prop: str, depth: str, stat: str = "mean") -> Optional[float]:
+        """Value of prop over depth in target units; ranges like 0-30cm are thickness-weighted."""
+        layer = self.layers.get(prop)
+        span = parse_depth(depth)
+        if layer is None or span is None:
+            return None
+        d_factor = layer.get("unit_measure", {}).get("d_factor") or 1
+
+        weighted, thickness = 0.0, 0
+        for entry in layer.get("depths", []):
+            value = entry.get("values", {}).get(stat)
+            if value is None:
+                continue
+            if entry.get("label") == depth:
+                return value / d_factor
+            top, bottom = entry["range"]["top_depth"], entry["range"]["bottom_depth"]
+            if span[0] <= top and bottom <= span[1]:
+                weighted += value * (bottom - top)
+                thickness += bottom - top
+        if thickness != span[1] - span[0]:
+            return None
+        return weighted / thickness / d_factor
+
+    def slice(self, properties: Iterable[str], depth: str, stat: str = "mean") -> Dict[str, dict]:
+        """{property: {stat: value}} for the given depth, skipping properties with no data."""
+        result = {}
+        for prop in properties:
+            value = self.value(prop, depth, stat)
+            if value is not None:
+                result[prop] = {stat: value}
+        return result
+
+    def to_response(self, properties: Iterable[str], depths: Iterable[str], values: Iterable[str]) -> dict:
+        """The upstream response restricted to the requested properties, depths and values."""
+        properties, depths, values = set(properties), set(depths), list(values)
+        layers: List[dict] = []
+        for name, layer in self.layers.items():
+            if name not in properties:
+                continue
+            layers.append({
+                **layer,
+                "depths": [
+                    {**entry, "values": {stat: entry.get("values", {}).get(stat) for stat in values}}
+                    for entry in layer.get("depths", [])
+                    if entry.get("label") in depths
+                ],
+            })
+        return {**self.data, "properties": {**self.data.get("properties", {}), "layers": layers}}
+
+class SoilProfileService:
+    """Fetches the full DEFAULT_PROPERTIES x DEFAULT_DEPTHS x DEFAULT_VALUES profile once per location.
+
+    The raw response is cached (and coalesced) by the SoilGrids cache; the
+    parsed profile is kept alongside it and reused as long as the cache
+    keeps returning the same response object.
+    """
+
+    def __init__(self, cache: SoilGridsCache = soilgrids_cache, max_entries: int = SOILGRIDS_CACHE_MAX_ENTRIES):
+        self.cache = cache
+        self.max_entries = max_entries
+        self._profiles: "OrderedDict[str, SoilProfile]" = OrderedDict()
+
+    @staticmethod
+    def covers(properties: Iterable[str], depths: Iterable[str], values: Iterable[str]) -> bool:
+        return (set(properties) <= set(DEFAULT_PROPERTIES)
+                and set(depths) <= set(DEFAULT_DEPTHS)
+                and set(values) <= set(DEFAULT_VALUES))
+
+    async def get_profile(self, lon: float, lat: float, client: PooledHTTPClient = http_client) -> SoilProfile:
+        data = await self.cache.query(lon, lat, DEFAULT_PROPERTIES, DEFAULT_DEPTHS, DEFAULT_VALUES, client=client)
+        key = self.cache.make_key(lon, lat, DEFAULT_PROPERTIES, DEFAULT_DEPTHS, DEFAULT_VALUES)
+        profile = self._profiles.get(key)
+        if profile is None or profile.data is not data:
+            profile = SoilProfile(data)
+            self._profiles[key] = profile
+        self._profiles.move_to_end(key)
+        while len(self._profiles) > self.max_entries:
+            self._profiles.popitem(last=False)
+        return profile
+
+    async def query(self, lon: float, lat: float, properties: Iterable[str], depths: Iterable[str], values: Iterable[str],
+                    client: PooledHTTPClient = http_client) -> dict:
+        """SoilGrids-shaped data for the request, sliced from the location's profile when possible."""
+        properties, depths, values = list(properties), list(depths), list(values)
+        if not self.covers(properties, depths, values):
+            return await self.cache.query(lon, lat, properties, depths, values, client=client)
+        profile = await self.get_profile(lon, lat, client)
+        return profile.to_response(properties, depths, values)
+
+soil_profiles = SoilProfileService()
@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+from utils.http_client import PooledHTTPClient, http_client
+
+SOILGRIDS_API_URL = os.getenv("SOILGRIDS_API_URL", "https://rest.isric.org/soilgrids/v2.0/properties/query")
+SOILGRIDS_CACHE_PATH = os.getenv("SOILGRIDS_CACHE_PATH", "soilgrids_cache.db")
+SOILGRIDS_CACHE_TTL = float(os.getenv("SOILGRIDS_CACHE_TTL", 30 * 24 * 3600))
+SOILGRIDS_CACHE_MAX_ENTRIES = int(os.getenv("SOILGRIDS_CACHE_MAX_ENTRIES", 1024))
+# Rows kept in the SQLite tier; expired rows and the oldest ones beyond the cap are pruned
+# when the cache is opened and then every SOILGRIDS_CACHE_PRUNE_EVERY writes
+SOILGRIDS_CACHE_MAX_DISK_ENTRIES = int(os.getenv("SOILGRIDS_CACHE_MAX_DISK_ENTRIES", 100000))
+SOILGRIDS_CACHE_PRUNE_EVERY = int(os.getenv("SOILGRIDS_CACHE_PRUNE_EVERY", 100))
+# SoilGrids is a 250 m raster; snapping to ~0.0025 degrees maps nearby lookups onto one cell
+SOILGRIDS_CELL_DEGREES = float(os.getenv("SOILGRIDS_CELL_DEGREES", 0.0025))
+
+def snap_coordinate(value: float, cell: float = SOILGRIDS_CELL_DEGREES) -> float:
+    return round(round(value / cell) * cell, 6)
+
+class SoilGridsCache:
+    """Two-tier (in-process LRU + SQLite) cache in front of the SoilGrids query API.
+
+    Keys are the grid-snapped coordinates plus the sorted property, depth and
+    value sets, and the upstream is queried with the snapped coordinates so
+    every lookup inside a cell shares one response. Concurrent misses for the
+    same key are coalesced into a single upstream request. The SQLite tier
+    drops expired rows and caps its row count, pruning on open and then
+    every prune_every writes.
+    """
+
+    def __init__(self, db_path: str = SOILGRIDS_CACHE_PATH, ttl: float = SOILGRIDS_CACHE_TTL,
+                 max_entries: int = SOILGRIDS_CACHE_MAX_ENTRIES, api_url: str = SOILGRIDS_API_URL,
+                 max_disk_entries: int = SOILGRIDS_CACHE_MAX_DISK_ENTRIES, prune_every: int = SOILGRIDS_CACHE_PRUNE_EVERY):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.api_url = api_url
+        self.max_disk_entries = max_disk_entries
+        self.prune_every = prune_every
+        self._writes_since_prune = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "upstream_errors": 0}
+        self._memory: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(lon: float, lat: float, properties: Iterable[str], depths: Iterable[str], values: Iterable[str]) -> str:
+        return json.dumps([
+            snap_coordinate(lon), snap_coordinate(lat),
+            sorted(set(properties)), sorted(set(depths)), sorted(set(values)),
+        ])
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS soilgrids_cache (key TEXT PRIMARY KEY, fetched_at REAL NOT NULL, data TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_soilgrids_cache_fetched_at ON soilgrids_cache (fetched_at)")
+            self._db.commit()
+            self._prune(self._db)
+        return self._db
+
+    def _prune(self, db: sqlite3.Connection) -> int:
+        """Delete expired rows, then the oldest rows beyond max_disk_entries; returns the rows removed."""
+        removed = db.execute("DELETE FROM soilgrids_cache WHERE fetched_at < ?", (time.time() - self.ttl,)).rowcount
+        excess = db.execute("SELECT COUNT(*) FROM soilgrids_cache").fetchone()[0] - self.max_disk_entries
+        if excess > 0:
+            removed += db.execute(
+                "DELETE FROM soilgrids_cache WHERE key IN (SELECT key FROM soilgrids_cache ORDER BY fetched_at LIMIT ?)",
+                (excess,),
+            ).rowcount
+        db.commit()
+        self._writes_since_prune = 0
+        return removed
+
+    def prune(self) -> int:
+        """Prune the SQLite tier now (blocking)."""
+        with self._db_lock:
+            return self._prune(self._connection())
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, dict]]:
+        with self._db_lock:
+            row = self._connection().execute(
+                "SELECT fetched_at, data FROM soilgrids_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or time.time() - row[0] > self.ttl:
+            return None
+        return row[0], json.loads(row[1])
+
+    def _disk_put(self, key: str, fetched_at: float, data: dict):
+        with self._db_lock:
+            db = self._connection()
+            db.execute(
+                "INSERT OR REPLACE INTO soilgrids_cache (key, fetched_at, data) VALUES (?, ?, ?)",
+                (key, fetched_at, json.dumps(data)),
+            )
+            db.commit()
+            self._writes_since_prune += 1
+            if self._writes_since_prune >= self.prune_every:
+                self._prune(db)
+
+    def _memory_get(self, key: str) -> Optional[dict]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[0] > self.ttl:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return entry[1]
+
+    def _memory_put(self, key: str, fetched_at: float, data: dict):
+        self._memory[key] = (fetched_at, data)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def _fetch_upstream(self, client: PooledHTTPClient, params: list) -> dict:
+        response = await client.get(self.api_url, params=params)
+        return response.json()
+
+    async def _load(self, key: str, params: list, client: PooledHTTPClient) -> dict:
+        try:
+            cached = await asyncio.to_thread(self._disk_get, key)
+            if cached is not None:
+                self.stats["disk_hits"] += 1
+                self._memory_put(key, *cached)
+                return cached[1]
+
+            self.stats["misses"] += 1
+            try:
+                data = await self._fetch_upstream(client, params)
+            except Exception:
+                self.stats["upstream_errors"] += 1
+                raise
+            fetched_at = time.time()
+            self._memory_put(key, fetched_at, data)
+            try:
+                await asyncio.to_thread(self._disk_put, key, fetched_at, data)
+            except sqlite3.Error as e:
+                logging.error(f"Failed to persist SoilGrids response: {str(e)}")
+            return data
+        finally:
+            self._inflight.pop(key, None)
+
+    async def query(self, lon: float, lat: float, properties: Iterable[str], depths: Iterable[str], values: Iterable[str],
+                    client: PooledHTTPClient = http_client) -> dict:
+        """Return the SoilGrids response for the cell containing (lon, lat)."""
+        properties, depths, values = list(properties), list(depths), list(values)
+        key = self.make_key(lon, lat, properties, depths, values)
+
+        data = self._memory_get(key)
+        if data is not None:
+            self.stats["memory_hits"] += 1
+            return data
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats["coalesced"] += 1
+        else:
+            params = (
+                [("lon", snap_coordinate(lon)), ("lat", snap_coordinate(lat))]
+                + [("property", prop) for prop in properties]
+                + [("depth", depth) for depth in depths]
+                + [("value", val) for val in values]
+            )
+            inflight = asyncio.ensure_future(self._load(key, params, client))
+            self._inflight[key] = inflight
+        # Shielded so a cancelled caller does not cancel the lookup other callers share
+        return await asyncio.shield(inflight)
+
+    def get_stats(self) -> dict:
+        lookups = sum(self.stats[name] for name in ("memory_hits", "disk_hits", "misses", "coalesced"))
+        hits = lookups - self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+soilgrids_cache = SoilGridsCache()